@@ -1,18 +1,30 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
 import datetime
+import os
 import uuid
-import json
-import io
-from decimal import Decimal, ROUND_HALF_UP
-from zoneinfo import ZoneInfo
+
+from sniper import analytics, audit, backup, calibration, metrics, simulation
+from sniper.betting import calculate_pnl, calculate_reverse_metrics, screen_slate
+from sniper.export import DOWNLOAD_MAX, FORMATS as EXPORT_FORMATS, export_bytes, file_name as export_file_name
+from sniper.importer import import_bets
+from sniper.leagues import GLOBAL_DB, short_name
+from sniper.settlement import settle_batch, settle_scores
+from sniper.db import (
+    TZ_TAIPEI, init_db, get_config, update_config, add_bet_db, settle_bet_db,
+    revoke_settlement_db, get_all_bets, get_recent_settled, cache_info,
+    reset_system_db, rebuild_equity_ledger, get_equity_summary, get_equity_curve, get_pnl_rollup,
+    get_leagues, query_bets, page_bets, search_bets, get_pending_bets, get_calibration_partials, has_bets,
+    group_bets,
+)
 
 # ==========================================
 # ⚙️ 0. 核心設定與常數
 # ==========================================
-DB_PATH = "sniper_v9.db"
-TZ_TAIPEI = ZoneInfo("Asia/Taipei")
+PICKER_PAGE_SIZE = 50
+LOG_PAGE_SIZE = 50
+CHART_MAX_POINTS = 1000          # 權益曲線最多傳給瀏覽器的點數
+CHART_GRAINS = {"自動": "auto", "逐筆": "raw", "日": "day", "週": "week", "月": "month"}
 
 st.set_page_config(
     page_title="SNIPER BETTING PRO",
@@ -21,233 +33,40 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# [NEW] 每次 rerun 的熱點量測 (區段耗時 / SQL 數 / 列數 / 記憶體峰值) → sniper/metrics.py
+if 'perf_session' not in st.session_state:
+    st.session_state['perf_session'] = uuid.uuid4().hex[:8]
+metrics.start_rerun(st.session_state['perf_session'], memory=st.session_state.get('perf_memory', False))
+
 # ==========================================
-# 🛠 1. 資料庫層 (SQLite + WAL + Audit)
+# 🛠 1. 資料庫層 (SQLite + WAL + Audit) → sniper/db.py
+# 🧠 2. 商業邏輯 (EV 百分比修復版) → sniper/betting.py
+# 🔒 4. GLOBAL_DB (定版) → sniper/leagues.py
 # ==========================================
-def init_db():
-    """初始化資料庫結構 (含 WAL 優化與 Index)"""
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("PRAGMA journal_mode=WAL;")
-        conn.execute("PRAGMA synchronous=NORMAL;")
-        
-        cur = conn.cursor()
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS bets (
-            id TEXT PRIMARY KEY,
-            created_at TEXT,
-            match_info TEXT,
-            bet_type TEXT,
-            stake REAL,
-            odds REAL,
-            status TEXT,
-            profit REAL,
-            settled_at TEXT,
-            notes TEXT
-        )""")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_bets_created ON bets(created_at);")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_bets_status ON bets(status);")
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS config (
-            key TEXT PRIMARY KEY,
-            value REAL
-        )""")
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS audit_log (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ts TEXT,
-            action TEXT,
-            target_id TEXT,
-            payload TEXT
-        )""")
-        cur.execute("INSERT OR IGNORE INTO config (key, value) VALUES ('bankroll', 10000.0)")
-        cur.execute("INSERT OR IGNORE INTO config (key, value) VALUES ('initial', 10000.0)")
-        conn.commit()
-
-def log_audit(conn, action, target_id, payload):
-    """寫入審計日誌 (內部呼叫)"""
-    ts = datetime.datetime.now(TZ_TAIPEI).isoformat()
-    # 確保 payload 可以被 JSON 序列化 (處理 Decimal)
-    conn.execute(
-        "INSERT INTO audit_log (ts, action, target_id, payload) VALUES (?, ?, ?, ?)",
-        (ts, action, target_id, json.dumps(payload, ensure_ascii=False, default=str)) 
-    )
+# 初始化 DB
+# [NEW] 結構遷移 (PRAGMA user_version) 每個行程只跑一次 → sniper/migrations.py
+@st.cache_resource
+def ensure_schema():
+    return init_db()
 
-def get_config():
-    with sqlite3.connect(DB_PATH) as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT key, value FROM config")
-        data = dict(cur.fetchall())
-        return data.get('bankroll', 10000.0), data.get('initial', 10000.0)
-
-def update_config(bankroll=None, initial=None):
-    with sqlite3.connect(DB_PATH) as conn:
-        cur = conn.cursor()
-        if bankroll is not None:
-            cur.execute("INSERT OR REPLACE INTO config (key, value) VALUES ('bankroll', ?)", (bankroll,))
-            log_audit(conn, "UPDATE_CONFIG", "SYSTEM", {"bankroll": bankroll})
-        if initial is not None:
-            cur.execute("INSERT OR REPLACE INTO config (key, value) VALUES ('initial', ?)", (initial,))
-        conn.commit()
-
-def add_bet_db(match, bet_type, stake, odds, notes=""):
-    now_iso = datetime.datetime.now(TZ_TAIPEI).isoformat()
-    bet_id = str(uuid.uuid4())
-    
-    with sqlite3.connect(DB_PATH) as conn:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT id FROM bets 
-            WHERE match_info=? AND bet_type=? AND stake=? AND odds=? AND status='待定'
-        """, (match, bet_type, stake, odds))
-        if cur.fetchone():
-            return False, "⚠️ 偵測到重複注單，操作已攔截！"
-
-        cur.execute("""
-            INSERT INTO bets (id, created_at, match_info, bet_type, stake, odds, status, profit, settled_at, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (bet_id, now_iso, match, bet_type, stake, odds, '待定', 0.0, None, notes))
-        
-        log_audit(conn, "ADD_BET", bet_id, {"match": match, "stake": stake})
-        conn.commit()
-        return True, bet_id
 
-def settle_bet_db(bet_id, profit, status):
-    """結算注單"""
-    now_iso = datetime.datetime.now(TZ_TAIPEI).isoformat()
-    # [FIX] 強制轉為 float，避免 Decimal 導致 JSON 報錯
-    profit_val = float(profit)
+with metrics.section("init_db"):
+    ensure_schema()
 
-    with sqlite3.connect(DB_PATH) as conn:
-        try:
-            cur = conn.cursor()
-            cur.execute("BEGIN")
-            
-            cur.execute("SELECT profit, status FROM bets WHERE id=?", (bet_id,))
-            row = cur.fetchone()
-            if not row: return False
-            old_profit = row[0]
-            
-            cur.execute("""
-                UPDATE bets 
-                SET status=?, profit=?, settled_at=? 
-                WHERE id=?
-            """, (status, profit_val, now_iso, bet_id))
-            
-            cur.execute("SELECT value FROM config WHERE key='bankroll'")
-            current_bank = cur.fetchone()[0]
-            new_bank = current_bank - old_profit + profit_val
-            cur.execute("UPDATE config SET value=? WHERE key='bankroll'", (new_bank,))
-            
-            log_audit(conn, "SETTLE_BET", bet_id, {"status": status, "profit": profit_val, "old_profit": old_profit})
-            conn.commit()
-            return True
-        except Exception as e:
-            conn.rollback()
-            raise e
 
-def revoke_settlement_db(bet_id):
-    """撤銷結算"""
-    with sqlite3.connect(DB_PATH) as conn:
-        try:
-            cur = conn.cursor()
-            cur.execute("BEGIN")
-            
-            cur.execute("SELECT profit FROM bets WHERE id=?", (bet_id,))
-            row = cur.fetchone()
-            if not row: return False
-            profit_to_remove = row[0]
-            
-            cur.execute("UPDATE bets SET status='待定', profit=0, settled_at=NULL WHERE id=?", (bet_id,))
-            
-            cur.execute("SELECT value FROM config WHERE key='bankroll'")
-            current_bank = cur.fetchone()[0]
-            cur.execute("UPDATE config SET value=? WHERE key='bankroll'", (current_bank - profit_to_remove,))
-            
-            log_audit(conn, "REVOKE_SETTLE", bet_id, {"removed_profit": profit_to_remove})
-            conn.commit()
-            return True
-        except:
-            conn.rollback()
-            return False
-
-def get_all_bets():
-    with sqlite3.connect(DB_PATH) as conn:
-        return pd.read_sql_query("SELECT * FROM bets ORDER BY created_at ASC", conn)
-
-def reset_system_db():
-    with sqlite3.connect(DB_PATH) as conn:
-        cur = conn.cursor()
-        cur.execute("DELETE FROM bets")
-        cur.execute("DELETE FROM audit_log")
-        cur.execute("UPDATE config SET value=10000.0 WHERE key='bankroll'")
-        cur.execute("UPDATE config SET value=10000.0 WHERE key='initial'")
-        log_audit(conn, "SYSTEM_RESET", "ALL", {})
-        conn.commit()
+# [NEW] 線上快照排程 (背景執行緒，每個行程一次；SNIPER_BACKUP_INTERVAL=0 關閉)
+@st.cache_resource
+def ensure_backup_scheduler():
+    return backup.start_scheduler()
 
-# 初始化 DB
-init_db()
 
-# ==========================================
-# 🧠 2. 商業邏輯 (EV 百分比修復版)
-# ==========================================
-def calculate_pnl(stake, odds, result_code):
-    d_stake = Decimal(str(stake))
-    d_odds = Decimal(str(odds))
-    d_profit = Decimal('0.0')
-
-    if result_code == "贏": d_profit = d_stake * (d_odds - Decimal('1'))
-    elif result_code == "贏半": d_profit = (d_stake * (d_odds - Decimal('1'))) / Decimal('2')
-    elif result_code == "輸": d_profit = -d_stake
-    elif result_code == "輸半": d_profit = -d_stake / Decimal('2')
-    elif result_code == "走水": d_profit = Decimal('0.0')
-    
-    return d_profit.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-
-def calculate_max_drawdown(equity_curve):
-    if not equity_curve: return 0.0
-    peak = equity_curve[0]
-    max_dd = 0.0
-    for value in equity_curve:
-        if value > peak: peak = value
-        dd = (peak - value) / peak if peak > 0 else 0
-        if dd > max_dd: max_dd = dd
-    return max_dd * 100
-
-def calculate_reverse_metrics(ev_value, odds, fraction=0.25, bankroll=10000):
-    """
-    [FIX] 支援直接輸入百分比 (例如 24.6)
-    邏輯：輸入值 / 100 = 實際小數
-    """
-    ev = Decimal(str(ev_value)) / Decimal('100') # 修正點：除以100
-    o = Decimal(str(odds))
-    
-    # 1. 反推勝率 P = (EV + 1) / Odds
-    if o > 0:
-        p = (ev + Decimal('1')) / o
-    else:
-        p = Decimal('0')
-    
-    # 限制 P 在 0~1 之間
-    p = max(Decimal('0'), min(Decimal('1'), p))
-    
-    # 2. 計算 Kelly
-    b = o - Decimal('1')
-    if b > 0:
-        k_full = p - ((Decimal('1') - p) / b)
-    else:
-        k_full = Decimal('0')
-    
-    k_frac = max(Decimal('0'), k_full * Decimal(str(fraction)))
-    
-    # 3. 建議金額
-    s_stake = (k_frac * Decimal(str(bankroll))).quantize(Decimal('10'), rounding=ROUND_HALF_UP)
-    
-    return p, k_frac, s_stake
+ensure_backup_scheduler()
 
 # ==========================================
 # 🎨 3. UI 樣式 (鈦金版)
 # ==========================================
-st.markdown("""
+with metrics.section("css"):
+    st.markdown("""
 <style>
     .stApp { background-color: #000000; color: #E5E7EB; }
     
@@ -287,40 +106,13 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# ==========================================
-# 🔒 4. GLOBAL_DB (定版)
-# ==========================================
-GLOBAL_DB = {
-    "[英] 英超 (Premier League)": ["曼城", "兵工廠", "利物浦", "阿斯頓維拉", "熱刺", "切爾西", "紐卡索聯", "曼聯", "西漢姆聯", "水晶宮", "布萊頓", "伯恩茅斯", "富勒姆", "狼隊", "艾佛頓", "布倫特福德", "諾丁漢森林", "萊斯特城", "伊普斯維奇", "南安普頓"],
-    "[英] 英冠 (Championship)": ["里茲聯", "伯恩利", "盧頓", "謝菲爾德聯", "西布朗", "諾維奇", "考文垂", "米德斯堡", "赫爾城", "桑德蘭", "沃特福德", "斯旺西", "普雷斯頓", "布里斯托城", "卡迪夫城", "米爾沃", "QPR (女王公園)", "布萊克本", "斯托克城", "謝週三", "普利茅斯", "樸茨茅斯", "德比郡", "牛津聯"],
-    "[英] 英甲 (League One)": ["伯明翰城", "雷克斯漢姆", "博爾頓", "彼得堡聯", "哈德斯菲爾德", "羅瑟漢姆", "巴恩斯利", "林肯城", "布萊克浦", "斯蒂文尼奇", "雷丁", "維根競技", "韋康比流浪者", "雷頓東方", "布里斯托流浪", "北安普頓", "埃克塞特城", "什魯斯伯里", "克勞利鎮", "劍橋聯", "柏頓", "曼斯菲爾德", "斯托克港", "伯頓"],
-    "[英] 英乙 (League Two)": ["米爾頓凱恩斯 (MK Dons)", "唐卡斯特", "克魯", "維爾港", "卡萊爾聯", "切爾滕漢姆", "福利特伍德", "布拉德福德", "吉林漢姆", "沃爾索爾", "AFC溫布頓", "哈洛格特", "特蘭米爾", "阿克寧頓", "索爾福德城", "史雲頓", "紐波特郡", "莫克姆", "科爾切斯特", "格里姆斯比", "切斯特菲爾德", "布羅姆利", "哈特柏爾", "瑟頓聯"],
-    "[歐] 西甲 (La Liga)": ["皇家馬德里", "巴塞隆納", "赫羅納", "馬德里競技", "畢爾包", "皇家社會", "皇家貝提斯", "維拉利爾", "瓦倫西亞", "阿拉維斯", "奧薩蘇納", "赫塔費", "塞爾塔", "塞維亞", "馬約卡", "拉斯帕爾馬斯", "巴列卡諾", "萊加內斯", "瓦拉多利德", "西班牙人"],
-    "[歐] 德甲 (Bundesliga)": ["勒沃庫森", "斯圖加特", "拜仁慕尼黑", "萊比錫RB", "多特蒙德", "法蘭克福", "霍芬海姆", "海登海姆", "不萊梅", "弗萊堡", "奧格斯堡", "沃夫斯堡", "美因茨", "慕尼黑格拉德巴赫", "柏林聯", "波鴻", "聖保利", "基爾霍爾斯泰因"],
-    "[歐] 義甲 (Serie A)": ["國際米蘭", "AC米蘭", "尤文圖斯", "亞特蘭大", "波隆那", "羅馬", "拉齊奧", "佛羅倫提那", "拿坡里", "都靈", "熱那亞", "蒙扎", "維羅納", "萊切", "烏迪內斯", "卡利亞里", "恩波利", "帕爾馬", "科莫", "威尼斯"],
-    "[歐] 法甲 (Ligue 1)": ["巴黎聖日耳曼", "摩納哥", "布雷斯特", "里爾", "尼斯", "里昂", "朗斯", "馬賽", "蘭斯", "雷恩", "土魯斯", "蒙彼利埃", "史特拉斯堡", "南特", "勒阿弗爾", "歐塞爾", "昂熱", "聖艾蒂安"],
-    "[美] 巴西甲 (Série A)": ["博塔弗戈", "帕梅拉斯", "弗拉門戈", "福塔雷薩", "國際體育會", "聖保羅", "科林蒂安", "巴伊亞", "克魯塞羅", "華斯科", "維多利亞", "米內羅競技", "佛魯米嫩塞", "格雷米奧", "尤文圖德", "布拉甘蒂諾", "巴拉納競技", "克里西烏馬", "桑托斯 (Santos)", "米拉索爾 (Mirassol)"],
-    "[美] 阿甲 (Primera)": ["河床", "博卡青年", "競賽會", "獨立隊", "聖洛倫索", "薩斯菲爾德", "塔勒瑞斯", "學生隊", "防衛者", "颶風", "阿根廷青年", "紐維爾舊生", "羅薩里奧中央", "拉努斯", "班菲爾德", "老虎競技", "普拉滕斯", "圖庫曼競技", "科爾多瓦", "貝爾格拉諾", "高多爾", "聯合隊", "巴拉卡斯", "利斯特拉", "里瓦達維亞", "薩蘭迪兵工廠", "科隆", "阿爾多希維"],
-    "[美] 美職聯 (MLS)": ["邁阿密國際", "洛杉磯銀河", "LAFC", "哥倫布機員", "辛辛那提", "紐約紅牛", "西雅圖海灣人", "亞特蘭大聯", "奧蘭多城", "多倫多FC", "聖路易城", "費城聯", "休士頓迪納摩", "皇家鹽湖城", "紐約城", "納什維爾", "新英格蘭革命", "溫哥華白浪", "FC達拉斯", "堪薩斯城", "明尼蘇達聯", "波特蘭伐木者", "聖荷西地震", "科羅拉多急流", "奧斯汀FC", "夏洛特FC", "芝加哥火焰", "蒙特婁衝擊", "DC United (華盛頓聯)", "聖地牙哥FC"],
-    "[歐] 葡超 (Primeira)": ["體育里斯本", "本菲卡", "波爾圖", "布拉加", "吉馬良斯", "莫雷拉人", "阿羅卡", "法馬利康", "卡薩皮亞", "法倫斯", "里奧艾維", "吉爾維森特", "艾斯托里爾", "艾馬泰", "博阿維斯塔", "聖克拉拉", "馬德拉國民", "AVS"],
-    "[歐] 荷甲 (Eredivisie)": ["PSV恩霍芬", "飛耶諾德", "特溫特", "阿爾克馬爾", "阿賈克斯", "奈梅亨", "烏德勒支", "鹿特丹斯巴達", "前進之鷹", "幸運薛達", "海倫芬", "茲沃勒", "阿梅爾城", "荷拉克勒斯", "華域克", "威廉二世", "格羅寧根", "布雷達"],
-    "[歐] 土超 (Süper Lig)": ["加拉塔薩雷", "費內巴切", "特拉布宗", "貝西克塔斯", "卡斯帕薩", "錫瓦斯", "阿蘭亞", "里澤", "巴沙克舒希", "安塔利亞", "加濟安泰普", "阿達納", "薩姆松", "凱塞利", "哈塔伊", "科尼亞", "安卡拉古庫", "伊尤斯堡", "哥茲塔比"],
-    "[歐] 德乙 (2. Bundesliga)": ["科隆", "達姆施塔特", "杜塞爾多夫", "漢堡", "卡爾斯魯厄", "漢諾威96", "帕德博恩", "菲爾特", "柏林赫塔", "沙爾克04", "埃弗斯堡", "紐倫堡", "馬格德堡", "布倫瑞克", "凱澤斯勞滕", "烏爾姆", "明斯特普魯士", "雷根斯堡"],
-    "[歐] 西乙 (Segunda)": ["卡迪斯", "格拉納達", "阿爾梅里亞", "奧維耶多", "桑坦德競技", "希洪競技", "埃瓦爾", "萊萬特", "布爾戈斯", "費羅爾", "埃爾切", "特內里費", "阿爾巴塞特", "卡塔赫納", "薩拉戈薩", "埃登斯", "韋斯卡", "米蘭德斯", "拉科魯尼亞", "卡斯特利翁", "馬拉加", "科爾多瓦"],
-    "[亞] 中超 (CSL)": ["上海海港", "上海申花", "成都蓉城", "北京國安", "山東泰山", "天津津門虎", "浙江隊", "河南隊", "長春亞泰", "青島西海岸", "青島海牛", "深圳新鵬城", "武漢三鎮", "滄州雄獅", "雲南玉昆", "大連英博"],
-    "[亞] 日職 (J1 League)": ["神戶勝利船", "橫濱水手", "廣島三箭", "浦和紅鑽", "鹿島鹿角", "名古屋鯨魚", "福岡黃蜂", "川崎前鋒", "大阪櫻花", "新潟天鵝", "FC東京", "札幌岡薩多", "京都不死鳥", "鳥栖砂岩", "湘南比馬", "大阪飛腳", "柏雷素爾", "町田澤維亞", "磐田喜悅", "東京綠茵"],
-    "[亞] 韓職 (K League 1)": ["蔚山HD", "浦項製鐵", "光州FC", "全北現代", "仁川聯", "大邱FC", "FC首爾", "大田韓亞市民", "濟州聯", "江原FC", "水原FC", "金泉尚武"],
-    "[亞] 沙烏地職 (Saudi Pro)": ["利雅德新月", "利雅德勝利", "吉達國民", "吉達聯合", "達曼協作", "利雅德青年", "阿爾法特", "阿爾費哈", "達馬克", "阿爾卡利傑", "阿爾拉德", "阿爾瓦赫達", "阿爾阿赫杜德", "阿爾利雅德", "卡迪西亞", "阿爾奧魯巴", "阿爾科洛", "阿爾泰"],
-    "[亞] 澳職 (A-League)": ["中央海岸水手", "威靈頓鳳凰", "墨爾本勝利", "雪梨FC", "麥克阿瑟FC", "墨爾本城", "西雪梨流浪者", "阿德萊德聯", "布里斯本獅吼", "紐卡索噴射機", "西部聯", "柏斯光榮", "奧克蘭FC"],
-    "[亞] 台甲 (企甲)": ["南市台鋼", "台灣電力", "台中FUTURO", "航源FC", "新北航源", "銘傳大學", "台北維京人", "陽信北競"]
-}
-
 # ==========================================
 # 📱 5. 側邊欄
 # ==========================================
-curr_bankroll, curr_initial = get_config()
+with metrics.section("config"):
+    curr_bankroll, curr_initial = get_config()
 
-with st.sidebar:
+with st.sidebar, metrics.section("sidebar"):
     st.header("⚙️ 總部指令 (HQ)")
     
     st.markdown("### 💰 資金修正")
@@ -333,31 +125,139 @@ with st.sidebar:
     st.divider()
 
     st.markdown("### 📥 批次結算 (Batch)")
-    batch_file = st.file_uploader("上傳 CSV (id, result)", type=['csv'])
+    batch_file = st.file_uploader("上傳 CSV / NDJSON (id, result)", type=['csv', 'ndjson', 'jsonl', 'json'])
     if batch_file and st.button("⚡ 執行批次結算"):
         try:
-            df_batch = pd.read_csv(batch_file)
-            st.warning("批次功能需要對應的 ID 列表")
-            st.success(f"CSV 上傳成功，請確認 ID 正確")
-        except:
-            st.error("CSV 格式錯誤")
+            report = settle_batch(batch_file)
+        except Exception as e:
+            st.error(f"結算檔格式錯誤：{e}")
+        else:
+            st.session_state['batch_report'] = report
+            st.toast(f"批次結算完成：{report['settled']} 筆 / ${report['profit']:,.2f}", icon="⚡")
+            st.rerun()
+    report = st.session_state.get('batch_report')
+    if report:
+        st.success(f"已結算 {report['settled']} 筆，損益 ${report['profit']:,.2f}")
+        if len(report['rejects']):
+            st.warning(f"拒絕 {len(report['rejects'])} 筆")
+            st.dataframe(report['rejects'], hide_index=True)
+
+    # [NEW] 終場比分 → 自動判定 (含四分之一盤贏半 / 輸半)，整批單一交易結算
+    st.markdown("### 🏁 比分自動結算")
+    score_file = st.file_uploader("上傳比分 CSV / JSON (match 或 home, away, date, home_score, away_score)",
+                                  type=['csv', 'ndjson', 'jsonl', 'json'], key="score_file")
+    if score_file:
+        sc1, sc2 = st.columns(2)
+        with sc1: do_preview = st.button("🔍 預覽")
+        with sc2: do_settle = st.button("🏁 依比分結算")
+        if do_preview or do_settle:
+            try:
+                report = settle_scores(score_file, dry_run=do_preview)
+            except Exception as e:
+                st.error(f"比分檔格式錯誤：{e}")
+            else:
+                report['dry_run'] = do_preview
+                st.session_state['score_report'] = report
+                if do_settle:
+                    st.toast(f"比分結算完成：{report['settled']} 筆 / ${report['profit']:,.2f}", icon="🏁")
+                    st.rerun()
+    report = st.session_state.get('score_report')
+    if report:
+        verb = "預計結算" if report['dry_run'] else "已結算"
+        st.success(f"{report['fixtures']} 場比分，{verb} {report['settled']} 筆，損益 ${report['profit']:,.2f}")
+        if len(report['details']):
+            st.dataframe(report['details'][['match_info', 'bet_type', 'score', 'result', 'profit']], hide_index=True)
+        if len(report['rejects']):
+            st.warning(f"略過 {len(report['rejects'])} 筆")
+            st.dataframe(report['rejects'], hide_index=True)
 
     st.divider()
 
     st.markdown("### 📂 資料備份")
-    df_all = get_all_bets()
-    export_data = {
-        "records": df_all.to_dict(orient='records'),
-        "bankroll": curr_bankroll,
-        "initial": curr_initial,
-        "ts": datetime.datetime.now(TZ_TAIPEI).isoformat()
-    }
+    # [NEW] 只在按下下載時才從 cursor 分段產生檔案，平常 rerun 不讀取 bets
+    exp_fmt = st.selectbox("匯出格式", list(EXPORT_FORMATS.keys()), format_func=lambda f: EXPORT_FORMATS[f][0])
+    exp_filters = {}
+    with st.expander("匯出篩選"):
+        if st.checkbox("依下單日期"):
+            today = datetime.datetime.now(TZ_TAIPEI).date()
+            d_range = st.date_input("日期區間", value=(today - datetime.timedelta(days=30), today))
+            if len(d_range) == 2:
+                exp_filters['date_from'], exp_filters['date_to'] = d_range
+        exp_league = st.selectbox("聯賽", ["All"] + get_leagues())
+        if exp_league != "All":
+            exp_filters['league'] = exp_league
     st.download_button(
-        label="📥 匯出資料庫 (JSON)",
-        data=json.dumps(export_data, ensure_ascii=False, indent=2, default=str),
-        file_name=f"sniper_v9_backup.json",
-        mime="application/json"
+        label="📥 匯出資料庫",
+        data=lambda: export_bytes(exp_fmt, **exp_filters),
+        file_name=export_file_name(exp_fmt),
+        mime=EXPORT_FORMATS[exp_fmt][2],
+        on_click="ignore",
     )
+    st.caption(f"瀏覽器下載上限 {DOWNLOAD_MAX // (1024 * 1024)} MB；更大的匯出請用 python -m sniper.export")
+
+    # [NEW] 整個 DB 檔 (含 audit_log) 的線上快照；還原請用 python -m sniper.backup restore
+    if st.button("💾 立即建立快照"):
+        try:
+            snap = backup.create()
+        except Exception as e:
+            st.error(f"快照失敗：{e}")
+        else:
+            st.toast("內容未變，沿用最新快照" if snap['skipped'] else f"快照完成 ({snap['gz_size'] / 1e6:,.1f} MB)", icon="💾")
+    snaps = backup.list_snapshots()
+    if snaps:
+        st.caption(f"最新快照 {snaps[0]['created_at'][:19]} · 共 {len(snaps)} 份")
+    if backup.status()['last_error']:
+        st.warning(f"排程快照失敗：{backup.status()['last_error']}")
+
+    import_file = st.file_uploader("匯入注單 (JSON / CSV / NDJSON)", type=['json', 'csv', 'ndjson', 'jsonl'])
+    if import_file and st.button("📤 匯入注單"):
+        try:
+            report = import_bets(import_file)
+        except Exception as e:
+            st.error(f"匯入檔格式錯誤：{e}")
+        else:
+            st.session_state['import_report'] = report
+            st.toast(f"已匯入 {report['imported']} 筆注單", icon="📤")
+            st.rerun()
+    report = st.session_state.get('import_report')
+    if report:
+        st.success(f"已匯入 {report['imported']} 筆")
+        if len(report['rejects']):
+            st.warning(f"略過 {len(report['rejects'])} 筆 (重複或格式錯誤)")
+            st.dataframe(report['rejects'], hide_index=True)
+
+    if st.button("🔧 重建權益帳本"):
+        rebuild_equity_ledger()
+        st.toast("權益帳本已重建", icon="🔧")
+        st.rerun()
+
+    # [NEW] 稽核日誌：檢查點 + 尾段重播驗證資金、封存舊日誌到壓縮檔
+    with st.expander("🧾 稽核日誌"):
+        a_stats = audit.stats()
+        st.caption(f"DB 內 {a_stats['rows']:,} 筆 · 檢查點後 {a_stats['tail']:,} 筆 · "
+                   f"已封存 {a_stats['archived_rows']:,} 筆 ({a_stats['archives']} 檔)")
+        ac1, ac2, ac3 = st.columns(3)
+        if ac1.button("🔍 驗證資金"):
+            st.session_state['replay_report'] = audit.replay()
+        if ac2.button("🔐 完整驗證", help="驗證封存檔 sha256 後從頭重播 (含封存檔)"):
+            st.session_state['replay_report'] = audit.replay(full=True)
+        if ac3.button("🗄 封存日誌"):
+            arch = audit.archive()
+            st.toast(f"已封存 {arch['rows']:,} 筆" if arch else "沒有可封存的日誌", icon="🗄")
+            st.rerun()
+        rp = st.session_state.get('replay_report')
+        if rp:
+            if rp.get('bad_archives'):
+                st.error("封存檔遺失或 sha256 不符：" + "、".join(os.path.basename(p) for p in rp['bad_archives']))
+            elif rp.get('checkpoint_ok') is False:
+                st.error(f"檢查點 #{rp['checkpoint_seq']} 記錄的資金與重播結果不符")
+            elif rp['ok']:
+                st.success(f"資金一致：${rp['bankroll']:,.2f} (重播 {rp['replayed']:,} 筆)")
+            else:
+                st.error(f"資金不一致：記錄 ${rp['stored']:,.2f} / 重播 ${rp['bankroll']:,.2f}")
+                if st.button("🩹 以重播結果修正"):
+                    st.session_state['replay_report'] = audit.replay(repair=True)
+                    st.rerun()
 
     st.divider()
     confirm_reset = st.checkbox("確認清除所有資料")
@@ -366,6 +266,10 @@ with st.sidebar:
         st.toast("系統已完全重置", icon="💥")
         st.rerun()
         
+    st.divider()
+    st.checkbox("🐞 效能面板", key="perf_panel")
+    st.checkbox("追蹤記憶體峰值 (tracemalloc)", key="perf_memory", disabled=not st.session_state.get('perf_panel'))
+
     st.caption("Sniper Bet Pro v9.2 (Final Fix)")
 
 # ==========================================
@@ -386,7 +290,7 @@ st.markdown(f"""
 tab1, tab2, tab3 = st.tabs(["📝 鎖定目標", "⚖️ 確認戰果", "📊 戰情室"])
 
 # === TAB 1: 下注 ===
-with tab1:
+with tab1, metrics.section("tab1"):
     with st.container():
         league = st.selectbox("賽事區域 (League)", list(GLOBAL_DB.keys()))
         teams = GLOBAL_DB[league]
@@ -441,6 +345,25 @@ with tab1:
         if sharpe_input > 2.0: st.success("🌟 高夏普值優質交易")
         st.markdown('</div>', unsafe_allow_html=True)
 
+    # [NEW] 整個賽程一次篩選 (向量化 Kelly)
+    with st.expander("📋 賽程批次篩選 (Slate Screening)"):
+        slate_file = st.file_uploader("上傳賽程 CSV (需含 odds, ev 欄位)", type=['csv'], key="slate_file")
+        sc1, sc2 = st.columns(2)
+        with sc1: slate_simul = st.checkbox("同時下注 Kelly 縮放", value=True)
+        with sc2: slate_cap = st.number_input("總曝險上限 (%)", value=50.0, step=5.0, min_value=1.0, max_value=100.0)
+        if slate_file:
+            try:
+                df_slate = pd.read_csv(slate_file)
+                df_screen = screen_slate(df_slate, fraction=0.25, bankroll=curr_bankroll,
+                                         simultaneous=slate_simul, max_exposure=slate_cap / 100)
+            except Exception as e:
+                st.error(f"賽程檔格式錯誤：{e}")
+            else:
+                df_pick = df_screen[df_screen['stake'] > 0]
+                st.session_state['slate_pick'] = df_pick
+                st.caption(f"{len(df_screen)} 個盤口 → {len(df_pick)} 個正 EV，合計建議 ${df_pick['stake'].sum():,.0f}")
+                st.dataframe(df_pick, use_container_width=True, hide_index=True)
+
     st.markdown("---")
     c1, c2 = st.columns(2)
     with c1: 
@@ -454,9 +377,10 @@ with tab1:
 
     st.markdown('<div class="primary-btn">', unsafe_allow_html=True)
     if st.button("🚀 LOCK IN BET (鎖定注單)"):
-        clean_league = league.split('] ')[1].split(' (')[0] if ']' in league else league
+        clean_league = short_name(league)
         match_info = f"[{clean_league}] {home} vs {away}"
-        success, msg = add_bet_db(match_info, bet_content, stake, odds, notes)
+        success, msg = add_bet_db(match_info, bet_content, stake, odds, notes,
+                                  model=(ev_input / 100, sharpe_input, float(implied_p)))
         if success:
             st.success(f"TARGET ACQUIRED: {home} vs {away}")
             st.rerun()
@@ -465,56 +389,61 @@ with tab1:
     st.markdown('</div>', unsafe_allow_html=True)
 
 # === TAB 2: 結算 ===
-with tab2:
-    df_pending = pd.read_sql_query("SELECT * FROM bets WHERE status='待定' ORDER BY created_at DESC", sqlite3.connect(DB_PATH))
+with tab2, metrics.section("tab2"):
+    # [NEW] 只載入並格式化最新一頁待定注單，其餘靠搜尋縮小範圍
+    pending_search = st.text_input("🔍 搜尋待定注單", placeholder="球隊 / 聯賽 / 玩法").strip()
+    df_pending, more_pending = page_bets(limit=PICKER_PAGE_SIZE, status='待定', search=pending_search or None)
     
     if df_pending.empty:
-        st.info("NO ACTIVE TARGETS (無進行中賽事)")
+        st.info("NO ACTIVE TARGETS (無進行中賽事)" if not pending_search else "找不到符合的待定注單")
     else:
-        opts = {}
-        for _, r in df_pending.iterrows():
-            dt = datetime.datetime.fromisoformat(r['created_at']).strftime("%m/%d %H:%M")
-            label = f"[{dt}] {r['match_info']} ({r['bet_type']}) ${r['stake']:.0f}"
-            opts[label] = r['id']
-
-        sel_label = st.selectbox("選擇結算目標", list(opts.keys()))
-        bid = opts[sel_label]
+        dts = pd.to_datetime(df_pending['created_at'].str.slice(0, 19)).dt.strftime("%m/%d %H:%M")
+        labels = ("[" + dts + "] " + df_pending['match_info'] + " (" + df_pending['bet_type'] + ") $"
+                  + df_pending['stake'].map("{:.0f}".format))
+        opts = dict(zip(df_pending['id'], labels))
+
+        bid = st.selectbox("選擇結算目標", list(opts.keys()), format_func=opts.get)
+        if more_pending:
+            st.caption(f"僅顯示最新 {PICKER_PAGE_SIZE} 筆，請輸入關鍵字搜尋更早的注單")
         target_bet = df_pending[df_pending['id'] == bid].iloc[0]
         
+        # [NEW] 收盤賠率 (選填)：戰情室的 CLV 報表使用
+        closing_odds = st.number_input("收盤賠率 (選填，CLV)", value=0.0, step=0.01, min_value=0.0) or None
+
         st.markdown("### MISSION OUTCOME")
         c1, c2 = st.columns(2)
         with c1:
             st.markdown('<div class="win-btn">', unsafe_allow_html=True)
             if st.button("✅ WIN (全贏)"):
                 p = calculate_pnl(target_bet['stake'], target_bet['odds'], "贏")
-                settle_bet_db(bid, p, "贏")
+                settle_bet_db(bid, p, "贏", closing_odds)
                 st.toast(f"MISSION SUCCESS! +${p}", icon="💰"); st.rerun()
             st.markdown('</div>', unsafe_allow_html=True)
         with c2:
             st.markdown('<div class="lose-btn">', unsafe_allow_html=True)
             if st.button("❌ LOSS (全輸)"):
                 p = calculate_pnl(target_bet['stake'], target_bet['odds'], "輸")
-                settle_bet_db(bid, p, "輸")
+                settle_bet_db(bid, p, "輸", closing_odds)
                 st.toast(f"MISSION FAILED. ${p}", icon="🥀"); st.rerun()
             st.markdown('</div>', unsafe_allow_html=True)
             
         c3, c4, c5 = st.columns(3)
         if c3.button("💵 贏半"):
             p = calculate_pnl(target_bet['stake'], target_bet['odds'], "贏半")
-            settle_bet_db(bid, p, "贏半"); st.rerun()
+            settle_bet_db(bid, p, "贏半", closing_odds); st.rerun()
         with c4:
              st.markdown('<div class="push-btn">', unsafe_allow_html=True)
              if st.button("🔄 走水"):
                  p = calculate_pnl(target_bet['stake'], target_bet['odds'], "走水")
-                 settle_bet_db(bid, p, "走水"); st.rerun()
+                 settle_bet_db(bid, p, "走水", closing_odds); st.rerun()
              st.markdown('</div>', unsafe_allow_html=True)
         if c5.button("💸 輸半"):
             p = calculate_pnl(target_bet['stake'], target_bet['odds'], "輸半")
-            settle_bet_db(bid, p, "輸半"); st.rerun()
+            settle_bet_db(bid, p, "輸半", closing_odds); st.rerun()
 
     st.markdown("---")
     st.markdown("#### ↩️ 近期已結算 (可撤銷)")
-    df_settled_recent = pd.read_sql_query("SELECT * FROM bets WHERE status != '待定' ORDER BY settled_at DESC LIMIT 5", sqlite3.connect(DB_PATH))
+    df_settled_recent = get_recent_settled(5)
     if not df_settled_recent.empty:
         for _, r in df_settled_recent.iterrows():
             col_info, col_btn = st.columns([3, 1])
@@ -529,46 +458,215 @@ with tab2:
                 st.markdown('</div>', unsafe_allow_html=True)
 
 # === TAB 3: 報表 ===
-with tab3:
-    df_all = get_all_bets()
-    all_leagues = sorted(list(set([r.split(']')[0].replace('[', '') for r in df_all['match_info']]))) if not df_all.empty else []
-    filter_lg = st.selectbox("Filter League", ["All"] + all_leagues)
-    if filter_lg != "All":
-        df_all = df_all[df_all['match_info'].str.contains(filter_lg)]
-
-    if not df_all.empty:
-        df_settled = df_all[df_all['status'] != '待定'].copy()
-        if not df_settled.empty:
-            df_settled['sort_time'] = pd.to_datetime(df_settled['settled_at'])
-            df_settled = df_settled.sort_values('sort_time')
-            
-            equity_curve = [curr_initial]
-            dates = ["Start"]
-            cum_profit = 0
-            for _, r in df_settled.iterrows():
-                cum_profit += r['profit']
-                equity_curve.append(curr_initial + cum_profit)
-                dates.append(r['sort_time'].strftime("%m/%d"))
-            
-            max_dd = calculate_max_drawdown(equity_curve)
-            st.line_chart(pd.DataFrame({'Equity': equity_curve}, index=dates))
+with tab3, metrics.section("tab3"):
+    # [NEW] 聯賽 / 玩法 / 球隊篩選直接下推到 SQL (結構化欄位 + 索引)
+    fc1, fc2, fc3 = st.columns(3)
+    with fc1: filter_lg = st.selectbox("Filter League", ["All"] + get_leagues())
+    with fc2: filter_mk = st.selectbox("Filter Market", ["All", "獨贏", "讓分", "大小"])
+    with fc3: filter_team = st.text_input("Filter Team").strip()
+    filters = {
+        'league': None if filter_lg == "All" else filter_lg,
+        'market': None if filter_mk == "All" else filter_mk,
+        'team': filter_team or None,
+    }
+    is_filtered = any(filters.values())
+    # [NEW] 未篩選時不載入注單：KPI / 曲線來自權益帳本與彙總表，有無資料只查 EXISTS
+    df_prepared = None
+    if is_filtered:
+        df_all = query_bets(**filters)
+        has_data = not df_all.empty
+        if has_data:
+            df_prepared = analytics.prepare(df_all)
+        has_settled = df_prepared is not None and not df_prepared.empty
+    else:
+        has_data = has_bets()
+        summary = get_equity_summary() if has_data else None
+        has_settled = summary is not None
+
+    if has_data:
+        if has_settled:
+            if not is_filtered:
+                # [NEW] 全部聯賽：直接讀取權益帳本，不再逐筆重算
+                final_equity = summary['equity']
+                max_dd = summary['max_dd']
+                wins, total = summary['n_wins'], summary['n_settled']
+                # [NEW] 圖表只傳送 O(桶數) 個點：區間內筆數少時逐筆，否則改用日 / 週 / 月彙總 (收盤 + 桶內高低)
+                df_days = get_pnl_rollup("day")
+                if df_days.empty:
+                    # 彙總表是空的 (舊 DB 升級 / 彙總過期)：改畫帳本逐筆曲線，並提示重建
+                    df_curve = get_equity_curve()
+                    keep = analytics.lttb(df_curve['equity'].to_numpy(), CHART_MAX_POINTS)
+                    st.line_chart(pd.DataFrame({'Equity': df_curve['equity'].to_numpy()[keep]},
+                                               index=pd.to_datetime(df_curve['settled_at'].iloc[keep].str.slice(0, 19))))
+                    st.caption("損益彙總尚未建立，請按側邊欄「🔧 重建權益帳本」")
+                else:
+                    first_day = datetime.date.fromisoformat(df_days['bucket'].iloc[0])
+                    last_day = datetime.date.fromisoformat(df_days['bucket'].iloc[-1])
+                    cr1, cr2 = st.columns([3, 1])
+                    with cr1:
+                        if first_day < last_day:
+                            chart_from, chart_to = st.slider("區間", min_value=first_day, max_value=last_day,
+                                                             value=(first_day, last_day), format="YYYY/MM/DD")
+                        else:
+                            chart_from, chart_to = first_day, last_day
+                    with cr2: chart_res = st.selectbox("解析度", list(CHART_GRAINS))
+                    in_range = df_days[df_days['bucket'].between(chart_from.isoformat(), chart_to.isoformat())]
+                    n_points = int(in_range['n'].sum())
+                    grain = CHART_GRAINS[chart_res]
+                    if grain == "auto":
+                        grain = "raw" if n_points <= CHART_MAX_POINTS else "month"
+                        for g in ("day", "week"):
+                            if n_points > CHART_MAX_POINTS and len(get_pnl_rollup(g, chart_from, chart_to)) <= CHART_MAX_POINTS:
+                                grain = g
+                                break
+                    if grain == "raw":
+                        df_curve = get_equity_curve(start=chart_from.isoformat(), end=chart_to.isoformat())
+                        keep = analytics.lttb(df_curve['equity'].to_numpy(), CHART_MAX_POINTS)
+                        df_chart = pd.DataFrame({'Equity': df_curve['equity'].to_numpy()[keep]},
+                                                index=pd.to_datetime(df_curve['settled_at'].iloc[keep].str.slice(0, 19)))
+                    else:
+                        df_roll = get_pnl_rollup(grain, chart_from, chart_to)
+                        df_chart = pd.DataFrame({'Equity': df_roll['eq_close'].to_numpy(), 'High': df_roll['eq_max'].to_numpy(),
+                                                 'Low': df_roll['eq_min'].to_numpy()}, index=pd.to_datetime(df_roll['bucket']))
+                    st.line_chart(df_chart)
+                    grain_label = next(k for k, v in CHART_GRAINS.items() if v == grain)
+                    st.caption(f"{n_points:,} 筆結算 · 顯示 {len(df_chart):,} 點 ({grain_label})")
+            else:
+                # [NEW] 篩選後：向量化計算 (取代 iterrows 逐筆累加)
+                stats = analytics.summarize(df_prepared, curr_initial)
+                equity_curve = analytics.equity_curve(df_prepared['profit'], curr_initial)[1:]
+                final_equity = stats['equity']
+                max_dd = stats['max_dd']
+                wins, total = stats['n_wins'], stats['n_settled']
+                # [NEW] 逐筆曲線以 LTTB 降採樣 (保留峰谷形狀)
+                keep = analytics.lttb(equity_curve, CHART_MAX_POINTS)
+                st.line_chart(pd.DataFrame({'Equity': equity_curve[keep]},
+                                           index=pd.to_datetime(df_prepared['settled_at'].iloc[keep].str.slice(0, 19))))
             
-            wins = len(df_settled[df_settled['profit'] > 0])
-            total = len(df_settled)
             win_rate = (wins / total * 100) if total > 0 else 0
-            roi = ((equity_curve[-1] - curr_initial) / curr_initial * 100)
+            roi = ((final_equity - curr_initial) / curr_initial * 100)
             
             c1, c2, c3 = st.columns(3)
             c1.metric("Win Rate", f"{win_rate:.1f}%")
             c2.metric("Max Drawdown", f"{max_dd:.1f}%")
             c3.metric("ROI", f"{roi:.1f}%")
+
+            with st.expander("🧮 分段統計 (聯賽 / 玩法 / 賠率 / 月份)"):
+                dim = st.radio("分段維度", analytics.SEGMENTS, horizontal=True,
+                               format_func=lambda d: {'league': '聯賽', 'market': '玩法', 'odds_bucket': '賠率區間', 'month': '月份'}[d])
+                # 未篩選時分段統計需要全部注單 → 勾選後才載入
+                if df_prepared is None and st.checkbox("計算分段統計 (含回撤 / 獲利因子)", key="seg_on"):
+                    df_prepared = analytics.prepare(get_all_bets())
+                if df_prepared is not None:
+                    df_seg = analytics.breakdown(df_prepared, dim, curr_initial)
+                    st.dataframe(df_seg, use_container_width=True, hide_index=True)
+                elif dim in ('league', 'market'):
+                    # [NEW] 聯賽 / 玩法有結構化欄位：直接在 SQL 端 GROUP BY，不載入注單
+                    df_seg = group_bets(by=(dim,))
+                    df_seg['win_rate'] = df_seg['n_wins'] / df_seg['n_settled'] * 100
+                    df_seg['roi'] = df_seg['profit'] / curr_initial * 100 if curr_initial else 0.0
+                    df_seg['yield'] = (df_seg['profit'] / df_seg['turnover'] * 100).where(df_seg['turnover'] > 0, 0.0)
+                    st.dataframe(df_seg, use_container_width=True, hide_index=True)
         else:
             st.info("尚無結算數據")
 
         st.markdown("### 📜 Mission Log")
-        df_show = df_all[['created_at', 'match_info', 'bet_type', 'status', 'profit', 'notes']].copy()
-        df_show['created_at'] = pd.to_datetime(df_show['created_at']).dt.strftime("%m/%d %H:%M")
+        # [NEW] 全文搜尋 (FTS5 trigram)：賽事 / 玩法 / 筆記，可依相關度或時間排序
+        sc1, sc2 = st.columns([3, 1])
+        with sc1: log_search = st.text_input("🔍 搜尋紀錄", placeholder="球隊 / 聯賽 / 筆記標籤").strip()
+        with sc2: log_ranked = st.checkbox("相關度排序", value=True, disabled=not log_search)
+        # [NEW] keyset 分頁：只查詢、格式化並傳送目前這一頁
+        log_key = tuple(filters.values()) + (log_search,)
+        if st.session_state.get('log_key') != log_key:
+            st.session_state['log_key'] = log_key
+            st.session_state['log_cursors'] = [None]
+        cursors = st.session_state['log_cursors']
+        if log_search and log_ranked:
+            df_page, next_cursor = search_bets(log_search, limit=LOG_PAGE_SIZE, **filters), None
+        else:
+            df_page, next_cursor = page_bets(cursor=cursors[-1], limit=LOG_PAGE_SIZE,
+                                             search=log_search or None, **filters)
+
+        df_show = df_page[['created_at', 'match_info', 'bet_type', 'status', 'profit', 'notes']].copy()
+        df_show['created_at'] = pd.to_datetime(df_show['created_at'].str.slice(0, 19)).dt.strftime("%m/%d %H:%M")
         df_show.columns = ['Time', 'Match', 'Bet', 'Status', 'P/L', 'Notes']
-        st.dataframe(df_show, use_container_width=True)
+        st.dataframe(df_show, use_container_width=True, hide_index=True)
+
+        nc1, nc2, nc3 = st.columns([1, 2, 1])
+        if nc1.button("◀ 較新", disabled=len(cursors) == 1):
+            cursors.pop(); st.rerun()
+        nc2.caption(f"第 {len(cursors)} 頁 · 每頁 {LOG_PAGE_SIZE} 筆")
+        if nc3.button("較舊 ▶", disabled=next_cursor is None):
+            cursors.append(next_cursor); st.rerun()
     else:
         st.write("Awaiting Data...")
+
+    # [NEW] 模型校準：預測勝率 vs 實際結果 (Brier / log-loss)、預期 vs 實際 EV、CLV
+    with st.expander("🎯 模型校準 (Calibration / CLV)"):
+        if st.checkbox("計算校準報表", key="calib_on"):
+            calib_parts = get_calibration_partials(**filters)
+            calib = calibration.summary(calib_parts)
+            if calib is None:
+                st.info("尚無含模型勝率 (P:) 的已結算注單")
+            else:
+                k1, k2, k3, k4 = st.columns(4)
+                k1.metric("Brier", f"{calib['brier']:.4f}")
+                k2.metric("Log-loss", f"{calib['log_loss']:.4f}")
+                k3.metric("EV 預期 / 實際", f"{calib['pred_ev']:.1f}% / {calib['real_ev']:.1f}%")
+                k4.metric("CLV", f"{calib['clv']:.2f}%" if calib['n_clv'] else "—")
+                st.caption(f"{calib['n']:,.0f} 注 · 計分 {calib['n_scored']:,.0f} 注 (走水不計) · "
+                           f"有收盤賠率 {calib['n_clv']:,.0f} 注")
+                df_rel = calibration.reliability(calib_parts)
+                st.line_chart(df_rel.set_index('bin')[['pred_p', 'hit_rate']])
+                calib_by = st.radio("分組", ["聯賽 × 玩法", "聯賽", "玩法"], horizontal=True)
+                by = {"聯賽 × 玩法": ("league", "market"), "聯賽": "league", "玩法": "market"}[calib_by]
+                st.dataframe(calibration.report(calib_parts, by), use_container_width=True, hide_index=True)
+
+    # [NEW] 蒙地卡羅：待定注單 / 賽程篩選結果的資金分布與破產機率
+    with st.expander("🎲 蒙地卡羅資金模擬 (Risk of Ruin)"):
+        sim_sources = ["待定注單"] + (["賽程篩選 (Kelly 複利)"] if 'slate_pick' in st.session_state else [])
+        sim_src = st.radio("模擬對象", sim_sources, horizontal=True)
+        sm1, sm2, sm3 = st.columns(3)
+        with sm1: sim_paths = st.number_input("路徑數", value=simulation.DEFAULT_PATHS, step=10_000, min_value=1_000)
+        with sm2: sim_seed = st.number_input("Seed", value=simulation.DEFAULT_SEED, step=1)
+        with sm3: sim_ruin = st.number_input("破產線 (本金 %)", value=0.0, step=5.0, min_value=0.0, max_value=100.0)
+        if st.button("🎲 執行模擬"):
+            if sim_src == "待定注單":
+                sim_plan, sim_skipped = simulation.plan_from_pending(get_pending_bets())
+                sim_mode = "fixed"
+            else:
+                sim_plan, sim_skipped = simulation.plan_from_slate(st.session_state['slate_pick']), 0
+                sim_mode = "kelly"
+            with st.spinner("模擬中..."):
+                st.session_state['sim_result'] = simulation.simulate(
+                    sim_plan, curr_bankroll, n_paths=int(sim_paths), seed=int(sim_seed),
+                    mode=sim_mode, ruin_level=sim_ruin / 100)
+            st.session_state['sim_skipped'] = sim_skipped
+        sim = st.session_state.get('sim_result')
+        if sim:
+            if st.session_state.get('sim_skipped'):
+                st.caption(f"略過 {st.session_state['sim_skipped']} 筆 (筆記內沒有 P: 勝率)")
+            s1, s2, s3 = st.columns(3)
+            s1.metric("Risk of Ruin", f"{sim['risk_of_ruin'] * 100:.2f}%")
+            s2.metric("期末資金 (平均)", f"${sim['mean_terminal']:,.0f}")
+            s3.metric("虧損機率", f"{sim['prob_loss'] * 100:.1f}%")
+            hist_dd = (get_equity_summary() or {}).get('max_dd', 0.0)
+            st.caption(f"{sim['n_paths']:,} 條路徑 × {sim['n_bets']} 注 · seed {sim['seed']} · "
+                       f"歷史最大回撤 {hist_dd:.1f}% 位於模擬分布第 {simulation.dd_percentile(sim, hist_dd):.0f} 百分位")
+            st.dataframe(simulation.quantile_table(sim), use_container_width=True, hide_index=True)
+
+# === 效能面板 ===
+if st.session_state.get('perf_panel'):
+    perf = metrics.current()
+    with st.expander("🐞 本次 Rerun 效能", expanded=True):
+        pc1, pc2, pc3, pc4 = st.columns(4)
+        pc1.metric("耗時", f"{perf.elapsed_ms():.0f} ms")
+        pc2.metric("SQL", perf.root.sql)
+        pc3.metric("列數", perf.root.rows)
+        cinfo = cache_info()
+        pc4.metric("快取命中", f"{cinfo['hits']}/{cinfo['hits'] + cinfo['misses']}")
+        st.dataframe(perf.table(), use_container_width=True, hide_index=True)
+        if metrics.METRICS_FILE:
+            st.caption(f"每次 rerun 附加寫入 {metrics.METRICS_FILE}")
+
+metrics.finish_rerun()
@@ -0,0 +1 @@
+"""Sniper Bet Pro 的非 UI 模組 (資料層 / 分析 / 批次工具)。"""
@@ -0,0 +1,189 @@
+"""
+📊 向量化分析引擎
+一次掃描計算權益曲線、回撤、勝率、ROI、平均賠率、流水與獲利因子，
+並以 groupby 產生聯賽 / 玩法 / 賠率區間 / 月份的分段報表。
+數值定義與 App.py 的 calculate_max_drawdown 及戰情室指標一致。
+"""
+import numpy as np
+import pandas as pd
+
+from sniper.parsing import parse_league, parse_market
+
+PENDING = '待定'
+ODDS_BINS = [0.0, 1.5, 1.8, 2.0, 2.5, 3.5, np.inf]
+ODDS_LABELS = ['<1.50', '1.50-1.79', '1.80-1.99', '2.00-2.49', '2.50-3.49', '3.50+']
+SEGMENTS = ['league', 'market', 'odds_bucket', 'month']
+
+
+def _map_unique(series, func):
+    """只對唯一值做字串解析，再以代碼展開成 Categorical (match_info 重複率極高)"""
+    codes, uniques = pd.factorize(series)
+    mapped = pd.Series([func(u) for u in uniques], dtype=object)
+    cat_codes, cats = pd.factorize(mapped, sort=True)
+    codes = np.where(codes >= 0, cat_codes[codes] if len(cat_codes) else -1, -1)
+    return pd.Series(pd.Categorical.from_codes(codes, categories=cats), index=series.index)
+
+
+def equity_curve(profits, initial):
+    """回傳含起點的權益曲線 (長度 n+1)，等同戰情室逐筆累加"""
+    profits = np.asarray(profits, dtype=float)
+    out = np.empty(len(profits) + 1)
+    out[0] = initial
+    np.cumsum(profits, out=out[1:])
+    out[1:] += initial
+    return out
+
+
+def max_drawdown(equity):
+    """向量化最大回撤 (%)，與 calculate_max_drawdown 相同定義"""
+    equity = np.asarray(equity, dtype=float)
+    if equity.size == 0:
+        return 0.0
+    peak = np.maximum.accumulate(equity)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dd = np.where(peak > 0, (peak - equity) / peak, 0.0)
+    return float(dd.max()) * 100
+
+
+def prepare(df):
+    """篩出已結算注單、依結算時間排序並加上分段欄位"""
+    settled = df[df['status'] != PENDING]
+    if not settled['settled_at'].is_monotonic_increasing:
+        settled = settled.sort_values('settled_at', kind='stable')
+    settled = settled.reset_index(drop=True)
+    out = pd.DataFrame({
+        'settled_at': settled['settled_at'],
+        'stake': settled['stake'].astype(float),
+        'odds': settled['odds'].astype(float),
+        'profit': settled['profit'].astype(float),
+    })
+    # 有結構化欄位 (bets.league / bets.market) 時直接使用，否則退回字串解析
+    if 'league' in settled and settled['league'].notna().all():
+        out['league'] = settled['league'].astype('category')
+    else:
+        out['league'] = _map_unique(settled['match_info'], parse_league)
+    if 'market' in settled and settled['market'].notna().all():
+        out['market'] = settled['market'].astype('category')
+    else:
+        out['market'] = _map_unique(settled['bet_type'], parse_market)
+    out['odds_bucket'] = pd.cut(out['odds'], bins=ODDS_BINS, labels=ODDS_LABELS, right=False)
+    # ISO 字串已是台北時間，前 7 碼即為 YYYY-MM
+    out['month'] = pd.Categorical(settled['settled_at'].str.slice(0, 7))
+    return out
+
+
+def summarize(settled, initial):
+    """整體指標 (輸入為 prepare() 結果)"""
+    profit = settled['profit'].to_numpy()
+    stake = settled['stake'].to_numpy()
+    odds = settled['odds'].to_numpy()
+    curve = equity_curve(profit, initial)
+    total = len(profit)
+    gross_win = profit[profit > 0].sum()
+    gross_loss = -profit[profit < 0].sum()
+    turnover = stake.sum()
+    return {
+        'n_settled': total,
+        'n_wins': int((profit > 0).sum()),
+        'win_rate': float((profit > 0).sum() / total * 100) if total else 0.0,
+        'profit': float(profit.sum()),
+        'turnover': float(turnover),
+        'roi': float((curve[-1] - initial) / initial * 100) if initial else 0.0,
+        'yield': float(profit.sum() / turnover * 100) if turnover else 0.0,
+        'avg_odds': float(odds.mean()) if total else 0.0,
+        'profit_factor': float(gross_win / gross_loss) if gross_loss else float('inf') if gross_win else 0.0,
+        'equity': float(curve[-1]),
+        'max_dd': max_drawdown(curve),
+    }
+
+
+def breakdown(settled, by, initial):
+    """
+    分段報表：by 可為單一欄位或欄位列表 (交叉分段)。
+    全部分段以整數代碼 + bincount 一次完成，不需每段各查一次 DB。
+    回撤以「起始本金 + 該分段累積損益」計算。
+    """
+    keys = [by] if isinstance(by, str) else list(by)
+    profit = settled['profit'].to_numpy(dtype=float)
+    stake = settled['stake'].to_numpy(dtype=float)
+    odds = settled['odds'].to_numpy(dtype=float)
+
+    # 多欄位 → 單一群組代碼 (Categorical 直接取 codes，不再重新雜湊字串)
+    codes = np.zeros(len(settled), dtype=np.int64)
+    levels = []
+    for k in keys:
+        col = settled[k]
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            c, u = col.cat.codes.to_numpy().astype(np.int64), col.cat.categories
+            c = np.where(c < 0, len(u), c)
+            u = list(u) + [None]
+        else:
+            c, u = pd.factorize(col, sort=True, use_na_sentinel=False)
+        codes = codes * len(u) + c
+        levels.append(u)
+    codes, group_ids = pd.factorize(codes, sort=True)
+    n_groups = len(group_ids)
+
+    def _sum(w):
+        return np.bincount(codes, weights=w, minlength=n_groups)
+
+    n_settled = np.bincount(codes, minlength=n_groups)
+    n_wins = np.bincount(codes[profit > 0], minlength=n_groups)
+    gross_win = _sum(np.clip(profit, 0, None))
+    gross_loss = -_sum(np.clip(profit, None, 0))
+    total = _sum(profit)
+    turnover = _sum(stake)
+
+    # 分段內累積權益與峰值 (groupby 以整數代碼做 cumsum / cummax，免排序)
+    equity = initial + pd.Series(profit).groupby(codes).cumsum()
+    peak = np.maximum(equity.groupby(codes).cummax().to_numpy(), initial)
+    equity = equity.to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dd = np.where(peak > 0, (peak - equity) / peak, 0.0) * 100
+    max_dd = pd.Series(dd).groupby(codes).max().reindex(range(n_groups), fill_value=0.0).to_numpy()
+
+    out = {}
+    rem = group_ids.astype(np.int64)
+    for k, u in reversed(list(zip(keys, levels))):
+        out[k] = np.asarray(u, dtype=object)[rem % len(u)]
+        rem = rem // len(u)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out.update({
+            'n_settled': n_settled,
+            'n_wins': n_wins,
+            'profit': total,
+            'turnover': turnover,
+            'avg_odds': _sum(odds) / n_settled,
+            'max_dd': max_dd,
+            'win_rate': n_wins / n_settled * 100,
+            'roi': total / initial * 100 if initial else np.zeros(n_groups),
+            'yield': np.where(turnover > 0, total / turnover * 100, 0.0),
+            'profit_factor': np.where(gross_loss > 0, gross_win / gross_loss,
+                                      np.where(gross_win > 0, np.inf, 0.0)),
+        })
+    return pd.DataFrame({k: out[k] for k in keys + [c for c in out if c not in keys]})
+
+
+def lttb(y, n_out, x=None):
+    """
+    Largest-Triangle-Three-Buckets 降採樣：回傳保留點的索引 (遞增，含首尾)。
+    每個區間保留與前一保留點、下一區間平均點構成三角形面積最大的點，峰谷形狀得以保留。
+    x 預設為 0..n-1 (逐筆等距)。
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=float) if x is None else np.asarray(x, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)      # 中間 n_out-2 個區間
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, (edges[i + 2] if i + 2 < len(edges) else n)
+        cx, cy = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
@@ -0,0 +1,584 @@
+"""
+🛰 無頭 API (本機 HTTP + CLI)
+讓爬蟲 / 機器人直接下注、結算、撤銷，不必驅動 Streamlit (每個動作一次完整 rerun)。
+與儀表板共用同一個 SQLite 檔：寫入一律經 db 的寫入佇列 (BEGIN IMMEDIATE + busy timeout)，
+儀表板的查詢快取以 PRAGMA data_version 偵測到其他行程的 commit 後自動失效。
+
+- 請求合併：同一批 (或同時進來的多個請求) 的每筆操作並行送進寫入佇列，
+  由寫入執行緒合併成 group commit；同時進行的相同 GET 只查詢一次 (single-flight)
+- 請求本文：JSON 物件 (單筆)、JSON 陣列 (批次) 或 NDJSON (Content-Type: application/x-ndjson，批次)
+- 回應：單筆回傳結果物件；批次回傳 {"ok", "failed", "results": [...]}，NDJSON 請求回 NDJSON
+- SNIPER_API_TOKEN 有設定時需帶 Authorization: Bearer <token>
+
+端點：
+    GET  /health              {"ok": true, "schema": N}
+    GET  /config              {"bankroll", "initial"}
+    GET  /pending?limit=50    待定注單
+    GET  /stats               請求 / 操作計數與寫入佇列的 group commit 統計
+    POST /metrics             {ev, odds, fraction?, bankroll?} → 隱含勝率 / Kelly / 建議金額
+    POST /bets                {match, bet_type, odds, stake? | ev, sharpe?, notes?, fraction?}
+    POST /settle              {id, result: 贏|贏半|輸|輸半|走水, closing_odds?}
+    POST /revoke              {id}
+
+CLI：python -m sniper.api serve | add | settle | revoke | metrics | bench  (見 --help)
+"""
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from sniper import db
+from sniper.betting import RESULT_CODES, calculate_pnl, calculate_reverse_metrics
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY = 16 * 1024 * 1024
+MAX_BATCH = 10_000
+WORKERS = db.GROUP_COMMIT_MAX      # 同時送進寫入佇列的操作數 = 單次 group commit 上限
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+ERR_INVALID = "INVALID_REQUEST"
+ERR_NO_EDGE = "NO_EDGE"
+ERR_DUPLICATE = "DUPLICATE_BET"
+ERR_UNKNOWN_ID = "UNKNOWN_ID"
+ERR_ALREADY_SETTLED = "ALREADY_SETTLED"
+ERR_NOT_SETTLED = "NOT_SETTLED"
+
+
+class RequestError(ValueError):
+    """單筆請求內容錯誤 (回報在該筆結果，不影響同批其他筆)"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class NotFound(LookupError):
+    """請求的路徑不存在 (回 404)"""
+
+
+def _number(item, key, required=True, default=None):
+    value = item.get(key, default)
+    if value is None:
+        if required:
+            raise RequestError(ERR_INVALID, f"缺少 {key}")
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise RequestError(ERR_INVALID, f"{key} 必須是數字") from None
+    if value != value:
+        raise RequestError(ERR_INVALID, f"{key} 必須是數字")
+    return value
+
+
+# ==========================================
+# 🧩 操作 (HTTP 與 CLI 共用)
+# ==========================================
+def op_metrics(item):
+    ev = _number(item, "ev")
+    odds = _number(item, "odds")
+    bankroll = _number(item, "bankroll", required=False)
+    if bankroll is None:
+        bankroll, _ = db.get_config()
+    p, k_frac, stake = calculate_reverse_metrics(ev, odds, fraction=_number(item, "fraction", default=0.25),
+                                                 bankroll=bankroll)
+    return {"implied_p": float(p), "kelly_frac": float(k_frac), "stake": float(stake)}
+
+
+def op_add(item):
+    match = item.get("match") or item.get("match_info")
+    bet_type = item.get("bet_type")
+    if not match or not bet_type:
+        raise RequestError(ERR_INVALID, "缺少 match 或 bet_type")
+    odds = _number(item, "odds")
+    if odds <= 1:
+        raise RequestError(ERR_INVALID, "odds 必須大於 1")
+    ev = _number(item, "ev", required=False)
+    sharpe = _number(item, "sharpe", required=False, default=0.0)
+    stake = _number(item, "stake", required=False)
+    model = None
+    notes = item.get("notes")
+    if ev is not None:
+        m = op_metrics({"ev": ev, "odds": odds, "fraction": item.get("fraction", 0.25)})
+        model = (ev / 100, sharpe, m["implied_p"])
+        if stake is None:
+            stake = m["stake"]        # 與 UI 相同：未指定金額時採建議倉位
+        if notes is None:
+            notes = f"EV:{ev}% | Sharpe:{sharpe} | P:{m['implied_p'] * 100:.1f}%"
+    if stake is None:
+        raise RequestError(ERR_INVALID, "缺少 stake (或提供 ev 以 Kelly 計算)")
+    if stake <= 0:
+        raise RequestError(ERR_NO_EDGE, "建議金額為 0 (無正期望值)")
+    ok, result = db.add_bet_db(str(match), str(bet_type), stake, odds, notes or "", model=model)
+    if not ok:
+        raise RequestError(ERR_DUPLICATE, result)
+    return {"id": result, "stake": stake}
+
+
+def op_settle(item, bet=None):
+    bet_id = item.get("id")
+    result = item.get("result")
+    if not bet_id:
+        raise RequestError(ERR_INVALID, "缺少 id")
+    if result not in RESULT_CODES:
+        raise RequestError(ERR_INVALID, f"result 必須是 {'/'.join(RESULT_CODES)}")
+    closing = _number(item, "closing_odds", required=False)
+    if bet is None:
+        bet = db.get_bets_by_ids([bet_id]).get(bet_id)
+    if bet is None:
+        raise RequestError(ERR_UNKNOWN_ID, "找不到注單")
+    if bet["status"] != "待定":
+        raise RequestError(ERR_ALREADY_SETTLED, f"已結算 ({bet['status']})")
+    profit = calculate_pnl(bet["stake"], bet["odds"], result)
+    # 查詢與寫入之間可能被儀表板 / 同批重複 id 搶先結算 → 在寫入交易內再確認一次
+    if not db.settle_bet_db(bet_id, profit, result, closing, pending_only=True):
+        raise RequestError(ERR_ALREADY_SETTLED, "已結算")
+    return {"id": bet_id, "profit": float(profit)}
+
+
+def op_revoke(item):
+    bet_id = item.get("id")
+    if not bet_id:
+        raise RequestError(ERR_INVALID, "缺少 id")
+    if not db.revoke_settlement_db(bet_id, settled_only=True):
+        raise RequestError(ERR_NOT_SETTLED, "找不到已結算的注單")
+    return {"id": bet_id}
+
+
+OPS = {"/metrics": op_metrics, "/bets": op_add, "/settle": op_settle, "/revoke": op_revoke}
+
+
+def _call(op, item, *args):
+    if not isinstance(item, dict):
+        return {"ok": False, "error": ERR_INVALID, "message": "每筆必須是 JSON 物件"}
+    try:
+        return dict(op(item, *args), ok=True)
+    except RequestError as e:
+        return {"ok": False, "error": e.code, "message": str(e)}
+
+
+def _prefetch(op, items):
+    """結算前一次查出整批注單 (一條 IN 查詢，不是每筆一次)"""
+    if op is op_settle:
+        bets = db.get_bets_by_ids([i.get("id") for i in items if isinstance(i, dict) and i.get("id")])
+        return [(bets.get(i.get("id")),) if isinstance(i, dict) else () for i in items]
+    return [()] * len(items)
+
+
+def run_batch(op, items, executor):
+    """同步版 (CLI)：整批並行送出，由寫入執行緒合併 commit；結果順序同輸入"""
+    futures = [executor.submit(_call, op, item, *e) for item, e in zip(items, _prefetch(op, items))]
+    return [f.result() for f in futures]
+
+
+# ==========================================
+# 🌐 HTTP (asyncio，只用標準函式庫)
+# ==========================================
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed",
+               411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def parse_body(body, content_type):
+    """回傳 (items, is_batch, is_ndjson)；格式錯誤時拋 ValueError"""
+    ndjson = content_type.split(";")[0].strip().lower() in NDJSON_TYPES
+    text = body.decode("utf-8")
+    if ndjson:
+        return [json.loads(line) for line in text.splitlines() if line.strip()], True, True
+    data = json.loads(text or "{}")
+    if isinstance(data, list):
+        return data, True, False
+    return [data], False, False
+
+
+class Server:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, token=None, workers=WORKERS):
+        self.host = host
+        self.port = port
+        self.token = token if token is not None else os.environ.get("SNIPER_API_TOKEN")
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sniper-api")
+        self.inflight = {}         # GET single-flight
+        self.stats = {"requests": 0, "ops": 0, "coalesced_gets": 0}
+        self.server = None
+        self.clients = set()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def shutdown(self):
+        """停止接受連線並結束所有 keep-alive 連線"""
+        if self.server is not None:
+            self.server.close()
+        for task in list(self.clients):
+            task.cancel()
+        await asyncio.gather(*self.clients, return_exceptions=True)
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+        self.executor.shutdown(wait=True)
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def _client(self, reader, writer):
+        task = asyncio.current_task()
+        self.clients.add(task)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    method, target, _ = line.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    await self._send(writer, 400, {"error": ERR_INVALID}, close=True)
+                    break
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = h.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                if "chunked" in headers.get("transfer-encoding", "").lower():
+                    await self._send(writer, 411, {"error": ERR_INVALID}, close=True)
+                    break
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._send(writer, 400, {"error": ERR_INVALID, "message": "Content-Length 無效"}, close=True)
+                    break
+                if length > MAX_BODY:
+                    await self._send(writer, 413, {"error": ERR_INVALID}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload, ndjson = await self._dispatch(method, target, headers, body)
+                await self._send(writer, status, payload, ndjson=ndjson, close=not keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass            # 對端斷線 / shutdown() 取消
+        finally:
+            self.clients.discard(task)
+            writer.close()
+
+    async def _send(self, writer, status, payload, ndjson=False, close=False):
+        if ndjson:
+            data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in payload).encode("utf-8")
+            ctype = "application/x-ndjson"
+        else:
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            ctype = "application/json"
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\nContent-Type: {ctype}; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: {'close' if close else 'keep-alive'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + data)
+        await writer.drain()
+
+    async def _dispatch(self, method, target, headers, body):
+        self.stats["requests"] += 1
+        if self.token and not hmac.compare_digest(headers.get("authorization", "").encode("latin-1"),
+                                                  f"Bearer {self.token}".encode("utf-8")):
+            return 401, {"error": "UNAUTHORIZED"}, False
+        url = urlsplit(target)
+        try:
+            if method == "GET":
+                return 200, await self._get(url.path, url.query), False
+            if method != "POST":
+                return 405, {"error": ERR_INVALID}, False
+            op = OPS.get(url.path)
+            if op is None:
+                raise NotFound(url.path)
+            try:
+                items, batch, ndjson = parse_body(body, headers.get("content-type", ""))
+            except (ValueError, UnicodeDecodeError) as e:
+                return 400, {"error": ERR_INVALID, "message": f"本文不是有效的 JSON / NDJSON：{e}"}, False
+            if len(items) > MAX_BATCH:
+                return 413, {"error": ERR_INVALID, "message": f"單批最多 {MAX_BATCH} 筆"}, False
+            self.stats["ops"] += len(items)
+            extra = await self._run(_prefetch, op, items)
+            results = await asyncio.gather(*(self._run(_call, op, item, *e) for item, e in zip(items, extra)))
+            if ndjson:
+                return 200, results, True
+            if not batch:
+                return (200 if results[0]["ok"] else 400), results[0], False
+            n_ok = sum(r["ok"] for r in results)
+            return 200, {"ok": n_ok, "failed": len(results) - n_ok, "results": results}, False
+        except NotFound:
+            return 404, {"error": "NOT_FOUND"}, False
+        except RequestError as e:
+            return 400, {"error": e.code, "message": str(e)}, False
+        except Exception as e:      # 不讓單一請求的例外拖垮連線
+            return 500, {"error": type(e).__name__, "message": str(e)}, False
+
+    async def _get(self, path, query):
+        """GET 唯讀查詢：同時進行的相同請求共用一次查詢結果"""
+        key = (path, query)
+        fut = self.inflight.get(key)
+        if fut is not None:
+            self.stats["coalesced_gets"] += 1
+            return await asyncio.shield(fut)
+        fut = asyncio.ensure_future(self._run(self._read, path, parse_qs(query)))
+        self.inflight[key] = fut
+        try:
+            return await fut
+        finally:
+            self.inflight.pop(key, None)
+
+    def _read(self, path, qs):
+        if path == "/health":
+            from sniper.migrations import SCHEMA_VERSION
+            return {"ok": True, "schema": SCHEMA_VERSION}
+        if path == "/config":
+            bankroll, initial = db.get_config()
+            return {"bankroll": bankroll, "initial": initial}
+        if path == "/pending":
+            try:
+                limit = int(qs.get("limit", ["50"])[0])
+            except ValueError:
+                raise RequestError(ERR_INVALID, "limit 必須是整數") from None
+            if limit < 1:
+                raise RequestError(ERR_INVALID, "limit 必須大於 0")
+            df, _ = db.page_bets(limit=limit, status="待定")
+            return json.loads(df.to_json(orient="records", force_ascii=False))
+        if path == "/stats":
+            stats = db.get_pool().write_stats
+            return dict(self.stats, write_groups=stats.get("groups"), max_group=stats.get("max_group"))
+        raise NotFound(path)
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, token=None):
+    db.init_db()
+
+    async def _main():
+        server = await Server(host, port, token).start()
+        print(f"sniper api listening on http://{server.host}:{server.port} (db: {db.DB_PATH})", flush=True)
+        try:
+            await server.serve_forever()
+        finally:
+            server.close()
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        pass
+
+
+# ==========================================
+# ⏱ 壓測 (requests / sec)
+# ==========================================
+async def _request(reader, writer, method, path, payload=None, token=None):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else b""
+    auth = f"Authorization: Bearer {token}\r\n" if token else ""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: local\r\nContent-Type: application/json\r\n{auth}"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b""):
+            break
+        k, _, v = h.decode("latin-1").partition(":")
+        if k.strip().lower() == "content-length":
+            length = int(v)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def _load(host, port, n_requests, concurrency, batch, token=None):
+    """concurrency 條 keep-alive 連線並行送出：先下注、再結算；回傳各階段耗時與結果"""
+    counter = iter(range(n_requests))
+    ids, statuses = [], {}
+
+    async def _worker(make):
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for i in counter:
+                status, out = await _request(reader, writer, "POST", *make(i), token=token)
+                statuses[status] = statuses.get(status, 0) + 1
+                rows = out["results"] if batch > 1 else [out]
+                ids.extend(r["id"] for r in rows if r.get("ok") and "stake" in r)
+        finally:
+            writer.close()
+
+    def _bet(i):
+        items = [{"match": f"[API] 主{i}-{j} vs 客{i}-{j}", "bet_type": "獨贏 [主勝]",
+                  "odds": 1.9 + (j % 10) / 100, "ev": 3.0} for j in range(batch)]
+        return "/bets", (items if batch > 1 else items[0])
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_worker(_bet) for _ in range(concurrency)))
+    add_s = time.perf_counter() - t0
+
+    chunks = [ids[i:i + batch] for i in range(0, len(ids), batch)]
+    counter = iter(range(len(chunks)))
+
+    def _settle(i):
+        items = [{"id": b, "result": "贏" if (i + k) % 2 else "輸"} for k, b in enumerate(chunks[i])]
+        return "/settle", (items if batch > 1 else items[0])
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_worker(_settle) for _ in range(concurrency)))
+    settle_s = time.perf_counter() - t0
+    return {"add_s": add_s, "settle_s": settle_s, "bets": len(ids), "statuses": statuses}
+
+
+def _spawn(path, token=None):
+    """以 CLI 在子行程啟動伺服器 (指定 --db，不動本行程的 db.DB_PATH)；回傳 (proc, host, port)"""
+    env = dict(os.environ, SNIPER_API_TOKEN=token or "")
+    proc = subprocess.Popen([sys.executable, "-m", "sniper.api", "--db", path, "serve", "--port", "0"],
+                            stdout=subprocess.PIPE, text=True, env=env)
+    line = proc.stdout.readline()
+    if not line.startswith("sniper api listening on "):
+        proc.kill()
+        raise RuntimeError(f"API 伺服器啟動失敗：{line.strip() or proc.wait()}")
+    addr = urlsplit(line.split()[4])
+    return proc, addr.hostname, addr.port
+
+
+def _stop(proc):
+    proc.send_signal(signal.SIGINT if os.name == "posix" else signal.SIGTERM)
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+    proc.stdout.close()
+
+
+async def _stats(host, port, token=None):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        return (await _request(reader, writer, "GET", "/stats", token=token))[1]
+    finally:
+        writer.close()
+
+
+def bench(n_requests=2000, concurrency=16, batch=1, url=None, token=None, path=None):
+    """
+    對本機 API 壓測。未給 url 時以 path (預設為暫存目錄內的新 DB) 在子行程啟動一個伺服器。
+    回傳 {'requests', 'ops', 'add_rps', 'settle_rps', 'add_ops_s', 'settle_ops_s', ...}
+    """
+    proc = None
+    if url is None:
+        path = path or os.path.join(tempfile.mkdtemp(prefix="sniper_api_"), "api.db")
+        proc, host, port = _spawn(path, token)
+    else:
+        parts = urlsplit(url)
+        host, port = parts.hostname, parts.port or 80
+    try:
+        r = asyncio.run(_load(host, port, n_requests, concurrency, batch, token))
+        stats = asyncio.run(_stats(host, port, token))
+    finally:
+        if proc is not None:
+            _stop(proc)
+    ops = r["bets"]
+    return {
+        "requests": n_requests, "batch": batch, "concurrency": concurrency, "ops": ops,
+        "add_rps": n_requests / r["add_s"], "add_ops_s": ops / r["add_s"],
+        "settle_rps": -(-ops // batch) / r["settle_s"] if r["settle_s"] else 0.0,
+        "settle_ops_s": ops / r["settle_s"] if r["settle_s"] else 0.0,
+        "statuses": r["statuses"], "db": path if url is None else url,
+        "write_groups": stats.get("write_groups"), "max_group": stats.get("max_group"),
+    }
+
+
+# ==========================================
+# ⌨️ CLI
+# ==========================================
+def _read_items(path):
+    """--file：JSON (物件 / 陣列) 或 NDJSON；'-' 代表 stdin"""
+    text = sys.stdin.read() if path == "-" else open(path, encoding="utf-8").read()
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        return json.loads(text)
+    if stripped.startswith("{") and "\n{" not in stripped.rstrip():
+        return [json.loads(text)]
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m sniper.api", description="Sniper Bet Pro 無頭 API")
+    ap.add_argument("--db", help="DB 路徑 (預設 SNIPER_DB_PATH / sniper_v9.db)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    sp = sub.add_parser("serve", help="啟動本機 HTTP 伺服器")
+    sp.add_argument("--host", default=DEFAULT_HOST)
+    sp.add_argument("--port", type=int, default=DEFAULT_PORT)
+
+    sp = sub.add_parser("add", help="下注 (單筆參數或 --file 批次)")
+    sp.add_argument("--match")
+    sp.add_argument("--bet-type")
+    sp.add_argument("--odds", type=float)
+    sp.add_argument("--stake", type=float)
+    sp.add_argument("--ev", type=float)
+    sp.add_argument("--sharpe", type=float)
+    sp.add_argument("--notes")
+    sp.add_argument("--file")
+
+    sp = sub.add_parser("settle", help="結算 (單筆參數或 --file 批次)")
+    sp.add_argument("--id")
+    sp.add_argument("--result", choices=RESULT_CODES)
+    sp.add_argument("--closing-odds", type=float)
+    sp.add_argument("--file")
+
+    sp = sub.add_parser("revoke", help="撤銷結算")
+    sp.add_argument("--id")
+    sp.add_argument("--file")
+
+    sp = sub.add_parser("metrics", help="反推隱含勝率 / Kelly / 建議金額")
+    sp.add_argument("--ev", type=float, required=True)
+    sp.add_argument("--odds", type=float, required=True)
+    sp.add_argument("--fraction", type=float, default=0.25)
+    sp.add_argument("--bankroll", type=float)
+
+    sp = sub.add_parser("bench", help="壓測 requests / sec")
+    sp.add_argument("--requests", type=int, default=2000)
+    sp.add_argument("--concurrency", type=int, default=16)
+    sp.add_argument("--batch", type=int, default=1, help="每個請求的筆數")
+    sp.add_argument("--url", help="壓測既有伺服器 (預設以 --db 或暫存 DB 在子行程啟動伺服器)")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "bench":
+        print(json.dumps(bench(args.requests, args.concurrency, args.batch, args.url,
+                               os.environ.get("SNIPER_API_TOKEN"), path=args.db), ensure_ascii=False, indent=2))
+        return 0
+    if args.db:
+        db.DB_PATH = args.db       # CLI 行程只操作這一個 DB
+    if args.cmd == "serve":
+        serve(args.host, args.port)
+        return 0
+
+    db.init_db()
+    op = {"add": op_add, "settle": op_settle, "revoke": op_revoke, "metrics": op_metrics}[args.cmd]
+    if getattr(args, "file", None):
+        items = _read_items(args.file)
+    else:
+        fields = {"match", "bet_type", "odds", "stake", "ev", "sharpe", "notes", "id", "result", "closing_odds",
+                  "fraction", "bankroll"}
+        items = [{k: v for k, v in vars(args).items() if k in fields and v is not None}]
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        results = run_batch(op, items, executor)
+    for r in results:
+        print(json.dumps(r, ensure_ascii=False))
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+"""
+🧾 稽核日誌：檢查點 / 封存 / 重播
+- 檢查點 (audit_checkpoint)：套用到某個日誌序號 seq 為止的資金與帳本快照，
+  由 db.log_audit 每 CHECKPOINT_EVERY 筆自動建立，也可手動 checkpoint()
+- 封存：把最新檢查點之前的日誌寫成 gzip NDJSON (DB 之外)，再從 audit_log 刪除並截斷 WAL
+- 重播：從最新檢查點 + 其後的日誌尾段重算資金並與 config 比對，耗時只與尾段長度有關；
+  full=True 時先以 sha256 驗證每個封存檔，再從頭 (封存檔 + DB 內日誌) 完整重算，並核對檢查點
+
+CLI：python -m sniper.audit stats | checkpoint | archive | replay [--full] [--repair] | verify
+"""
+import argparse
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import sys
+
+from sniper import db
+
+ARCHIVE_DIR = os.environ.get("SNIPER_ARCHIVE_DIR", "audit_archive")
+DEFAULT_BANKROLL = 10000.0
+TOLERANCE = 0.005          # 批次結算以總和一次加到資金，逐筆重播允許半分的浮點差
+CHUNK_SIZE = 10000
+
+
+def _bankroll_after(action, payload, bankroll):
+    """單筆日誌對資金的影響 (與各寫入路徑的 UPDATE config 一致)"""
+    if action == "SETTLE_BET":
+        return bankroll + float(payload.get("profit", 0.0)) - float(payload.get("old_profit", 0.0))
+    if action == "REVOKE_SETTLE":
+        return bankroll - float(payload.get("removed_profit", 0.0))
+    if action == "BATCH_IMPORT":
+        return bankroll + float(payload.get("profit", 0.0))
+    if action in ("UPDATE_CONFIG", "REPAIR_BANKROLL") and "bankroll" in payload:
+        return float(payload["bankroll"])
+    if action == "SYSTEM_RESET":
+        return DEFAULT_BANKROLL
+    # ADD_BET / BATCH_SETTLE (明細已記在各自的 SETTLE_BET) 不影響資金
+    return bankroll
+
+
+def latest_checkpoint(conn):
+    row = conn.execute(f"SELECT {', '.join(db.CHECKPOINT_COLUMNS)} FROM audit_checkpoint "
+                       "ORDER BY seq DESC LIMIT 1").fetchone()
+    return dict(zip(db.CHECKPOINT_COLUMNS, row)) if row else None
+
+
+def checkpoint():
+    """立即建立檢查點；回傳其 seq"""
+    with db.write_txn() as conn:
+        return db.write_checkpoint(conn)
+
+
+def replay(repair=False, full=False):
+    """
+    由最新檢查點 + 日誌尾段重算資金，並與 config 的 bankroll 比對。
+    full=True：不信任檢查點，先驗證所有封存檔的 sha256，再從預設資金依序重播封存檔與 DB 內全部日誌；
+    途中經過檢查點時核對其 bankroll (checkpoint_ok)。封存檔遺失或被改動時列在 bad_archives，ok 為 False。
+    repair=True 且不一致時，以重播結果覆寫 config 並記錄 REPAIR_BANKROLL (封存檔有問題時不修正)。
+    回傳 {'checkpoint_seq', 'replayed', 'bankroll', 'stored', 'diff', 'ok', 'repaired',
+    'archives_verified', 'bad_archives', 'checkpoint_ok'}
+    """
+    with db.read_conn() as conn:
+        conn.execute("BEGIN")           # 單一讀取快照：檢查點、封存紀錄、尾段與 config 互相一致
+        try:
+            cp = latest_checkpoint(conn)
+            seq = cp["seq"] if cp else 0
+            archives, bad, cp_ok = [], [], None
+            if full:
+                archives = conn.execute("SELECT path, sha256 FROM audit_archive ORDER BY first_seq").fetchall()
+                bad = [path for path, sha in archives if not _archive_ok(path, sha)]
+                bankroll, last, cp_ok = DEFAULT_BANKROLL, 0, True
+            else:
+                bankroll, last = (cp["bankroll"] if cp else DEFAULT_BANKROLL), seq
+            n = 0
+            if not bad:                 # 封存檔有問題時不重播 (結果不可信)
+                for last, action, payload in _records(conn, [p for p, _ in archives], last):
+                    bankroll = _bankroll_after(action, json.loads(payload or "{}"), bankroll)
+                    n += 1
+                    if full and cp and last == cp["seq"]:
+                        cp_ok = abs(bankroll - cp["bankroll"]) <= TOLERANCE
+            stored = conn.execute("SELECT value FROM config WHERE key='bankroll'").fetchone()
+        finally:
+            conn.rollback()
+    stored = stored[0] if stored else DEFAULT_BANKROLL
+    diff = stored - bankroll
+    result = {
+        "checkpoint_seq": seq, "last_seq": last, "replayed": n,
+        "bankroll": round(bankroll, 2), "stored": stored, "diff": round(diff, 2),
+        "ok": abs(diff) <= TOLERANCE and not bad and cp_ok is not False, "repaired": False,
+        "archives_verified": len(archives) - len(bad), "bad_archives": bad, "checkpoint_ok": cp_ok,
+    }
+    if repair and abs(diff) > TOLERANCE and not bad:
+        with db.write_txn() as conn:
+            conn.execute("UPDATE config SET value=? WHERE key='bankroll'", (round(bankroll, 2),))
+            db.log_audit(conn, "REPAIR_BANKROLL", "SYSTEM",
+                         {"bankroll": round(bankroll, 2), "previous": stored, "through_seq": last})
+        result["repaired"] = True
+    return result
+
+
+def _archive_path(directory, first, last):
+    return os.path.join(directory, f"audit_{first:012d}_{last:012d}.ndjson.gz")
+
+
+def archive(directory=None, keep=0):
+    """
+    把最新檢查點 (含) 以前的日誌封存成 gzip NDJSON，並從 audit_log 刪除。
+    keep：檢查點之前額外保留在 DB 內的最近筆數。沒有檢查點時先建立一個。
+    回傳 {'path', 'first_seq', 'last_seq', 'rows'}；沒有可封存的日誌時回傳 None。
+    """
+    directory = directory or ARCHIVE_DIR
+    with db.read_conn() as conn:
+        cp = latest_checkpoint(conn)
+    upto = cp["seq"] if cp else checkpoint()
+    upto -= keep
+    with db.read_conn() as conn:
+        first = conn.execute("SELECT MIN(id) FROM audit_log WHERE id <= ?", (upto,)).fetchone()[0]
+    if first is None:
+        return None
+
+    os.makedirs(directory, exist_ok=True)
+    path = _archive_path(directory, first, upto)
+    tmp = path + ".tmp"
+    digest = hashlib.sha256()
+    n = 0
+    # 先完整寫好並 fsync 封存檔，成功後才刪除 DB 內的日誌
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+            with db.read_conn() as conn:
+                cur = conn.execute("SELECT id, ts, action, target_id, payload FROM audit_log "
+                                   "WHERE id BETWEEN ? AND ? ORDER BY id", (first, upto))
+                while True:
+                    rows = cur.fetchmany(CHUNK_SIZE)
+                    if not rows:
+                        break
+                    buf = "".join(json.dumps({"id": r[0], "ts": r[1], "action": r[2], "target_id": r[3],
+                                              "payload": r[4]}, ensure_ascii=False) + "\n" for r in rows)
+                    data = buf.encode("utf-8")
+                    digest.update(data)
+                    gz.write(data)
+                    n += len(rows)
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, path)
+
+    with db.write_txn() as conn:
+        conn.execute("DELETE FROM audit_log WHERE id BETWEEN ? AND ?", (first, upto))
+        conn.execute("INSERT OR REPLACE INTO audit_archive (first_seq, last_seq, path, n_rows, sha256, archived_at) "
+                     "VALUES (?, ?, ?, ?, ?, ?)",
+                     (first, upto, os.path.abspath(path), n, digest.hexdigest(),
+                      datetime.datetime.now(db.TZ_TAIPEI).isoformat()))
+        # 封存點之前的舊檢查點已無日誌可接續，只保留最新一個
+        conn.execute("DELETE FROM audit_checkpoint WHERE seq < (SELECT MAX(seq) FROM audit_checkpoint)")
+    # 刪除後把 WAL 寫回主檔並截斷，避免 -wal 檔持續膨脹
+    with db.read_conn() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return {"path": path, "first_seq": first, "last_seq": upto, "rows": n}
+
+
+def _records(conn, archives, after):
+    """依序產生 (seq, action, payload)：先讀封存檔，再讀 DB 內序號大於最後一筆的日誌"""
+    for path in archives:
+        for rec in iter_archive(path):
+            after = rec["id"]
+            yield rec["id"], rec["action"], rec["payload"]
+    cur = conn.execute("SELECT id, action, payload FROM audit_log WHERE id > ? ORDER BY id", (after,))
+    while True:
+        rows = cur.fetchmany(CHUNK_SIZE)
+        if not rows:
+            break
+        yield from rows
+
+
+def _archive_ok(path, sha256):
+    try:
+        return verify_archive(path, sha256)
+    except (OSError, EOFError):         # 檔案遺失 / gzip 截斷
+        return False
+
+
+def verify_archives():
+    """驗證 audit_archive 記錄的每個封存檔；回傳 [(path, rows, ok), ...]"""
+    with db.read_conn() as conn:
+        archives = conn.execute("SELECT path, n_rows, sha256 FROM audit_archive ORDER BY first_seq").fetchall()
+    return [(path, n, _archive_ok(path, sha)) for path, n, sha in archives]
+
+
+def iter_archive(path):
+    """讀回封存檔 (dict 逐筆)"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def verify_archive(path, sha256):
+    """確認封存檔內容與封存時記錄的 sha256 相同"""
+    digest = hashlib.sha256()
+    with gzip.open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest() == sha256
+
+
+def stats():
+    """日誌現況 (側邊欄顯示用)"""
+    with db.read_conn() as conn:
+        # 序號不保證連續 (可能有人刪過中間的日誌) → 以 COUNT 計數
+        n, first, last = conn.execute("SELECT COUNT(*), MIN(id), MAX(id) FROM audit_log").fetchone()
+        cp = latest_checkpoint(conn)
+        tail = conn.execute("SELECT COUNT(*) FROM audit_log WHERE id > ?", (cp["seq"] if cp else 0,)).fetchone()[0]
+        n_arch, arch_rows = conn.execute("SELECT COUNT(*), COALESCE(SUM(n_rows), 0) FROM audit_archive").fetchone()
+    return {"rows": n, "first_seq": first, "last_seq": last,
+            "checkpoint_seq": cp["seq"] if cp else None, "tail": tail,
+            "archives": n_arch, "archived_rows": arch_rows}
+
+
+# ==========================================
+# ⌨️ CLI
+# ==========================================
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m sniper.audit", description="Sniper Bet Pro 稽核日誌")
+    ap.add_argument("--db", help="DB 路徑 (預設 SNIPER_DB_PATH / sniper_v9.db)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats", help="日誌筆數 / 檢查點 / 封存現況")
+    sub.add_parser("checkpoint", help="立即建立檢查點")
+    sp = sub.add_parser("archive", help="封存最新檢查點以前的日誌")
+    sp.add_argument("--dir", help="封存目錄 (預設 SNIPER_ARCHIVE_DIR / audit_archive)")
+    sp.add_argument("--keep", type=int, default=0)
+    sp = sub.add_parser("replay", help="重播日誌並與資金比對")
+    sp.add_argument("--full", action="store_true", help="驗證封存檔後從頭重播 (不信任檢查點)")
+    sp.add_argument("--repair", action="store_true", help="不一致時以重播結果修正資金")
+    sub.add_parser("verify", help="驗證封存檔 sha256")
+    args = ap.parse_args(argv)
+
+    if args.db:
+        db.DB_PATH = args.db
+    db.init_db()
+    if args.cmd == "stats":
+        print(json.dumps(stats(), ensure_ascii=False))
+    elif args.cmd == "checkpoint":
+        print(checkpoint())
+    elif args.cmd == "archive":
+        print(json.dumps(archive(args.dir, args.keep), ensure_ascii=False))
+    elif args.cmd == "replay":
+        result = replay(repair=args.repair, full=args.full)
+        print(json.dumps(result, ensure_ascii=False))
+        return 0 if result["ok"] or result["repaired"] else 1
+    elif args.cmd == "verify":
+        results = verify_archives()
+        for path, n, ok in results:
+            print(f"{'OK ' if ok else 'BAD'}  {n:>10,}  {path}")
+        return 0 if all(ok for _, _, ok in results) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
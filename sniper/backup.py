@@ -0,0 +1,335 @@
+"""
+💾 線上快照備份 / 還原
+- 備份：以 sqlite3.Connection.backup(pages=N) 分段複製整個 DB 檔 (bets、audit_log、帳本、彙總…全部)。
+  來源連線先開一個讀取交易固定快照 (WAL 模式下讀取不擋寫入)，所以複製期間其他連線照常寫入，
+  備份也不會因為來源被改動而從頭重來；成本與 DB 頁數成正比，與注單筆數 / Python 物件無關。
+- 快照以 gzip 壓縮，旁邊附 <快照>.sha256 (sha256sum 格式) 與 <快照>.json (中繼資料)；
+  內容與上一份相同時不另存 (排程備份不會堆出一樣的檔案)，只保留最近 KEEP 份。
+- 還原：驗證 sha256 → 解壓到同目錄暫存檔 → quick_check → 先替現行 DB 做一份 pre-restore 快照 →
+  關閉本行程連線 → os.replace 原子替換 → 套用 migrations。
+  還原會換掉 DB 檔：其他行程 (儀表板 / API) 請先停止。
+
+CLI：python -m sniper.backup create | list | verify | restore <快照>
+"""
+import argparse
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from sniper import db
+
+BACKUP_DIR = os.environ.get("SNIPER_BACKUP_DIR", "backups")
+KEEP = int(os.environ.get("SNIPER_BACKUP_KEEP", "10"))
+INTERVAL = int(os.environ.get("SNIPER_BACKUP_INTERVAL", str(6 * 3600)))   # 排程間隔 (秒)；0 = 不排程
+PAGES_PER_STEP = 256       # 每步複製的頁數 (預設 4 KB 頁 → 1 MB)
+STEP_PAUSE = 0.001         # 每步之間讓出執行緒 (秒)
+COMPRESS_LEVEL = 6
+BLOCK_SIZE = 1 << 20
+SUFFIX = ".db.gz"
+
+_status = {"last": None, "last_error": None, "next_due": None}
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def _stem(path):
+    name = os.path.basename(path)
+    return name[:-3] if name.endswith(".db") else name
+
+
+def _sidecars(snapshot):
+    base = snapshot[:-len(SUFFIX)] if snapshot.endswith(SUFFIX) else snapshot
+    return base + ".json", snapshot + ".sha256"
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_atomic(path, text):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _copy_pages(path, target):
+    """以 backup API 分段把 path 複製到 target；回傳 (頁數, user_version)"""
+    src = sqlite3.connect(path, timeout=5.0, isolation_level=None)
+    dst = sqlite3.connect(target)
+    pages = [0]
+    try:
+        # 固定讀取快照：各步都看到同一個版本，不會因為其他連線的 commit 而重來
+        src.execute("BEGIN")
+        version = src.execute("PRAGMA user_version").fetchone()[0]
+
+        def _progress(status, remaining, total):
+            pages[0] = total
+            time.sleep(STEP_PAUSE)
+
+        src.backup(dst, pages=PAGES_PER_STEP, progress=_progress)
+        src.rollback()
+    finally:
+        dst.close()
+        src.close()
+    return pages[0], version
+
+
+def _compress(raw, target):
+    """gzip 壓縮並同時計算原始內容的 sha256；寫完 fsync 後才換成正式檔名"""
+    digest = hashlib.sha256()
+    tmp = target + ".tmp"
+    with open(raw, "rb") as src, open(tmp, "wb") as out:
+        with gzip.GzipFile(filename=os.path.basename(target)[:-3], fileobj=out, mode="wb",
+                           compresslevel=COMPRESS_LEVEL, mtime=0) as gz:
+            for block in iter(lambda: src.read(BLOCK_SIZE), b""):
+                digest.update(block)
+                gz.write(block)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, target)
+    return digest.hexdigest()
+
+
+def list_snapshots(directory=None, path=None):
+    """目錄內屬於此 DB 的快照中繼資料 (新 → 舊)"""
+    directory = directory or BACKUP_DIR
+    stem = _stem(path or db.DB_PATH)
+    if not os.path.isdir(directory):
+        return []
+    out = []
+    for name in os.listdir(directory):
+        if name.startswith(stem + "_") and name.endswith(SUFFIX):
+            meta_path, _ = _sidecars(os.path.join(directory, name))
+            try:
+                with open(meta_path, encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue          # 沒有中繼資料 (寫到一半) 的快照不列入
+            meta["path"] = os.path.join(directory, name)
+            out.append(meta)
+    return sorted(out, key=lambda m: m["created_at"], reverse=True)
+
+
+def _rotate(directory, path, keep):
+    for meta in list_snapshots(directory, path)[keep:]:
+        for p in (meta["path"], *_sidecars(meta["path"])):
+            if os.path.exists(p):
+                os.remove(p)
+
+
+def create(path=None, directory=None, keep=None, label="", force=False):
+    """
+    建立一份線上快照。內容與最新快照相同且 force=False 時不另存。
+    回傳中繼資料 {'path', 'created_at', 'sha256', 'raw_sha256', 'size', 'gz_size', 'pages',
+    'user_version', 'seconds', 'skipped'}
+    """
+    path = path or db.DB_PATH
+    directory = directory or BACKUP_DIR
+    keep = KEEP if keep is None else keep
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    os.makedirs(directory, exist_ok=True)
+
+    t0 = time.perf_counter()
+    now = datetime.datetime.now(db.TZ_TAIPEI)
+    name = f"{_stem(path)}_{now:%Y%m%d-%H%M%S}{'_' + label if label else ''}"
+    snapshot = os.path.join(directory, name + SUFFIX)
+    n = 1
+    while os.path.exists(snapshot):
+        snapshot = os.path.join(directory, f"{name}-{n}{SUFFIX}")
+        n += 1
+    raw = snapshot[:-3] + ".tmp"
+    try:
+        pages, version = _copy_pages(path, raw)
+        size = os.path.getsize(raw)
+        latest = list_snapshots(directory, path)
+        if latest and not force:
+            raw_sha = _file_sha256(raw)
+            if raw_sha == latest[0].get("raw_sha256"):
+                return dict(latest[0], skipped=True)
+        raw_sha = _compress(raw, snapshot)
+    finally:
+        if os.path.exists(raw):
+            os.remove(raw)
+
+    meta_path, sha_path = _sidecars(snapshot)
+    meta = {
+        "created_at": now.isoformat(), "source": os.path.abspath(path), "file": os.path.basename(snapshot),
+        "sha256": _file_sha256(snapshot), "raw_sha256": raw_sha, "size": size,
+        "gz_size": os.path.getsize(snapshot), "pages": pages, "user_version": version,
+        "label": label, "seconds": round(time.perf_counter() - t0, 3),
+    }
+    _write_atomic(sha_path, f"{meta['sha256']}  {meta['file']}\n")
+    _write_atomic(meta_path, json.dumps(meta, ensure_ascii=False, indent=1))
+    _rotate(directory, path, keep)
+    return dict(meta, path=snapshot, skipped=False)
+
+
+def _expected_sha256(snapshot):
+    _, sha_path = _sidecars(snapshot)
+    with open(sha_path, encoding="utf-8") as f:
+        return f.read().split()[0]
+
+
+def verify(snapshot):
+    """快照檔的 sha256 與旁邊的 .sha256 相同時回傳 True"""
+    try:
+        return _file_sha256(snapshot) == _expected_sha256(snapshot)
+    except OSError:
+        return False
+
+
+def restore(snapshot, path=None, directory=None):
+    """
+    以快照原子替換 DB 檔。回傳 {'restored', 'path', 'pre_restore', 'user_version', 'migrated_to'}；
+    sha256 不符、解壓內容不符或 quick_check 失敗時拋 ValueError，現行 DB 不會被動到。
+    """
+    from sniper import migrations
+
+    path = path or db.DB_PATH
+    if not verify(snapshot):
+        raise ValueError(f"快照 sha256 不符：{snapshot}")
+    meta_path, _ = _sidecars(snapshot)
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+
+    tmp = path + ".restore-tmp"
+    digest = hashlib.sha256()
+    try:
+        with gzip.open(snapshot, "rb") as gz, open(tmp, "wb") as out:
+            for block in iter(lambda: gz.read(BLOCK_SIZE), b""):
+                digest.update(block)
+                out.write(block)
+            out.flush()
+            os.fsync(out.fileno())
+        if digest.hexdigest() != meta["raw_sha256"]:
+            raise ValueError("解壓內容與備份時的 sha256 不符")
+        check = sqlite3.connect(tmp)
+        try:
+            ok = check.execute("PRAGMA quick_check").fetchone()[0]
+            version = check.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            check.close()
+        if ok != "ok":
+            raise ValueError(f"快照 quick_check 失敗：{ok}")
+        if version > migrations.SCHEMA_VERSION:
+            raise ValueError(f"快照版本 {version} 比程式支援的 {migrations.SCHEMA_VERSION} 新")
+
+        pre = create(path, directory, label="pre-restore", force=True)["path"] if os.path.exists(path) else None
+        pool = db.get_pool(path)
+        if os.path.exists(path):
+            with pool.read() as conn:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")    # 舊 WAL 清空，不會套到新檔上
+        pool.close()
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    db.clear_cache()
+    migrations.forget(path)
+    _, migrated = migrations.migrate(path, backup=False)
+    with db.get_pool(path).write() as conn:
+        db.log_audit(conn, "RESTORE_BACKUP", "SYSTEM",
+                     {"snapshot": os.path.basename(snapshot), "pre_restore": pre and os.path.basename(pre)})
+    return {"restored": os.path.basename(snapshot), "path": path, "pre_restore": pre,
+            "user_version": version, "migrated_to": migrated}
+
+
+# ==========================================
+# ⏰ 排程 (背景執行緒，不阻塞 rerun)
+# ==========================================
+def status():
+    return dict(_status)
+
+
+def _due(path, directory, interval):
+    latest = list_snapshots(directory, path)
+    if not latest:
+        return time.time()
+    last = datetime.datetime.fromisoformat(latest[0]["created_at"]).timestamp()
+    return last + interval
+
+
+def _loop(path, directory, interval):
+    while True:
+        due = _due(path, directory, interval)
+        _status["next_due"] = datetime.datetime.fromtimestamp(due, db.TZ_TAIPEI).isoformat()
+        time.sleep(max(0.0, due - time.time()))
+        try:
+            meta = create(path, directory)
+            _status["last"], _status["last_error"] = meta, None
+            if meta["skipped"]:
+                time.sleep(interval)      # 內容沒變：最新快照時間不會前進，等一個間隔再檢查
+        except Exception as e:            # 排程不能讓程式掛掉；錯誤顯示在側邊欄
+            _status["last_error"] = f"{type(e).__name__}: {e}"
+            time.sleep(min(interval, 300))
+
+
+def start_scheduler(path=None, directory=None, interval=None):
+    """每個行程只啟動一次；interval 為 0 時不排程。回傳是否在執行"""
+    global _scheduler
+    interval = INTERVAL if interval is None else interval
+    if interval <= 0:
+        return False
+    with _scheduler_lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = threading.Thread(target=_loop, args=(path or db.DB_PATH, directory or BACKUP_DIR, interval),
+                                          name="sniper-backup", daemon=True)
+            _scheduler.start()
+    return True
+
+
+# ==========================================
+# ⌨️ CLI
+# ==========================================
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m sniper.backup", description="Sniper Bet Pro 線上快照備份 / 還原")
+    ap.add_argument("--db", help="DB 路徑 (預設 SNIPER_DB_PATH / sniper_v9.db)")
+    ap.add_argument("--dir", help="快照目錄 (預設 SNIPER_BACKUP_DIR / backups)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("create", help="立即建立快照")
+    sp.add_argument("--keep", type=int)
+    sp.add_argument("--force", action="store_true", help="內容沒變也另存一份")
+    sub.add_parser("list", help="列出快照")
+    sp = sub.add_parser("verify", help="驗證快照 sha256")
+    sp.add_argument("snapshot", nargs="?", help="預設驗證全部")
+    sp = sub.add_parser("restore", help="以快照原子替換 DB (請先停止儀表板 / API)")
+    sp.add_argument("snapshot")
+    args = ap.parse_args(argv)
+
+    path = args.db or db.DB_PATH
+    if args.cmd == "create":
+        print(json.dumps(create(path, args.dir, keep=args.keep, force=args.force), ensure_ascii=False))
+    elif args.cmd == "list":
+        for meta in list_snapshots(args.dir, path):
+            print(f"{meta['created_at']}  {meta['gz_size']:>12,}  v{meta['user_version']}  {meta['path']}")
+    elif args.cmd == "verify":
+        targets = [args.snapshot] if args.snapshot else [m["path"] for m in list_snapshots(args.dir, path)]
+        bad = [t for t in targets if not verify(t)]
+        for t in targets:
+            print(f"{'OK ' if t not in bad else 'BAD'}  {t}")
+        return 1 if bad else 0
+    elif args.cmd == "restore":
+        print(json.dumps(restore(args.snapshot, path, args.dir), ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,334 @@
+"""
+⏱ 效能基準 (不需瀏覽器)
+以固定 seed 產生大量歷史資料 (所有 GLOBAL_DB 聯賽、三種玩法、各種結算狀態)，
+再量測 App.py 的熱點路徑，結果輸出為 JSON 供跨版本比較：
+
+    python -m sniper.bench --bets 100000 --out bench.json
+    python -m sniper.bench --bets 100000 --db /tmp/b.db --reuse --compare bench.json
+
+量測項目：add_bet_db (含重複攔截)、settle_bet_db / revoke_settlement_db、get_all_bets、
+戰情室權益曲線 / 回撤 (帳本讀取、向量化、舊版 iterrows 參考值)、側邊欄 JSON 匯出。
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from sniper import analytics, db
+from sniper.betting import calculate_max_drawdown, calculate_pnl, calculate_pnl_vec
+from sniper.export import export_bytes
+from sniper.leagues import GLOBAL_DB, short_name
+from sniper.parsing import parse_bet, parse_model
+
+DEFAULT_BETS = 100_000
+DEFAULT_SEED = 42
+DEFAULT_OPS = 200
+INITIAL_BANKROLL = 10000.0
+PENDING_RATIO = 0.05
+HISTORY_DAYS = 730
+INSERT_CHUNK = 20_000
+
+_AH_LINES = ['0', '0/0.5', '0.5', '0.5/1', '1', '1.5', '2', '2.5', '3']
+_OU_LINES = ['0.5', '1.5', '2.5', '3.5', '4.5', '5.5', '6.5']
+
+
+# ==========================================
+# 🏭 合成資料
+# ==========================================
+def _bet_types(rng, n):
+    """依 UI 的字串格式產生玩法；回傳 (bet_type 陣列, 是否為讓分)"""
+    market = rng.choice(3, size=n, p=[0.4, 0.35, 0.25])
+    side2 = rng.integers(0, 2, size=n)
+    sel = np.array(['主勝', '和局', '客勝'])[rng.integers(0, 3, size=n)]
+    ah = rng.choice(_AH_LINES, size=n)
+    ah_sign = np.where(rng.integers(0, 2, size=n) == 0, '讓 (-)', '受讓 (+)')
+    ou = rng.choice(_OU_LINES, size=n)
+    out = np.empty(n, dtype=object)
+    for i in range(n):
+        if market[i] == 0:
+            out[i] = f"獨贏 [{sel[i]}]"
+        elif market[i] == 1:
+            out[i] = f"讓分 [{'主隊' if side2[i] == 0 else '客隊'} {ah_sign[i]} {ah[i]}]"
+        else:
+            out[i] = f"大小 [{'大 (Over)' if side2[i] == 0 else '小 (Under)'} {ou[i]}]"
+    return out, market == 1, market == 0
+
+
+def generate_rows(n, seed=DEFAULT_SEED, now=None):
+    """
+    產生 n 筆注單 (DataFrame，欄位同 bets 表的前 10 欄)。
+    created_at 在 HISTORY_DAYS 內遞增；最後約 PENDING_RATIO 的注單較可能仍為待定。
+    """
+    rng = np.random.default_rng(seed)
+    now = now or datetime.datetime(2026, 1, 1, tzinfo=db.TZ_TAIPEI)
+    leagues = list(GLOBAL_DB)
+    lg = rng.integers(0, len(leagues), size=n)
+    home_i = rng.random(n)
+    away_i = rng.random(n)
+    match_info = np.empty(n, dtype=object)
+    for i in range(n):
+        teams = GLOBAL_DB[leagues[lg[i]]]
+        h = int(home_i[i] * len(teams))
+        a = (h + 1 + int(away_i[i] * (len(teams) - 1))) % len(teams)
+        match_info[i] = f"[{short_name(leagues[lg[i]])}] {teams[h]} vs {teams[a]}"
+
+    bet_type, is_ah, is_1x2 = _bet_types(rng, n)
+    odds = np.where(is_1x2, rng.uniform(1.5, 4.5, n), rng.uniform(1.7, 2.2, n)).round(2)
+    stake = (rng.integers(2, 31, size=n) * 10).astype(float)
+    ev = rng.normal(1.5, 4.0, n).round(1)
+    sharpe = rng.normal(0.8, 0.6, n).round(1)
+    p = np.clip((ev / 100 + 1) / odds, 0.01, 0.99)
+
+    offsets = np.sort(rng.uniform(0, HISTORY_DAYS * 86400, n))
+    start = now - datetime.timedelta(days=HISTORY_DAYS)
+    created = [(start + datetime.timedelta(seconds=float(s))).isoformat() for s in offsets]
+    settle_delay = rng.uniform(3600, 3 * 86400, n)
+    settled = [(start + datetime.timedelta(seconds=float(s + d))).isoformat()
+               for s, d in zip(offsets, settle_delay)]
+
+    # 讓分 (含 0/0.5 等分盤) 才會出現贏半 / 輸半 / 走水
+    u = rng.random(n)
+    win = u < p
+    status = np.where(win, '贏', '輸').astype(object)
+    half = is_ah & (rng.random(n) < 0.15)
+    status[half & win] = '贏半'
+    status[half & ~win] = '輸半'
+    status[is_ah & (rng.random(n) < 0.06)] = '走水'
+    recency = offsets / offsets[-1] if n else offsets
+    pending = rng.random(n) < PENDING_RATIO * 4 * recency ** 3
+    status[pending] = '待定'
+
+    profit = calculate_pnl_vec(stake, odds, np.where(pending, '走水', status))
+    ids = [str(uuid.UUID(bytes=bytes(b), version=4)) for b in rng.integers(0, 256, size=(n, 16), dtype=np.uint8)]
+    notes = [f"EV:{e}% | Sharpe:{s} | P:{q * 100:.1f}%" for e, s, q in zip(ev, sharpe, p)]
+    return pd.DataFrame({
+        'id': ids, 'created_at': created, 'match_info': match_info, 'bet_type': bet_type,
+        'stake': stake, 'odds': odds, 'status': status, 'profit': profit,
+        'settled_at': np.where(pending, None, np.array(settled, dtype=object)), 'notes': notes,
+    })
+
+
+def populate(n, seed=DEFAULT_SEED):
+    """把合成資料寫入目前的 DB (bets / audit_log / config)，並重建權益帳本"""
+    df = generate_rows(n, seed)
+    with db.write_txn() as conn:
+        for lo in range(0, n, INSERT_CHUNK):
+            part = df.iloc[lo:lo + INSERT_CHUNK]
+            rows, audits = [], []
+            for r in part.itertuples(index=False):
+                fp = db.bet_fingerprint(r.match_info, r.bet_type, r.stake, r.odds)
+                rows.append((r.id, r.created_at, r.match_info, r.bet_type, r.stake, r.odds, r.status,
+                             r.profit, r.settled_at, r.notes, fp) + parse_bet(r.match_info, r.bet_type)
+                            + parse_model(r.notes))
+                audits.append((r.created_at, "ADD_BET", r.id,
+                               json.dumps({"match": r.match_info, "stake": r.stake}, ensure_ascii=False)))
+                if r.settled_at is not None:
+                    audits.append((r.settled_at, "SETTLE_BET", r.id,
+                                   json.dumps({"status": r.status, "profit": r.profit, "old_profit": 0.0},
+                                              ensure_ascii=False)))
+            # 合成的待定注單偶爾指紋重複 → 交給唯一索引略過
+            conn.executemany(f"INSERT OR IGNORE INTO bets ({db.INSERT_COLUMNS}) VALUES ({db.INSERT_MARKS})", rows)
+            conn.executemany("INSERT INTO audit_log (ts, action, target_id, payload) VALUES (?, ?, ?, ?)", audits)
+        total = conn.execute("SELECT COUNT(*), COALESCE(SUM(profit), 0) FROM bets").fetchone()
+        conn.execute("INSERT OR REPLACE INTO config (key, value) VALUES ('initial', ?)", (INITIAL_BANKROLL,))
+        conn.execute("INSERT OR REPLACE INTO config (key, value) VALUES ('bankroll', ?)",
+                     (INITIAL_BANKROLL + total[1],))
+        db.rebuild_equity_ledger(conn)
+    return int(total[0])
+
+
+# ==========================================
+# ⏱ 量測
+# ==========================================
+def _timed(name, func, repeat=3, ops=1, **extra):
+    """執行 func repeat 次；ops 為每次執行包含的操作數 (用於換算每筆耗時)"""
+    times = []
+    value = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        value = func()
+        times.append(time.perf_counter() - t0)
+    result = {
+        'name': name, 'repeat': repeat, 'ops': ops,
+        'min_s': min(times), 'median_s': statistics.median(times), 'mean_s': statistics.fmean(times),
+        'per_op_us': min(times) / ops * 1e6,
+    }
+    result.update(extra)
+    return result, value
+
+
+def _legacy_tab3(df_all, initial):
+    """舊版戰情室：iterrows 逐筆累加 + calculate_max_drawdown (參考基準)"""
+    df_settled = df_all[df_all['status'] != '待定'].copy()
+    df_settled['sort_time'] = pd.to_datetime(df_settled['settled_at'])
+    df_settled = df_settled.sort_values('sort_time')
+    curve, dates, cum = [initial], ["Start"], 0
+    for _, r in df_settled.iterrows():
+        cum += r['profit']
+        curve.append(initial + cum)
+        dates.append(r['sort_time'].strftime("%m/%d"))
+    return calculate_max_drawdown(curve)
+
+
+def _ledger_tab3(initial):
+    """目前戰情室 (全部聯賽)：讀取帳本摘要與曲線"""
+    summary = db.get_equity_summary.uncached()
+    df_curve = db.get_equity_curve.uncached()
+    curve = [initial] + df_curve['equity'].tolist()
+    dates = ["Start"] + pd.to_datetime(df_curve['settled_at']).dt.strftime("%m/%d").tolist()
+    return summary['max_dd'] if summary else 0.0, len(curve), len(dates)
+
+
+def _vector_tab3(df_all, initial):
+    """目前戰情室 (篩選後)：analytics.prepare + summarize"""
+    return analytics.summarize(analytics.prepare(df_all), initial)['max_dd']
+
+
+def run(n_bets=DEFAULT_BETS, seed=DEFAULT_SEED, ops=DEFAULT_OPS, repeat=3, legacy=True):
+    """量測目前 DB (db.DB_PATH)；回傳 [結果 dict, ...]"""
+    results = []
+    _, initial = db.get_config.uncached()
+
+    r, df_all = _timed("get_all_bets", db.get_all_bets.uncached, repeat, rows=0)
+    r['rows'] = len(df_all)
+    results.append(r)
+
+    r, _ = _timed("tab3_ledger", lambda: _ledger_tab3(initial), repeat)
+    results.append(r)
+    r, df = _timed("tab3_rollup_chart", lambda: (db.get_pnl_rollup.uncached("day"),
+                                                 db.get_pnl_rollup.uncached("week"))[1], repeat)
+    r['rows'] = len(df)
+    results.append(r)
+    r, _ = _timed("tab3_vectorized", lambda: _vector_tab3(df_all, initial), repeat)
+    results.append(r)
+    if legacy:
+        r, _ = _timed("tab3_legacy_iterrows", lambda: _legacy_tab3(df_all, initial), 1)
+        results.append(r)
+
+    r, payload = _timed("export_json", lambda: export_bytes("json"), repeat)
+    r['bytes'] = len(payload)
+    results.append(r)
+    del payload
+
+    # 全文搜尋：依相關度 (bm25) 與依時間分頁兩種路徑
+    r, df = _timed("search_ranked", lambda: db.search_bets.uncached("曼城", limit=50), repeat)
+    r['rows'] = len(df)
+    results.append(r)
+    r, (df, _) = _timed("search_paged", lambda: db.page_bets.uncached(limit=50, search="利物浦"), repeat)
+    r['rows'] = len(df)
+    results.append(r)
+
+    # 寫入路徑放最後 (會改變 DB 內容)
+    rng = np.random.default_rng(seed + 1)
+    new_bets = [(f"[BENCH] 主{i} vs 客{i}", "獨贏 [主勝]", float(rng.integers(1, 100) * 10),
+                 round(float(rng.uniform(1.5, 3.0)), 2), "EV:3.0% | Sharpe:0.5 | P:50.0%") for i in range(ops)]
+    added = []
+
+    def _add():
+        for args in new_bets:
+            ok, bet_id = db.add_bet_db(*args)
+            if ok:
+                added.append((bet_id, args[2], args[3]))
+    r, _ = _timed("add_bet_db", _add, 1, ops)
+    results.append(r)
+
+    r, _ = _timed("add_bet_db_duplicate", lambda: [db.add_bet_db(*args) for args in new_bets], 1, ops)
+    results.append(r)
+
+    def _settle():
+        for bet_id, stake, odds in added:
+            db.settle_bet_db(bet_id, calculate_pnl(stake, odds, "贏"), "贏")
+    r, _ = _timed("settle_bet_db", _settle, 1, max(len(added), 1))
+    results.append(r)
+
+    r, _ = _timed("revoke_settlement_db", lambda: [db.revoke_settlement_db(b) for b, _, _ in added],
+                  1, max(len(added), 1))
+    results.append(r)
+
+    # 撤銷後資金與帳本已還原；再刪掉量測用注單，讓 --reuse 的下一輪面對相同資料。
+    # 稽核日誌只增不刪 (ADD / SETTLE / REVOKE 對資金的影響互相抵銷，重播結果不變)
+    with db.write_txn() as conn:
+        conn.executemany("DELETE FROM bets WHERE id=?", [(b,) for b, _, _ in added])
+    return results
+
+
+def compare(current, baseline, threshold=1.25):
+    """與舊的結果比較 (以 min_s)；回傳 [(name, old, new, ratio, regressed), ...]"""
+    old = {r['name']: r for r in baseline['results']}
+    out = []
+    for r in current['results']:
+        if r['name'] not in old:
+            continue
+        ratio = r['min_s'] / old[r['name']]['min_s'] if old[r['name']]['min_s'] else float('inf')
+        out.append((r['name'], old[r['name']]['min_s'], r['min_s'], ratio, ratio > threshold))
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m sniper.bench", description="Sniper Bet Pro 效能基準")
+    ap.add_argument("--bets", type=int, default=DEFAULT_BETS, help="合成注單筆數")
+    ap.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    ap.add_argument("--ops", type=int, default=DEFAULT_OPS, help="寫入路徑量測的操作次數")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--db", help="DB 路徑 (預設為暫存目錄內的新檔案)")
+    ap.add_argument("--reuse", action="store_true", help="沿用已存在的 --db，不重新產生資料")
+    ap.add_argument("--no-legacy", action="store_true", help="略過舊版 iterrows 參考量測 (大資料量時很慢)")
+    ap.add_argument("--out", help="輸出 JSON 路徑 (預設印到 stdout)")
+    ap.add_argument("--compare", help="與先前的輸出 JSON 比較")
+    ap.add_argument("--threshold", type=float, default=1.25, help="比較時視為退步的倍率")
+    args = ap.parse_args(argv)
+
+    path = args.db or os.path.join(tempfile.mkdtemp(prefix="sniper_bench_"), "bench.db")
+    if os.path.exists(path) and not args.reuse:
+        ap.error(f"{path} 已存在；要沿用請加 --reuse")
+    db.DB_PATH = path          # get_pool() 以 DB_PATH 決定連線池，量測期間全部指向此檔
+    db.init_db()
+
+    gen_s = None
+    if not args.reuse:
+        t0 = time.perf_counter()
+        populate(args.bets, args.seed)
+        gen_s = time.perf_counter() - t0
+
+    results = run(args.bets, args.seed, args.ops, args.repeat, legacy=not args.no_legacy)
+    report = {
+        'meta': {
+            'bets': args.bets, 'seed': args.seed, 'ops': args.ops, 'db': path,
+            'db_bytes': os.path.getsize(path), 'generate_s': gen_s,
+            'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+            'numpy': np.__version__, 'pandas': pd.__version__, 'platform': platform.platform(),
+            'ts': datetime.datetime.now(db.TZ_TAIPEI).isoformat(),
+        },
+        'results': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.threshold)
+        for name, old, new, ratio, bad in rows:
+            print(f"{'!!' if bad else '  '} {name:<24} {old * 1e3:10.2f} ms -> {new * 1e3:10.2f} ms  x{ratio:.2f}",
+                  file=sys.stderr)
+        if any(bad for *_, bad in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
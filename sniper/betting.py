@@ -0,0 +1,207 @@
+"""
+🧠 商業邏輯 (EV 百分比修復版)
+損益以 Decimal 精算 (ROUND_HALF_UP 到分)，並提供批次用的向量化版本。
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+RESULT_CODES = ("贏", "贏半", "輸", "輸半", "走水")
+
+
+def calculate_pnl(stake, odds, result_code):
+    d_stake = Decimal(str(stake))
+    d_odds = Decimal(str(odds))
+    d_profit = Decimal('0.0')
+
+    if result_code == "贏": d_profit = d_stake * (d_odds - Decimal('1'))
+    elif result_code == "贏半": d_profit = (d_stake * (d_odds - Decimal('1'))) / Decimal('2')
+    elif result_code == "輸": d_profit = -d_stake
+    elif result_code == "輸半": d_profit = -d_stake / Decimal('2')
+    elif result_code == "走水": d_profit = Decimal('0.0')
+    
+    return d_profit.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def calculate_max_drawdown(equity_curve):
+    if not equity_curve: return 0.0
+    peak = equity_curve[0]
+    max_dd = 0.0
+    for value in equity_curve:
+        if value > peak: peak = value
+        dd = (peak - value) / peak if peak > 0 else 0
+        if dd > max_dd: max_dd = dd
+    return max_dd * 100
+
+
+def calculate_reverse_metrics(ev_value, odds, fraction=0.25, bankroll=10000):
+    """
+    [FIX] 支援直接輸入百分比 (例如 24.6)
+    邏輯：輸入值 / 100 = 實際小數
+    """
+    ev = Decimal(str(ev_value)) / Decimal('100') # 修正點：除以100
+    o = Decimal(str(odds))
+    
+    # 1. 反推勝率 P = (EV + 1) / Odds
+    if o > 0:
+        p = (ev + Decimal('1')) / o
+    else:
+        p = Decimal('0')
+    
+    # 限制 P 在 0~1 之間
+    p = max(Decimal('0'), min(Decimal('1'), p))
+    
+    # 2. 計算 Kelly
+    b = o - Decimal('1')
+    if b > 0:
+        k_full = p - ((Decimal('1') - p) / b)
+    else:
+        k_full = Decimal('0')
+    
+    k_frac = max(Decimal('0'), k_full * Decimal(str(fraction)))
+    
+    # 3. 建議金額 (Decimal('10') 的指數為 0 → 四捨五入到整數元)
+    s_stake = (k_frac * Decimal(str(bankroll))).quantize(Decimal('10'), rounding=ROUND_HALF_UP)
+    
+    return p, k_frac, s_stake
+
+
+# --- 向量化損益 (批次結算用) ---
+# 以整數「分 × 1e-4」運算避免浮點誤差，再以 ROUND_HALF_UP (遠離 0) 取到分，
+# 結果與 calculate_pnl 逐筆計算完全一致；無法精確縮放的賠率退回 Decimal。
+_ODDS_SCALE = 10_000
+
+
+def _round_half_up_div(num, den):
+    """整數 num / den 四捨五入 (遠離 0)，與 Decimal ROUND_HALF_UP 相同"""
+    mag = (np.abs(num) * 2 + den) // (2 * den)
+    return np.sign(num) * mag
+
+
+def calculate_pnl_vec(stakes, odds, results):
+    """calculate_pnl 的向量化版本；回傳 float64 陣列 (已取到分)"""
+    stakes = np.asarray(stakes, dtype=float)
+    odds = np.asarray(odds, dtype=float)
+    results = np.asarray(results, dtype=object)
+
+    stake_c = np.round(stakes * 100).astype(np.int64)
+    odds_s = np.round(odds * _ODDS_SCALE).astype(np.int64)
+    exact = np.isclose(stake_c, stakes * 100, rtol=0, atol=1e-6) & \
+        np.isclose(odds_s, odds * _ODDS_SCALE, rtol=0, atol=1e-6)
+
+    win_num = stake_c * (odds_s - _ODDS_SCALE)      # 單位：分 × 1e-4
+    cents = np.zeros(len(stakes), dtype=np.int64)
+    m = results == "贏"
+    cents[m] = _round_half_up_div(win_num[m], _ODDS_SCALE)
+    m = results == "贏半"
+    cents[m] = _round_half_up_div(win_num[m], 2 * _ODDS_SCALE)
+    m = results == "輸"
+    cents[m] = -stake_c[m]
+    m = results == "輸半"
+    cents[m] = _round_half_up_div(-stake_c[m], 2)
+
+    out = cents / 100.0
+    for i in np.flatnonzero(~exact):
+        out[i] = float(calculate_pnl(stakes[i], odds[i], results[i]))
+    return out
+
+
+# --- 向量化判定 (由終場比分推出結果代碼) ---
+# 讓分 / 大小先換成下注方角度的「淨勝幅」m (讓分：己方淨勝球 + line；大：總進球 - line；小：line - 總進球)。
+# 四分之一盤 (0/0.5、2.5/3 …) 拆成 line ± 0.25 兩半各下一半注，其餘盤口兩半相同：
+#     score = sign(m - q) + sign(m + q)，q = 0.25 (四分之一盤) 或 0
+#     2 → 贏、1 → 贏半、0 → 走水、-1 → 輸半、-2 → 輸
+_SCORE_CODES = {2: "贏", 1: "贏半", 0: "走水", -1: "輸半", -2: "輸"}
+
+
+def grade_results_vec(market, side, line, home_goals, away_goals):
+    """
+    依 parsing.parse_bet_type 的 (market, side, line) 與終場比分判定結果代碼 (object 陣列)。
+    無法判定 (市場 / 方向 / 盤口缺漏) 的列為 None。
+    """
+    market = np.asarray(market, dtype=object)
+    side = np.asarray(side, dtype=object)
+    line = np.array([np.nan if v is None else v for v in line], dtype=float)
+    diff = np.asarray(home_goals, dtype=float) - np.asarray(away_goals, dtype=float)
+    total = np.asarray(home_goals, dtype=float) + np.asarray(away_goals, dtype=float)
+
+    outcome = np.select([diff > 0, diff < 0], ["home", "away"], "draw")
+    m = np.select(
+        [market == "讓分", market == "大小"],
+        [np.select([side == "home", side == "away"], [diff + line, line - diff], np.nan),
+         np.select([side == "over", side == "under"], [total - line, line - total], np.nan)],
+        np.nan,
+    )
+    q = np.where(np.mod(line * 4, 2) == 1, 0.25, 0.0)
+    score = np.sign(m - q) + np.sign(m + q)
+    is_1x2 = (market == "獨贏") & np.isin(side, ["home", "draw", "away"])
+    score = np.where(is_1x2, np.where(outcome == side, 2, -2), score)
+
+    out = np.full(len(market), None, dtype=object)
+    for value, code in _SCORE_CODES.items():
+        out[score == value] = code
+    return out
+
+
+# --- 向量化 Kelly / EV 篩選 (整個賽程一次計算) ---
+def _decimal_reverse_metrics(ev_value, odds, fraction, bankroll):
+    p, k_frac, s_stake = calculate_reverse_metrics(ev_value, odds, fraction=fraction, bankroll=bankroll)
+    return float(p), float(k_frac), float(s_stake)
+
+
+def _round_half_up(x, unit):
+    """以 unit 為單位四捨五入 (遠離 0)，並回傳哪些元素落在 .5 邊界附近"""
+    q = np.abs(x) / unit
+    frac = q - np.floor(q)
+    near_tie = np.abs(frac - 0.5) < 1e-9
+    return np.sign(x) * np.floor(q + 0.5) * unit, near_tie
+
+
+def calculate_reverse_metrics_vec(ev_values, odds, fraction=0.25, bankroll=10000,
+                                  simultaneous=False, max_exposure=1.0):
+    """
+    calculate_reverse_metrics 的向量化版本 (輸入 / 輸出皆為 NumPy 陣列)。
+    回傳 {'implied_p', 'kelly_full', 'kelly_frac', 'stake'}；stake 四捨五入到整數元
+    (與 Decimal 版本的 quantize(Decimal('10')) 相同)，且與 Decimal 版本逐筆相同
+    (浮點結果落在 .5 進位邊界的列改用 Decimal 重算)。
+
+    simultaneous=True：同一輪並行下注時，若 kelly_frac 總和超過 max_exposure (佔資金比例)，
+    每筆都乘上 max_exposure / 總和，按比例縮小，彼此的相對大小不變，合計剛好等於 max_exposure。
+    這是近似值，並非多筆同時下注的聯合 Kelly 最適解。縮放後的 stake 不再對應任何單筆 Decimal 計算，
+    因此這條路徑不做 .5 邊界的 Decimal 重算，邊界上的列可能與逐筆四捨五入差 1 元。
+    """
+    ev_pct, o = np.broadcast_arrays(np.asarray(ev_values, dtype=float), np.asarray(odds, dtype=float))
+    ev = ev_pct / 100
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = np.where(o > 0, (ev + 1) / o, 0.0)
+        p = np.clip(p, 0.0, 1.0)
+        b = o - 1
+        k_full = np.where(b > 0, p - (1 - p) / b, 0.0)
+    k_frac = np.maximum(0.0, k_full * fraction)
+
+    if simultaneous:
+        total = k_frac.sum()
+        if total > max_exposure > 0:
+            k_frac = k_frac * (max_exposure / total)
+
+    # 注意：Decimal('10') 的指數為 0，quantize 是四捨五入到整數元 (不是到 10 元)
+    stake, near_tie = _round_half_up(k_frac * bankroll, 1)
+    if not simultaneous:      # 縮放後沒有對應的單筆 Decimal 結果可比對 (見 docstring)
+        for i in np.flatnonzero(near_tie):
+            _, _, stake[i] = _decimal_reverse_metrics(ev_pct[i], o[i], fraction, bankroll)
+    return {'implied_p': p, 'kelly_full': k_full, 'kelly_frac': k_frac, 'stake': stake}
+
+
+def screen_slate(df, fraction=0.25, bankroll=10000, simultaneous=False, max_exposure=1.0):
+    """
+    對整個賽程 (DataFrame 需含 ev(%) 與 odds 欄位) 做 Kelly 篩選，
+    附加 implied_p / kelly_full / kelly_frac / stake 欄位，依建議金額由大到小排序。
+    """
+    out = df.copy()
+    metrics = calculate_reverse_metrics_vec(out['ev'].to_numpy(), out['odds'].to_numpy(),
+                                            fraction=fraction, bankroll=bankroll,
+                                            simultaneous=simultaneous, max_exposure=max_exposure)
+    for col, values in metrics.items():
+        out[col] = values
+    return out.sort_values('stake', ascending=False, kind='stable').reset_index(drop=True)
@@ -0,0 +1,108 @@
+"""
+🗃 查詢結果快取 (依寫入世代失效)
+讀取函式的結果以 (函式, 參數) 為 key 快取；只要 DB 的寫入世代改變就整批失效。
+世代由呼叫端提供 (scope, version)，見 db.ConnectionPool.generation，version 同時涵蓋：
+- 本行程內的寫入計數 (每次 commit +1)
+- PRAGMA data_version (其他行程 / 連線寫入同一個 DB 檔時也會改變)
+以 LRU + 筆數 / 位元組上限控制記憶體。
+"""
+import functools
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+DEFAULT_MAX_ENTRIES = 128
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+SIZE_SAMPLE_ROWS = 2000       # 超過此列數的 DataFrame 以抽樣估計大小
+
+
+def _sizeof(value):
+    """
+    估計快取項目的位元組數。DataFrame 的字串 (object) 欄位要 deep=True 才會計入字串本身
+    (deep=False 只算 8 byte 指標)；大表只對等距抽樣的列做 deep 計算再乘回總列數。
+    """
+    if isinstance(value, pd.DataFrame):
+        n = len(value)
+        if n <= SIZE_SAMPLE_ROWS:
+            return int(value.memory_usage(index=True, deep=True).sum())
+        sample = value.iloc[::n // SIZE_SAMPLE_ROWS]
+        return int(sample.memory_usage(index=True, deep=True).sum() / len(sample) * n)
+    return sys.getsizeof(value)
+
+
+class QueryCache:
+    """以寫入世代為版本的 LRU 快取"""
+
+    def __init__(self, generation, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self._generation = generation
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()     # (scope, ...) -> (version, value, nbytes)
+        self._versions = {}               # scope -> 最近看到的世代
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, _, nbytes) = self._entries.popitem(last=False)
+            self._bytes -= nbytes
+
+    def _drop_scope(self, scope):
+        for k in [k for k in self._entries if k[0] == scope]:
+            self._bytes -= self._entries.pop(k)[2]
+
+    def get_or_compute(self, key, compute):
+        scope, version = self._generation()
+        full_key = (scope,) + key
+        with self._lock:
+            if self._versions.get(scope) != version:
+                # 世代改變 → 該 DB 的所有結果都已過期
+                self._drop_scope(scope)
+                self._versions[scope] = version
+            hit = self._entries.get(full_key)
+            if hit is not None and hit[0] == version:
+                self._entries.move_to_end(full_key)
+                self.hits += 1
+                return hit[1]
+            self.misses += 1
+        value = compute()
+        nbytes = _sizeof(value)
+        with self._lock:
+            if self._versions.get(scope) != version:
+                return value      # 計算期間已有新寫入，不寫入快取
+            old = self._entries.pop(full_key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            if nbytes <= self.max_bytes:
+                self._entries[full_key] = (version, value, nbytes)
+                self._bytes += nbytes
+                self._evict()
+        return value
+
+    def cached(self, func):
+        """裝飾讀取函式；回傳的 DataFrame 為共用物件，呼叫端不可原地修改"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__qualname__, args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                return func(*args, **kwargs)     # 參數不可雜湊 (例如 list) → 不快取
+            return self.get_or_compute(key, lambda: func(*args, **kwargs))
+        wrapper.uncached = func
+        return wrapper
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._bytes = 0
+
+    def info(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes,
+                    "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,101 @@
+"""
+🎯 模型校準 / CLV 報表 (向量化)
+以下單時的模型勝率 bets.model_p 對照實際結果：
+- 結果 y：profit > 0 記 1、profit < 0 記 0；走水 (profit = 0) 不列入機率評分
+  (贏半 / 輸半依方向計入，與 analytics 的勝場定義一致)
+- Brier = mean((p - y)²)；log-loss = -mean(y·ln p + (1-y)·ln(1-p))，p 夾在 [EPS, 1-EPS]
+- 預期 EV = Σ stake·model_ev / Σ stake；實際 EV = Σ profit / Σ stake (即 yield)
+- CLV = 下單賠率 / 收盤賠率 - 1，只計有收盤賠率的注單
+
+計算分兩段：先得到 (league, market, 勝率區間) 的部分和表 (DB 端 GROUP BY，見 db.get_calibration_partials；
+或 partials() 由 DataFrame 計算)，再由這張小表彙總出任何分組與可靠度表，成本與歷史長度無關。
+"""
+import numpy as np
+import pandas as pd
+
+EPS = 1e-6
+DEFAULT_BINS = 10
+SUM_COLUMNS = ["n", "n_scored", "sum_p", "sum_y", "sum_brier", "sum_logloss",
+               "stake", "profit", "ev_stake", "ev_sum", "n_clv", "clv_sum"]
+PARTIAL_COLUMNS = ["league", "market", "bin"] + SUM_COLUMNS
+
+
+def partials(df, bins=DEFAULT_BINS):
+    """由注單 DataFrame 計算部分和表 (與 db.get_calibration_partials 相同欄位與定義)"""
+    p = df['model_p'].to_numpy(dtype=float)
+    profit = df['profit'].to_numpy(dtype=float)
+    stake = df['stake'].to_numpy(dtype=float)
+    odds = df['odds'].to_numpy(dtype=float)
+    ev = df['model_ev'].to_numpy(dtype=float) if 'model_ev' in df else np.full(len(df), np.nan)
+    closing = df['closing_odds'].to_numpy(dtype=float) if 'closing_odds' in df else np.full(len(df), np.nan)
+    keep = ~np.isnan(p)
+    scored = keep & (profit != 0)
+    y = (profit > 0).astype(float)
+    has_ev = ~np.isnan(ev)
+    has_clv = closing > 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rows = pd.DataFrame({
+            'league': df['league'].to_numpy(dtype=object),
+            'market': df['market'].to_numpy(dtype=object),
+            'bin': np.minimum((np.nan_to_num(p) * bins).astype(np.int64), bins - 1),
+            'n': 1,
+            'n_scored': scored.astype(np.int64),
+            'sum_p': np.where(scored, p, 0.0),
+            'sum_y': np.where(scored, y, 0.0),
+            'sum_brier': np.where(scored, (p - y) ** 2, 0.0),
+            'sum_logloss': np.where(scored, -np.log(np.maximum(np.where(y > 0, p, 1 - p), EPS)), 0.0),
+            'stake': stake,
+            'profit': profit,
+            'ev_stake': np.where(has_ev, stake, 0.0),
+            'ev_sum': np.where(has_ev, stake * ev, 0.0),
+            'n_clv': has_clv.astype(np.int64),
+            'clv_sum': np.where(has_clv, odds / closing - 1, 0.0),
+        })[keep]
+    return rows.groupby(['league', 'market', 'bin'], dropna=False, sort=False).sum().reset_index()
+
+
+def _finish(sums):
+    """部分和 → 指標 (輸入可為 DataFrame 或 Series)"""
+    sums = sums.astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'n': sums['n'],
+            'n_scored': sums['n_scored'],
+            'pred_p': sums['sum_p'] / sums['n_scored'],
+            'hit_rate': sums['sum_y'] / sums['n_scored'],
+            'brier': sums['sum_brier'] / sums['n_scored'],
+            'log_loss': sums['sum_logloss'] / sums['n_scored'],
+            'pred_ev': sums['ev_sum'] / sums['ev_stake'] * 100,
+            'real_ev': sums['profit'] / sums['stake'] * 100,
+            'n_clv': sums['n_clv'],
+            'clv': sums['clv_sum'] / sums['n_clv'] * 100,
+        }
+
+
+def summary(parts):
+    """整體指標 dict；沒有資料時回傳 None"""
+    if parts.empty:
+        return None
+    sums = parts[SUM_COLUMNS].sum()
+    return {k: float(v) for k, v in _finish(sums).items()}
+
+
+def report(parts, by=("league", "market")):
+    """分組校準報表 (每組一列)，依注數由多到少"""
+    keys = [by] if isinstance(by, str) else list(by)
+    if parts.empty:
+        return pd.DataFrame(columns=keys + list(_finish(parts)))
+    sums = parts.fillna({k: "—" for k in keys}).groupby(keys, sort=False)[SUM_COLUMNS].sum()
+    table = pd.DataFrame(_finish(sums)).reset_index()
+    return table.sort_values('n', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def reliability(parts, bins=DEFAULT_BINS):
+    """可靠度表：各預測勝率區間的平均預測 vs 實際命中率"""
+    sums = parts.groupby('bin')[SUM_COLUMNS].sum()
+    sums = sums[sums['n_scored'] > 0]
+    edges = np.linspace(0, 1, bins + 1)
+    labels = [f"{edges[b] * 100:.0f}-{edges[b + 1] * 100:.0f}%" for b in sums.index]
+    out = _finish(sums)
+    return pd.DataFrame({'bin': labels, 'n': sums['n_scored'].to_numpy(),
+                         'pred_p': out['pred_p'].to_numpy(), 'hit_rate': out['hit_rate'].to_numpy()})
@@ -0,0 +1,1023 @@
+"""
+🛠 資料庫層 (SQLite + WAL + Audit)
+所有讀寫都經由行程內共用的連線池：
+- 讀取池：多條 autocommit 連線 (WAL 下可與寫入並行)
+- 寫入端：單一連線 + Lock，交易一律 BEGIN IMMEDIATE
+- 寫入佇列：UI 的單筆寫入 (下注 / 結算 / 撤銷 / 設定) 交給單一背景執行緒，
+  佇列內累積的操作合併成一次 group commit，每筆操作以 SAVEPOINT 隔離並各自回傳結果
+- 每條連線開啟時套用一致的 PRAGMA，並保留 statement cache 重複使用已編譯的 SQL
+"""
+import datetime
+import hashlib
+import json
+import math
+import os
+import queue
+import re
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import Future
+from contextlib import contextmanager
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+from sniper.cache import QueryCache
+from sniper.metrics import attach, capture, instrument, trace_sql
+from sniper.parsing import parse_bet, parse_model
+
+DB_PATH = os.environ.get("SNIPER_DB_PATH", "sniper_v9.db")
+TZ_TAIPEI = ZoneInfo("Asia/Taipei")
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA busy_timeout=5000;",
+    "PRAGMA cache_size=-32000;",       # 32 MB page cache
+    "PRAGMA mmap_size=268435456;",     # 256 MB mmap
+    "PRAGMA temp_store=MEMORY;",
+)
+READ_POOL_SIZE = 4
+STATEMENT_CACHE = 256
+GROUP_COMMIT_MAX = 64     # 單次 group commit 最多合併的操作數
+
+
+# ==========================================
+# 🔌 連線池
+# ==========================================
+class ConnectionPool:
+    """單一 DB 檔案的連線池 (讀取池 + 單一寫入端)"""
+
+    def __init__(self, path, read_size=READ_POOL_SIZE):
+        self.path = path
+        self.read_size = read_size
+        self._readers = queue.LifoQueue()
+        self._n_readers = 0
+        self._reader_lock = threading.Lock()
+        self._writer = None
+        self._write_lock = threading.RLock()
+        self._write_seq = 0
+        self._write_owner = None          # 目前持有寫入交易的執行緒 (避免對自己排隊而死結)
+        self._queue = queue.Queue()
+        self._writer_thread = None
+        self._thread_lock = threading.Lock()
+        self.write_stats = {"groups": 0, "ops": 0, "max_group": 0}
+        self._watcher = None
+        self._watch_lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=5.0,
+            isolation_level=None,          # 交易由 write() 明確控制
+            check_same_thread=False,       # 連線會在 Streamlit 的 session thread 間借用
+            cached_statements=STATEMENT_CACHE,
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        conn.set_trace_callback(trace_sql)    # 每次 rerun 的 SQL 陳述式計數 (sniper.metrics)
+        return conn
+
+    @contextmanager
+    def read(self):
+        """借出一條讀取連線"""
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._reader_lock:
+                create = self._n_readers < self.read_size
+                if create:
+                    self._n_readers += 1
+            conn = self._connect() if create else self._readers.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    @contextmanager
+    def write(self):
+        """取得寫入連線並開啟 BEGIN IMMEDIATE 交易；例外時 rollback"""
+        with self._write_lock:
+            conn = self._writer_conn()
+            if conn.in_transaction:
+                # 巢狀呼叫 (例如 init_db 內重建帳本) 併入外層交易
+                yield conn
+                return
+            prev_owner, self._write_owner = self._write_owner, threading.get_ident()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+                self._write_seq += 1
+            finally:
+                self._write_owner = prev_owner
+
+    def _writer_conn(self):
+        if self._writer is None:
+            self._writer = self._connect()
+        return self._writer
+
+    # ---- 寫入佇列 (group commit) ----
+    def submit(self, fn, *args, **kwargs):
+        """
+        把 fn(conn, *args, **kwargs) 排入單一寫入執行緒，回傳 Future。
+        呼叫端若已在寫入交易內 (write() 區塊或寫入執行緒本身)，直接在目前交易執行。
+        """
+        fut = Future()
+        if self._write_owner == threading.get_ident():
+            fut.set_running_or_notify_cancel()
+            try:
+                fut.set_result(fn(self._writer, *args, **kwargs))
+            except BaseException as e:
+                fut.set_exception(e)
+            return fut
+        self._ensure_writer_thread()
+        # 帶上呼叫端 rerun 的區段：寫入執行緒上的 SQL 記回發出這筆寫入的 rerun
+        self._queue.put((fn, args, kwargs, capture(), fut))
+        return fut
+
+    def _ensure_writer_thread(self):
+        with self._thread_lock:
+            if self._writer_thread is None or not self._writer_thread.is_alive():
+                self._writer_thread = threading.Thread(target=self._writer_loop, name="sniper-db-writer", daemon=True)
+                self._writer_thread.start()
+
+    def _writer_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            # 佇列裡已經在等的操作一起提交：負載越高，每次 commit 分攤的操作越多
+            group = [item]
+            while len(group) < GROUP_COMMIT_MAX:
+                try:
+                    nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self._queue.put(None)
+                    break
+                group.append(nxt)
+            self._run_group([g for g in group if g[4].set_running_or_notify_cancel()])
+
+    def _run_group(self, group):
+        """一次交易執行整組操作；單筆失敗只回滾自己的 SAVEPOINT，commit 後才回傳結果"""
+        done = []
+        with self._write_lock:
+            self._write_owner = threading.get_ident()
+            try:
+                conn = self._writer_conn()
+                for fn, args, kwargs, frame, fut in group:
+                    if not conn.in_transaction:
+                        conn.execute("BEGIN IMMEDIATE")
+                    conn.execute("SAVEPOINT op")
+                    try:
+                        with attach(frame):
+                            value = fn(conn, *args, **kwargs)
+                    except BaseException as e:
+                        if conn.in_transaction:
+                            conn.execute("ROLLBACK TO op")
+                            conn.execute("RELEASE op")
+                        else:
+                            # 錯誤讓 SQLite 放棄了整個交易 → 同組先前的操作也一併失敗
+                            done = [(f, False, e) for f, _, _ in done]
+                        done.append((fut, False, e))
+                    else:
+                        conn.execute("RELEASE op")
+                        done.append((fut, True, value))
+                if conn.in_transaction:
+                    conn.commit()
+                    self._write_seq += 1
+            except BaseException as e:
+                if self._writer is not None and self._writer.in_transaction:
+                    self._writer.rollback()
+                finished = {id(f) for f, _, _ in done}
+                done = [(f, False, e) for f, _, _ in done] + \
+                    [(f, False, e) for *_, f in group if id(f) not in finished]
+            finally:
+                self._write_owner = None
+            self.write_stats["groups"] += 1
+            self.write_stats["ops"] += len(group)
+            self.write_stats["max_group"] = max(self.write_stats["max_group"], len(group))
+        for fut, ok, value in done:
+            if ok:
+                fut.set_result(value)
+            else:
+                fut.set_exception(value)
+
+    def generation(self):
+        """
+        寫入世代 (scope, version)，供查詢快取判斷是否失效。
+        version = (本行程 commit 次數, 專用監看連線上的 PRAGMA data_version)；
+        後者在任何其他連線 (含其他行程) commit 後都會改變。
+        """
+        with self._watch_lock:
+            if self._watcher is None:
+                self._watcher = self._connect()
+            data_version = self._watcher.execute("PRAGMA data_version").fetchone()[0]
+        return self.path, (self._write_seq, data_version)
+
+    def close(self):
+        with self._thread_lock:
+            if self._writer_thread is not None and self._writer_thread.is_alive():
+                self._queue.put(None)
+                self._writer_thread.join()
+            self._writer_thread = None
+        with self._watch_lock:
+            if self._watcher is not None:
+                self._watcher.close()
+                self._watcher = None
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._reader_lock:
+            self._n_readers = 0
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path=None):
+    """行程內共用的連線池 (依檔案路徑快取，Streamlit rerun 之間不會重建)"""
+    path = path or DB_PATH
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = ConnectionPool(path)
+        return pool
+
+
+_query_cache = QueryCache(lambda: get_pool().generation())
+cached_query = _query_cache.cached
+
+
+def cache_info():
+    return _query_cache.info()
+
+
+def clear_cache():
+    """清空查詢快取 (DB 檔被整個換掉時使用，例如還原快照)"""
+    _query_cache.clear()
+
+
+def read_conn():
+    return get_pool().read()
+
+
+def write_txn():
+    return get_pool().write()
+
+
+def submit_write(fn, *args, **kwargs):
+    """排入寫入佇列並等待結果 (例外會在呼叫端重新拋出)"""
+    return get_pool().submit(fn, *args, **kwargs).result()
+
+
+# ==========================================
+# 🧱 結構與審計
+# ==========================================
+@instrument
+def init_db(path=None):
+    """確保資料庫結構為最新版本 (見 sniper/migrations.py)；已是最新版時只讀一次 PRAGMA user_version"""
+    from sniper import migrations      # migrations 依賴本模組，延遲匯入避免循環
+    return migrations.migrate(path)
+
+
+def bet_fingerprint(match, bet_type, stake, odds):
+    """重複注單指紋：同賽事 + 玩法 + 金額 + 賠率視為同一注"""
+    key = "\x1f".join((str(match), str(bet_type), repr(float(stake)), repr(float(odds))))
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+STRUCTURED_COLUMNS = (("league", "TEXT"), ("home", "TEXT"), ("away", "TEXT"),
+                      ("market", "TEXT"), ("side", "TEXT"), ("line", "REAL"))
+# 下單時的模型輸入 (ev / p 為小數) 與收盤賠率
+MODEL_COLUMNS = (("model_ev", "REAL"), ("model_sharpe", "REAL"), ("model_p", "REAL"), ("closing_odds", "REAL"))
+
+
+def log_audit(conn, action, target_id, payload):
+    """寫入審計日誌 (內部呼叫)；距上個檢查點超過 CHECKPOINT_EVERY 筆時順便建立檢查點"""
+    ts = datetime.datetime.now(TZ_TAIPEI).isoformat()
+    # 確保 payload 可以被 JSON 序列化 (處理 Decimal)
+    cur = conn.execute(
+        "INSERT INTO audit_log (ts, action, target_id, payload) VALUES (?, ?, ?, ?)",
+        (ts, action, target_id, json.dumps(payload, ensure_ascii=False, default=str))
+    )
+    last = conn.execute("SELECT MAX(seq) FROM audit_checkpoint").fetchone()[0] or 0
+    if cur.lastrowid - last >= CHECKPOINT_EVERY:
+        write_checkpoint(conn, cur.lastrowid)
+
+
+# ==========================================
+# 🧾 稽核檢查點
+# ==========================================
+# 每個寫入路徑都在同一個交易內「先改資金、最後 log_audit」，
+# 所以 log_audit 當下的 config / 帳本正好是套用到 seq (含) 為止的狀態。
+CHECKPOINT_EVERY = 5000
+CHECKPOINT_COLUMNS = ("seq", "ts", "bankroll", "initial", "equity", "peak", "max_dd", "n_settled", "n_wins")
+
+
+def write_checkpoint(conn, seq=None):
+    """在目前交易內寫入檢查點 (seq 預設為最新一筆日誌)；回傳 seq"""
+    if seq is None:
+        seq = conn.execute("SELECT COALESCE(MAX(id), 0) FROM audit_log").fetchone()[0]
+    cfg = dict(conn.execute("SELECT key, value FROM config").fetchall())
+    bankroll, initial = cfg.get('bankroll', 10000.0), cfg.get('initial', 10000.0)
+    ledger = conn.execute("""
+        SELECT equity, peak, max_dd, n_settled, n_wins FROM equity_ledger
+        ORDER BY settled_at DESC, bet_id DESC LIMIT 1
+    """).fetchone() or (initial, initial, 0.0, 0, 0)
+    conn.execute(f"INSERT OR REPLACE INTO audit_checkpoint ({', '.join(CHECKPOINT_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                 (seq, datetime.datetime.now(TZ_TAIPEI).isoformat(), bankroll, initial) + tuple(ledger))
+    return seq
+
+
+# ==========================================
+# 📈 權益帳本 (Equity Ledger)
+# ==========================================
+# 結算 / 撤銷時在同一個 transaction 內維護，戰情室只需讀取最後一列。
+# 新結算通常排在最後 (O(1))；撤銷或補登時只重算該筆之後的尾段。
+def _ledger_state_before(conn, settled_at, bet_id):
+    """取得 (settled_at, bet_id) 之前一列的累積狀態，沒有則回傳起始狀態"""
+    row = conn.execute("""
+        SELECT equity, peak, max_dd, n_settled, n_wins FROM equity_ledger
+        WHERE (settled_at, bet_id) < (?, ?)
+        ORDER BY settled_at DESC, bet_id DESC LIMIT 1
+    """, (settled_at, bet_id)).fetchone()
+    if row:
+        return row
+    init_row = conn.execute("SELECT value FROM config WHERE key='initial'").fetchone()
+    initial = init_row[0] if init_row else 10000.0
+    return initial, initial, 0.0, 0, 0
+
+
+def _ledger_replay_from(conn, settled_at, bet_id, rollup=True):
+    """從指定位置起重算帳本尾段 (與 calculate_max_drawdown 相同定義)，並同步損益彙總 (rollup="append"：尾端新增一筆的快速路徑)"""
+    equity, peak, max_dd, n_settled, n_wins = _ledger_state_before(conn, settled_at, bet_id)
+    rows = conn.execute("""
+        SELECT bet_id, profit FROM equity_ledger
+        WHERE (settled_at, bet_id) >= (?, ?)
+        ORDER BY settled_at ASC, bet_id ASC
+    """, (settled_at, bet_id)).fetchall()
+    updates = []
+    for row_id, profit in rows:
+        equity += profit
+        if equity > peak: peak = equity
+        dd = (peak - equity) / peak * 100 if peak > 0 else 0.0
+        if dd > max_dd: max_dd = dd
+        n_settled += 1
+        if profit > 0: n_wins += 1
+        updates.append((equity, peak, max_dd, n_settled, n_wins, row_id))
+    conn.executemany("""
+        UPDATE equity_ledger SET equity=?, peak=?, max_dd=?, n_settled=?, n_wins=?
+        WHERE bet_id=?
+    """, updates)
+    if rollup == "append" and len(rows) == 1:
+        _rollup_append(conn, settled_at, rows[0][0], rows[0][1], equity)
+    elif rollup:
+        _rollup_from(conn, settled_at)
+
+
+def _ledger_remove(conn, bet_id):
+    row = conn.execute("SELECT settled_at FROM equity_ledger WHERE bet_id=?", (bet_id,)).fetchone()
+    if not row: return
+    conn.execute("DELETE FROM equity_ledger WHERE bet_id=?", (bet_id,))
+    _ledger_replay_from(conn, row[0], bet_id)
+
+
+def _ledger_upsert(conn, bet_id, settled_at, profit):
+    old = conn.execute("SELECT settled_at FROM equity_ledger WHERE bet_id=?", (bet_id,)).fetchone()
+    start = min(old[0], settled_at) if old else settled_at
+    conn.execute("""
+        INSERT OR REPLACE INTO equity_ledger (bet_id, settled_at, profit, equity, peak, max_dd, n_settled, n_wins)
+        VALUES (?, ?, ?, 0, 0, 0, 0, 0)
+    """, (bet_id, settled_at, profit))
+    # 全新一筆且排在帳本最後 → 彙總只需把這一筆加進各桶
+    _ledger_replay_from(conn, start, "", rollup=True if old else "append")
+
+
+def ledger_append(conn, entries):
+    """批次寫入多筆結算 [(bet_id, settled_at, profit), ...]，只重算新增位置之後的尾段"""
+    if not entries: return
+    conn.executemany("""
+        INSERT OR REPLACE INTO equity_ledger (bet_id, settled_at, profit, equity, peak, max_dd, n_settled, n_wins)
+        VALUES (?, ?, ?, 0, 0, 0, 0, 0)
+    """, entries)
+    _ledger_replay_from(conn, min(e[1] for e in entries), "")
+
+
+@instrument
+def rebuild_equity_ledger(conn=None, rollup=True):
+    """由 bets 全量重建權益帳本 (帳本失效或本金校正時使用)；rollup=False 時不重建損益彙總"""
+    if conn is None:
+        with write_txn() as conn:
+            rebuild_equity_ledger(conn, rollup)
+        return
+    conn.execute("DELETE FROM equity_ledger")
+    conn.execute("""
+        INSERT INTO equity_ledger (bet_id, settled_at, profit, equity, peak, max_dd, n_settled, n_wins)
+        SELECT id, settled_at, profit, 0, 0, 0, 0, 0 FROM bets WHERE status != '待定'
+    """)
+    _ledger_replay_from(conn, "", "", rollup)
+
+
+@instrument
+@cached_query
+def get_equity_summary():
+    """讀取帳本最後一列 (O(1))；無結算時回傳 None"""
+    with read_conn() as conn:
+        row = conn.execute("""
+            SELECT equity, peak, max_dd, n_settled, n_wins FROM equity_ledger
+            ORDER BY settled_at DESC, bet_id DESC LIMIT 1
+        """).fetchone()
+    if not row: return None
+    return dict(zip(['equity', 'peak', 'max_dd', 'n_settled', 'n_wins'], row))
+
+
+@instrument
+@cached_query
+def get_equity_curve(window=None, start=None, end=None):
+    """讀取權益曲線 (settled_at, equity)；window 只取最近 N 筆，start / end 為台北日期 (含) 的範圍"""
+    sql = "SELECT settled_at, equity FROM equity_ledger"
+    clauses, params = [], []
+    if start:
+        clauses.append("settled_at >= ?"); params.append(start)
+    if end:
+        clauses.append("settled_at < ?"); params.append(_next_day(end))
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY settled_at DESC, bet_id DESC"
+    if window:
+        sql += " LIMIT ?"
+        params.append(int(window))
+    with read_conn() as conn:
+        df = pd.read_sql_query(sql, conn, params=params)
+    return df.iloc[::-1].reset_index(drop=True)
+
+
+def _next_day(day):
+    return (datetime.date.fromisoformat(str(day)[:10]) + datetime.timedelta(days=1)).isoformat()
+
+
+# ==========================================
+# 🗓 損益彙總 (日 / 週 / 月，台北時間)
+# ==========================================
+ROLLUP_GRAINS = ("day", "week", "month")
+ROLLUP_COLUMNS = ("bucket", "n", "n_wins", "profit", "turnover", "eq_close", "eq_min", "eq_max")
+_TZ_SUFFIX = re.compile(r"(Z|[+-]\d\d:?\d\d)$")
+
+
+def local_day(ts):
+    """時間字串 → 台北日期 YYYY-MM-DD；本程式寫入的都是 +08:00，無時區的字串視為台北時間"""
+    if ts.endswith("+08:00") or not _TZ_SUFFIX.search(ts[10:]):
+        return ts[:10]
+    return datetime.datetime.fromisoformat(ts.replace("Z", "+00:00")).astimezone(TZ_TAIPEI).date().isoformat()
+
+
+def _bucket_of(grain, day):
+    if grain == "day":
+        return day
+    if grain == "month":
+        return day[:7]
+    d = datetime.date.fromisoformat(day)
+    return (d - datetime.timedelta(days=d.weekday())).isoformat()      # 週一
+
+
+def _rollup_from(conn, settled_at):
+    """
+    帳本自 settled_at 起重算後，同步重算受影響的彙總：
+    日彙總由帳本列重算 (只從 settled_at 當天起)，週 / 月彙總再由日彙總合併 (每桶最多 31 列)，
+    所以尾端結算的成本與歷史長度無關。settled_at 為空字串時全量重建。
+    """
+    day = local_day(settled_at) if settled_at else ""
+    # 其他時區的字串依字面排序可能落在前一天，多取一天再以台北日期過濾
+    lo = (datetime.date.fromisoformat(day) - datetime.timedelta(days=1)).isoformat() if day else ""
+    rows = conn.execute("""
+        SELECT l.settled_at, l.profit, l.equity, COALESCE(b.stake, 0) FROM equity_ledger l
+        LEFT JOIN bets b ON b.id = l.bet_id
+        WHERE l.settled_at >= ?
+        ORDER BY l.settled_at ASC, l.bet_id ASC
+    """, (lo,)).fetchall()
+    days = {}
+    for ts, profit, equity, stake in rows:
+        d = local_day(ts)
+        if d < day:
+            continue
+        agg = days.get(d)
+        if agg is None:
+            days[d] = [d, 1, int(profit > 0), profit, stake, equity, equity, equity]
+        else:
+            agg[1] += 1
+            agg[2] += profit > 0
+            agg[3] += profit
+            agg[4] += stake
+            agg[5] = equity
+            if equity < agg[6]: agg[6] = equity
+            if equity > agg[7]: agg[7] = equity
+    _rollup_replace(conn, "day", day, sorted(days.values()))
+
+    for grain in ("week", "month"):
+        start = _bucket_of(grain, day) if day else ""
+        lo_day = start if grain == "week" else start + "-01" if start else ""
+        merged = {}
+        for d, n, n_wins, profit, turnover, eq_close, eq_min, eq_max in conn.execute(
+                f"SELECT {', '.join(ROLLUP_COLUMNS)} FROM pnl_rollup WHERE grain='day' AND bucket >= ? "
+                "ORDER BY bucket", (lo_day,)):
+            key = _bucket_of(grain, d)
+            agg = merged.get(key)
+            if agg is None:
+                merged[key] = [key, n, n_wins, profit, turnover, eq_close, eq_min, eq_max]
+            else:
+                agg[1] += n
+                agg[2] += n_wins
+                agg[3] += profit
+                agg[4] += turnover
+                agg[5] = eq_close
+                agg[6] = min(agg[6], eq_min)
+                agg[7] = max(agg[7], eq_max)
+        _rollup_replace(conn, grain, start, sorted(merged.values()))
+
+
+def _rollup_append(conn, settled_at, bet_id, profit, equity):
+    """帳本最後新增一筆時，直接累加進日 / 週 / 月三個桶 (O(1)，不重掃當天帳本)"""
+    row = conn.execute("SELECT stake FROM bets WHERE id=?", (bet_id,)).fetchone()
+    stake = row[0] if row else 0
+    day = local_day(settled_at)
+    conn.executemany(f"""
+        INSERT INTO pnl_rollup (grain, {', '.join(ROLLUP_COLUMNS)}) VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (grain, bucket) DO UPDATE SET
+            n = n + 1, n_wins = n_wins + excluded.n_wins,
+            profit = profit + excluded.profit, turnover = turnover + excluded.turnover,
+            eq_close = excluded.eq_close,
+            eq_min = MIN(eq_min, excluded.eq_min), eq_max = MAX(eq_max, excluded.eq_max)
+    """, [(grain, _bucket_of(grain, day), int(profit > 0), profit, stake, equity, equity, equity)
+          for grain in ROLLUP_GRAINS])
+
+
+def _rollup_replace(conn, grain, start, rows):
+    conn.execute("DELETE FROM pnl_rollup WHERE grain=? AND bucket >= ?", (grain, start))
+    conn.executemany(f"INSERT INTO pnl_rollup (grain, {', '.join(ROLLUP_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     [(grain, *r) for r in rows])
+
+
+@instrument
+@cached_query
+def get_pnl_rollup(grain="day", start=None, end=None):
+    """讀取彙總 (bucket, n, n_wins, profit, turnover, eq_close, eq_min, eq_max)；start / end 為台北日期 (含)"""
+    if grain not in ROLLUP_GRAINS:
+        raise ValueError(f"grain 必須是 {ROLLUP_GRAINS}")
+    sql = f"SELECT {', '.join(ROLLUP_COLUMNS)} FROM pnl_rollup WHERE grain=?"
+    params = [grain]
+    if start:
+        sql += " AND bucket >= ?"; params.append(_bucket_of(grain, str(start)[:10]))
+    if end:
+        sql += " AND bucket <= ?"; params.append(_bucket_of(grain, str(end)[:10]))
+    with read_conn() as conn:
+        return pd.read_sql_query(sql + " ORDER BY bucket", conn, params=params)
+
+
+# ==========================================
+# 💰 設定與注單
+# ==========================================
+@instrument
+@cached_query
+def get_config():
+    with read_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT key, value FROM config")
+        data = dict(cur.fetchall())
+        return data.get('bankroll', 10000.0), data.get('initial', 10000.0)
+
+
+@instrument
+def update_config(bankroll=None, initial=None):
+    submit_write(_update_config, bankroll, initial)
+
+
+def _update_config(conn, bankroll, initial):
+    cur = conn.cursor()
+    changes = {}
+    if bankroll is not None:
+        cur.execute("INSERT OR REPLACE INTO config (key, value) VALUES ('bankroll', ?)", (bankroll,))
+        changes["bankroll"] = bankroll
+    if initial is not None:
+        cur.execute("INSERT OR REPLACE INTO config (key, value) VALUES ('initial', ?)", (initial,))
+        changes["initial"] = initial
+        # 起始本金改變 → 帳本內的權益 / 回撤全部失效
+        rebuild_equity_ledger(conn)
+    if changes:
+        log_audit(conn, "UPDATE_CONFIG", "SYSTEM", changes)
+
+
+INSERT_COLUMNS = ("id, created_at, match_info, bet_type, stake, odds, status, profit, settled_at, notes, "
+                  "fingerprint, league, home, away, market, side, line, model_ev, model_sharpe, model_p")
+INSERT_MARKS = ", ".join("?" * 20)
+
+
+@instrument
+def add_bet_db(match, bet_type, stake, odds, notes="", model=None):
+    """model = (ev, sharpe, p) 模型輸入 (ev / p 為小數)；未提供時由 notes 解析"""
+    now_iso = datetime.datetime.now(TZ_TAIPEI).isoformat()
+    bet_id = str(uuid.uuid4())
+
+    fingerprint = bet_fingerprint(match, bet_type, stake, odds)
+    row = ((bet_id, now_iso, match, bet_type, stake, odds, '待定', 0.0, None, notes, fingerprint)
+           + parse_bet(match, bet_type) + _model_values(model or parse_model(notes)))
+    return submit_write(_add_bet, row)
+
+
+def _model_values(model):
+    """(ev, sharpe, p) → 三個 float 或 None (Decimal / numpy 數值也轉成 float，sqlite3 才能綁定)"""
+    values = tuple(model)
+    if len(values) != 3:
+        raise ValueError("model 必須是 (ev, sharpe, p)")
+    return tuple(None if v is None else float(v) for v in values)
+
+
+def _add_bet(conn, row):
+    cur = conn.cursor()
+    # 查重交給 idx_bets_pending_fp：衝突時 OR IGNORE 不寫入 (rowcount = 0)
+    cur.execute(f"""
+        INSERT OR IGNORE INTO bets ({INSERT_COLUMNS})
+        VALUES ({INSERT_MARKS})
+    """, row)
+    if cur.rowcount == 0:
+        return False, "⚠️ 偵測到重複注單，操作已攔截！"
+
+    log_audit(conn, "ADD_BET", row[0], {"match": row[2], "stake": row[4]})
+    return True, row[0]
+
+
+@instrument
+def settle_bet_db(bet_id, profit, status, closing_odds=None, pending_only=False):
+    """結算注單；closing_odds 為收盤賠率 (選填，CLV 用)；pending_only=True 時已結算的注單不覆寫 (回傳 False)"""
+    now_iso = datetime.datetime.now(TZ_TAIPEI).isoformat()
+    # [FIX] 強制轉為 float，避免 Decimal 導致 JSON 報錯
+    profit_val = float(profit)
+    closing = float(closing_odds) if closing_odds else None
+    return submit_write(_settle_bet, bet_id, profit_val, status, now_iso, closing, pending_only)
+
+
+def _settle_bet(conn, bet_id, profit_val, status, now_iso, closing_odds=None, pending_only=False):
+    cur = conn.cursor()
+    cur.execute("SELECT profit, status FROM bets WHERE id=?", (bet_id,))
+    row = cur.fetchone()
+    if not row: return False
+    if pending_only and row[1] != '待定': return False
+    old_profit = row[0]
+
+    cur.execute("""
+        UPDATE bets
+        SET status=?, profit=?, settled_at=?, closing_odds=COALESCE(?, closing_odds)
+        WHERE id=?
+    """, (status, profit_val, now_iso, closing_odds, bet_id))
+
+    # 資金以差額原地更新 (不在 Python 端讀改寫)
+    cur.execute("UPDATE config SET value = value + ? WHERE key='bankroll'", (profit_val - old_profit,))
+    _ledger_upsert(conn, bet_id, now_iso, profit_val)
+
+    log_audit(conn, "SETTLE_BET", bet_id, {"status": status, "profit": profit_val, "old_profit": old_profit})
+    return True
+
+
+@instrument
+def revoke_settlement_db(bet_id, settled_only=False):
+    """撤銷結算；settled_only=True 時待定注單不處理 (回傳 False)"""
+    return submit_write(_revoke_settlement, bet_id, settled_only)
+
+
+def _revoke_settlement(conn, bet_id, settled_only=False):
+    cur = conn.cursor()
+    cur.execute("SELECT profit, status FROM bets WHERE id=?", (bet_id,))
+    row = cur.fetchone()
+    if not row: return False
+    if settled_only and row[1] == '待定': return False
+    profit_to_remove = row[0]
+
+    payload = {"removed_profit": profit_to_remove}
+    try:
+        cur.execute("UPDATE bets SET status='待定', profit=0, settled_at=NULL WHERE id=?", (bet_id,))
+    except sqlite3.IntegrityError:
+        # 結算後又下了一筆相同的注單 (已待定)，撞上 idx_bets_pending_fp：
+        # 與 v4 遷移處理舊資料的重複待定相同，撤銷的這筆清掉 fingerprint，不參與唯一性檢查
+        cur.execute("UPDATE bets SET status='待定', profit=0, settled_at=NULL, fingerprint=NULL WHERE id=?",
+                    (bet_id,))
+        payload["duplicate_pending"] = True
+
+    cur.execute("UPDATE config SET value = value - ? WHERE key='bankroll'", (profit_to_remove,))
+    _ledger_remove(conn, bet_id)
+
+    log_audit(conn, "REVOKE_SETTLE", bet_id, payload)
+    return True
+
+
+@instrument
+@cached_query
+def get_all_bets():
+    with read_conn() as conn:
+        return pd.read_sql_query("SELECT * FROM bets ORDER BY created_at ASC", conn)
+
+
+@instrument
+@cached_query
+def get_leagues():
+    """已出現過的聯賽清單 (idx_bets_league 直接提供排序結果)"""
+    with read_conn() as conn:
+        return [r[0] for r in conn.execute("SELECT DISTINCT league FROM bets WHERE league IS NOT NULL ORDER BY league")]
+
+
+def _bet_filters(league=None, team=None, market=None, side=None, line=None, status=None):
+    clauses, params = [], []
+    if league:
+        clauses.append("league = ?"); params.append(league)
+    if team:
+        clauses.append("(home = ? OR away = ?)"); params += [team, team]
+    if market:
+        clauses.append("market = ?"); params.append(market)
+    if side:
+        clauses.append("side = ?"); params.append(side)
+    if line is not None:
+        clauses.append("line = ?"); params.append(float(line))
+    if status == "settled":
+        clauses.append("status != '待定'")
+    elif status:
+        clauses.append("status = ?"); params.append(status)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+@instrument
+@cached_query
+def query_bets(league=None, team=None, market=None, side=None, line=None, status=None):
+    """以結構化欄位在 SQL 端篩選注單 (走索引，不再載入全表後 str.contains)"""
+    where, params = _bet_filters(league, team, market, side, line, status)
+    with read_conn() as conn:
+        return pd.read_sql_query(f"SELECT * FROM bets{where} ORDER BY created_at ASC", conn, params=params)
+
+
+PAGE_ORDERS = ("created_at", "settled_at")
+
+
+def _like_term(text):
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+FTS_MIN_CHARS = 3      # trigram 分詞：至少 3 個字元才能走全文索引
+
+
+def _has_fts(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='bets_fts'").fetchone() is not None
+
+
+def _search_clauses(conn, text):
+    """
+    搜尋字串 → (WHERE 子句, 參數)；空白分隔的詞彼此為 AND。
+    >= 3 字的詞走 bets_fts 子字串比對 (可用於前綴 / 中文隊名)；1–2 字的詞 (如「曼」、筆記標籤) 無法用 trigram，
+    改以 LIKE 比對 match_info / bet_type / notes (與長詞並用時只需檢查 FTS 的候選列)。沒有 FTS5 時整串退回 LIKE。
+    """
+    long_terms, short_terms = _split_terms(text)
+    if not long_terms and not short_terms:
+        return [], []
+    if not _has_fts(conn):
+        like = _like_term(text.strip())
+        return (["(match_info LIKE ? ESCAPE '\\' OR bet_type LIKE ? ESCAPE '\\' OR notes LIKE ? ESCAPE '\\')"],
+                [like, like, like])
+    clauses, params = _short_term_clauses(short_terms)
+    if long_terms:
+        clauses.append("rowid IN (SELECT rowid FROM bets_fts WHERE bets_fts MATCH ?)")
+        params.append(_fts_query(long_terms))
+    return clauses, params
+
+
+def _split_terms(text):
+    """空白分隔 → (>= FTS_MIN_CHARS 字的詞, 較短的詞)；去掉 FTS 語法用的引號與 *"""
+    terms = [t for t in (t.strip('"*') for t in text.split()) if t]
+    return ([t for t in terms if len(t) >= FTS_MIN_CHARS],
+            [t for t in terms if len(t) < FTS_MIN_CHARS])
+
+
+def _short_term_clauses(terms, alias=""):
+    """alias：與 bets_fts JOIN 時的 bets 別名前綴 (兩邊欄位同名)"""
+    clauses, params = [], []
+    for t in terms:
+        like = _like_term(t)
+        clauses.append(f"({alias}match_info LIKE ? ESCAPE '\\' OR {alias}bet_type LIKE ? ESCAPE '\\' "
+                       f"OR {alias}notes LIKE ? ESCAPE '\\')")
+        params += [like, like, like]
+    return clauses, params
+
+
+def _fts_query(terms):
+    return " AND ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def vacuum():
+    """
+    VACUUM 整理 DB 檔。bets 的主鍵是 TEXT，VACUUM 可能重編隱含的 rowid，
+    而 bets_fts (external content) 以 rowid 對應 → 在同一把寫入鎖內重建全文索引。
+    """
+    pool = get_pool()
+    with pool._write_lock:
+        pool._writer_conn().execute("VACUUM")
+        with pool.write() as conn:
+            if _has_fts(conn):
+                conn.execute("INSERT INTO bets_fts (bets_fts) VALUES ('rebuild')")
+
+
+@instrument
+@cached_query
+def page_bets(cursor=None, limit=50, order_by="created_at", search=None, **filters):
+    """
+    keyset 分頁 (新到舊)。cursor 為上一頁最後一列的 (order_key, id)，第一頁為 None。
+    search 比對 match_info / bet_type / notes (全文索引，見 _search_clauses；搜尋框即時篩選用)。
+    回傳 (df, next_cursor)；next_cursor 為 None 代表已是最後一頁。
+    """
+    if order_by not in PAGE_ORDERS:
+        raise ValueError(f"order_by 必須是 {PAGE_ORDERS}")
+    where, params = _bet_filters(**filters)
+    clauses = [where[len(" WHERE "):]] if where else []
+    if order_by == "settled_at":
+        clauses.append("settled_at IS NOT NULL")
+    if cursor is not None:
+        clauses.append(f"({order_by}, id) < (?, ?)")
+        params += list(cursor)
+    with read_conn() as conn:
+        if search:
+            extra, extra_params = _search_clauses(conn, search)
+            clauses += extra
+            params += extra_params
+        sql = "SELECT * FROM bets"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {order_by} DESC, id DESC LIMIT ?"
+        params.append(int(limit) + 1)
+        df = pd.read_sql_query(sql, conn, params=params)
+    if len(df) > limit:
+        df = df.iloc[:limit]
+        last = df.iloc[-1]
+        return df, (last[order_by], last["id"])
+    return df, None
+
+
+@instrument
+@cached_query
+def search_bets(search, limit=50, **filters):
+    """
+    全文搜尋並依相關度 (bm25：賽事 > 玩法 > 筆記) 排序，回傳前 limit 筆；
+    沒有 >= 3 字的詞 (或沒有 FTS5) 時無相關度可言，改為新到舊。
+    """
+    where, params = _bet_filters(**filters)
+    clauses = [where[len(" WHERE "):]] if where else []
+    long_terms, short_terms = _split_terms(search)
+    with read_conn() as conn:
+        if not long_terms or not _has_fts(conn):
+            extra, extra_params = _search_clauses(conn, search)
+            sql = "SELECT * FROM bets"
+            if clauses + extra:
+                sql += " WHERE " + " AND ".join(clauses + extra)
+            sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+            return pd.read_sql_query(sql, conn, params=params + extra_params + [int(limit)])
+        # 短詞 (1–2 字) 以 LIKE 過濾 FTS 的候選列
+        extra, extra_params = _short_term_clauses(short_terms, alias="b.")
+        clauses += extra
+        params += extra_params
+        sql = "SELECT b.* FROM bets_fts JOIN bets b ON b.rowid = bets_fts.rowid WHERE bets_fts MATCH ?"
+        if clauses:
+            sql += " AND " + " AND ".join(clauses)
+        sql += " ORDER BY bets_fts.rank LIMIT ?"
+        return pd.read_sql_query(sql, conn, params=[_fts_query(long_terms)] + params + [int(limit)])
+
+
+_CALIBRATION_SQL = """
+    SELECT league, market, MIN(CAST(model_p * {bins} AS INTEGER), {bins} - 1) AS bin,
+        COUNT(*) AS n,
+        SUM(profit != 0) AS n_scored,
+        SUM(CASE WHEN profit != 0 THEN model_p ELSE 0 END) AS sum_p,
+        SUM(profit > 0) AS sum_y,
+        SUM(CASE WHEN profit != 0 THEN (model_p - (profit > 0)) * (model_p - (profit > 0)) ELSE 0 END) AS sum_brier,
+        SUM(CASE WHEN profit > 0 THEN -ln(MAX(model_p, {eps!r}))
+                 WHEN profit < 0 THEN -ln(MAX(1 - model_p, {eps!r})) ELSE 0 END) AS sum_logloss,
+        SUM(stake) AS stake,
+        SUM(profit) AS profit,
+        SUM(CASE WHEN model_ev IS NOT NULL THEN stake ELSE 0 END) AS ev_stake,
+        SUM(COALESCE(stake * model_ev, 0)) AS ev_sum,
+        SUM(closing_odds > 1) AS n_clv,
+        SUM(CASE WHEN closing_odds > 1 THEN odds / closing_odds - 1 ELSE 0 END) AS clv_sum
+    FROM bets{where}
+    GROUP BY +league, market, bin
+"""
+
+
+@instrument
+@cached_query
+def get_calibration_partials(bins=10, **filters):
+    """
+    模型校準的部分和表 (league, market, 勝率區間)，在 DB 端一次掃描完成 (見 sniper/calibration.py)。
+    GROUP BY +league：不讓 SQLite 為了省排序走 idx_bets_league 逐列回表 (全表循序掃描快 2 倍以上)。
+    SQLite 未編譯數學函式時，以 Python 的 math.log 註冊 ln。
+    """
+    from sniper.calibration import EPS
+    filters.setdefault("status", "settled")
+    where, params = _bet_filters(**filters)
+    where += (" AND " if where else " WHERE ") + "model_p IS NOT NULL"
+    sql = _CALIBRATION_SQL.format(where=where, bins=int(bins), eps=EPS)
+    with read_conn() as conn:
+        try:
+            return pd.read_sql_query(sql, conn, params=params)
+        except pd.errors.DatabaseError as e:
+            if "no such function: ln" not in str(e):
+                raise
+            conn.create_function("ln", 1, math.log, deterministic=True)
+            return pd.read_sql_query(sql, conn, params=params)
+
+
+@instrument
+@cached_query
+def group_bets(by=("league",), **filters):
+    """在 SQL 端分組統計已結算注單：筆數、勝場、損益、流水"""
+    by = [c for c in by if c in {name for name, _ in STRUCTURED_COLUMNS}]
+    if not by:
+        raise ValueError("group_bets 需要至少一個結構化欄位")
+    filters.setdefault("status", "settled")
+    where, params = _bet_filters(**filters)
+    keys = ", ".join(by)
+    sql = f"""
+        SELECT {keys}, COUNT(*) AS n_settled, SUM(profit > 0) AS n_wins,
+               SUM(profit) AS profit, SUM(stake) AS turnover, AVG(odds) AS avg_odds
+        FROM bets{where} GROUP BY {keys} ORDER BY {keys}
+    """
+    with read_conn() as conn:
+        return pd.read_sql_query(sql, conn, params=params)
+
+
+@instrument
+@cached_query
+def has_bets():
+    """是否有任何注單 (不載入資料表)"""
+    with read_conn() as conn:
+        return conn.execute("SELECT EXISTS (SELECT 1 FROM bets)").fetchone()[0] == 1
+
+
+@instrument
+@cached_query
+def get_pending_bets():
+    """待結算注單 (新到舊)"""
+    with read_conn() as conn:
+        return pd.read_sql_query("SELECT * FROM bets WHERE status='待定' ORDER BY created_at DESC", conn)
+
+
+ID_CHUNK = 900     # 單一 IN (...) 查詢的參數上限
+
+
+def get_bets_by_ids(ids, columns=("id", "stake", "odds", "status")):
+    """依 id 批次讀取注單 (不快取，API 結算前查最新狀態用)；回傳 {id: dict}"""
+    ids = list(dict.fromkeys(ids))
+    out = {}
+    with read_conn() as conn:
+        for i in range(0, len(ids), ID_CHUNK):
+            part = ids[i:i + ID_CHUNK]
+            rows = conn.execute(f"SELECT {', '.join(columns)} FROM bets WHERE id IN ({','.join('?' * len(part))})", part)
+            out.update((r[0], dict(zip(columns, r))) for r in rows)
+    return out
+
+
+@instrument
+@cached_query
+def get_recent_settled(limit=5):
+    """近期已結算注單 (可撤銷清單)"""
+    with read_conn() as conn:
+        return pd.read_sql_query(
+            "SELECT * FROM bets WHERE status != '待定' ORDER BY settled_at DESC LIMIT ?",
+            conn, params=(int(limit),)
+        )
+
+
+@instrument
+def reset_system_db():
+    submit_write(_reset_system)
+
+
+def _reset_system(conn):
+    cur = conn.cursor()
+    cur.execute("DELETE FROM bets")
+    cur.execute("DELETE FROM audit_log")
+    cur.execute("DELETE FROM equity_ledger")
+    cur.execute("DELETE FROM pnl_rollup")
+    cur.execute("DELETE FROM audit_checkpoint")
+    cur.execute("UPDATE config SET value=10000.0 WHERE key='bankroll'")
+    cur.execute("UPDATE config SET value=10000.0 WHERE key='initial'")
+    log_audit(conn, "SYSTEM_RESET", "ALL", {})
@@ -0,0 +1,172 @@
+"""
+📂 串流匯出
+只在使用者按下下載時才產生內容 (st.download_button 的 callable data)，
+並以 cursor.fetchmany 分段讀取、分段寫出，記憶體用量與資料表大小無關。
+支援 NDJSON、gzip CSV、Parquet (需 pyarrow)，以及舊版 JSON 備份格式。
+
+st.download_button 只收 bytes，整個檔案最後一定會進記憶體 → export_bytes 上限 DOWNLOAD_MAX；
+更大的匯出用 CLI 直接串流寫檔：python -m sniper.export --format csv.gz --out bets.csv.gz
+"""
+import argparse
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import sys
+import tempfile
+
+from sniper import db
+
+CHUNK_SIZE = 10000
+SPOOL_MAX = 8 * 1024 * 1024   # 超過 8 MB 的匯出暫存到磁碟
+DOWNLOAD_MAX = int(os.environ.get("SNIPER_EXPORT_MAX_BYTES", str(64 * 1024 * 1024)))   # 瀏覽器下載的上限
+
+EXPORT_COLUMNS = ["id", "created_at", "match_info", "bet_type", "stake", "odds",
+                  "status", "profit", "settled_at", "notes"]
+
+
+def _where(date_from=None, date_to=None, league=None):
+    """組出篩選條件；日期為 created_at (台北時間) 的含頭含尾區間"""
+    clauses, params = [], []
+    if date_from:
+        clauses.append("created_at >= ?")
+        params.append(str(date_from))
+    if date_to:
+        clauses.append("created_at < ?")
+        params.append(str(date_to + datetime.timedelta(days=1)) if isinstance(date_to, datetime.date) else str(date_to))
+    if league:
+        clauses.append("league = ?")
+        params.append(league)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def iter_bet_chunks(chunk_size=CHUNK_SIZE, **filters):
+    """逐段產生 bets 的 tuple 列表 (欄位順序同 EXPORT_COLUMNS)"""
+    where, params = _where(**filters)
+    sql = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM bets{where} ORDER BY created_at ASC"
+    with db.read_conn() as conn:
+        cur = conn.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+
+def write_ndjson(fp, **filters):
+    """每列一個 JSON 物件 (bytes)"""
+    for rows in iter_bet_chunks(**filters):
+        buf = "".join(json.dumps(dict(zip(EXPORT_COLUMNS, r)), ensure_ascii=False) + "\n" for r in rows)
+        fp.write(buf.encode("utf-8"))
+
+
+def write_csv_gz(fp, **filters):
+    """gzip 壓縮的 CSV"""
+    with gzip.GzipFile(fileobj=fp, mode="wb") as gz, \
+            io.TextIOWrapper(gz, encoding="utf-8", newline="") as text:
+        writer = csv.writer(text)
+        writer.writerow(EXPORT_COLUMNS)
+        for rows in iter_bet_chunks(**filters):
+            writer.writerows(rows)
+
+
+def write_parquet(fp, **filters):
+    """Parquet (每段一個 row group)；需要 pyarrow"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet 匯出需要安裝 pyarrow") from e
+    schema = pa.schema([
+        ("id", pa.string()), ("created_at", pa.string()), ("match_info", pa.string()),
+        ("bet_type", pa.string()), ("stake", pa.float64()), ("odds", pa.float64()),
+        ("status", pa.string()), ("profit", pa.float64()), ("settled_at", pa.string()),
+        ("notes", pa.string()),
+    ])
+    with pq.ParquetWriter(fp, schema, compression="zstd") as writer:
+        for rows in iter_bet_chunks(**filters):
+            cols = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(c, type=f.type) for c, f in zip(cols, schema)], schema=schema))
+
+
+def write_json_backup(fp, **filters):
+    """舊版側邊欄 JSON 備份格式 ({"records": [...], "bankroll", "initial", "ts"})，逐段寫出"""
+    bankroll, initial = db.get_config()
+    fp.write(b'{"records": [')
+    first = True
+    for rows in iter_bet_chunks(**filters):
+        body = ",\n".join(json.dumps(dict(zip(EXPORT_COLUMNS, r)), ensure_ascii=False) for r in rows)
+        fp.write((("\n" if first else ",\n") + body).encode("utf-8"))
+        first = False
+    tail = {"bankroll": bankroll, "initial": initial, "ts": datetime.datetime.now(db.TZ_TAIPEI).isoformat()}
+    fp.write(("\n], " + json.dumps(tail, ensure_ascii=False)[1:]).encode("utf-8"))
+
+
+# fmt -> (顯示名稱, 副檔名, MIME, writer)
+FORMATS = {
+    "json": ("JSON (備份)", "json", "application/json", write_json_backup),
+    "ndjson": ("NDJSON", "ndjson", "application/x-ndjson", write_ndjson),
+    "csv.gz": ("CSV (gzip)", "csv.gz", "application/gzip", write_csv_gz),
+    "parquet": ("Parquet", "parquet", "application/vnd.apache.parquet", write_parquet),
+}
+
+
+def export_to(fp, fmt="ndjson", **filters):
+    """寫入任意 binary file-like (或路徑)"""
+    writer = FORMATS[fmt][3]
+    if isinstance(fp, str):
+        with open(fp, "wb") as f:
+            writer(f, **filters)
+    else:
+        writer(fp, **filters)
+
+
+class ExportTooLarge(ValueError):
+    """匯出結果超過 DOWNLOAD_MAX，不適合整包讀進記憶體交給瀏覽器下載"""
+
+
+def export_bytes(fmt="ndjson", **filters):
+    """
+    供 st.download_button 的 callable 使用 (Streamlit 只接受 bytes / BytesIO，無法串流)。
+    產生過程逐段寫入暫存檔 (超過 SPOOL_MAX 落到磁碟)，讀回記憶體前先檢查大小：
+    超過 DOWNLOAD_MAX 拋 ExportTooLarge，請縮小篩選範圍或改用 CLI 串流寫檔。
+    """
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX) as spool:
+        export_to(spool, fmt, **filters)
+        size = spool.tell()
+        if size > DOWNLOAD_MAX:
+            raise ExportTooLarge(f"匯出檔 {size / 2**20:,.1f} MB 超過下載上限 {DOWNLOAD_MAX / 2**20:,.0f} MB；"
+                                 f"請縮小日期 / 聯賽範圍，或執行 python -m sniper.export --format {fmt} --out <檔案>")
+        spool.seek(0)
+        return spool.read()
+
+
+def file_name(fmt):
+    return f"sniper_v9_backup.{FORMATS[fmt][1]}"
+
+
+# ==========================================
+# ⌨️ CLI (不經記憶體，直接串流寫到檔案 / stdout)
+# ==========================================
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m sniper.export", description="Sniper Bet Pro 串流匯出")
+    ap.add_argument("--db", help="DB 路徑 (預設 SNIPER_DB_PATH / sniper_v9.db)")
+    ap.add_argument("--format", choices=list(FORMATS), default="ndjson")
+    ap.add_argument("--out", default="-", help="輸出檔路徑；'-' 代表 stdout")
+    ap.add_argument("--from", dest="date_from", type=datetime.date.fromisoformat, help="下單日期起 (YYYY-MM-DD)")
+    ap.add_argument("--to", dest="date_to", type=datetime.date.fromisoformat, help="下單日期迄 (含)")
+    ap.add_argument("--league")
+    args = ap.parse_args(argv)
+
+    if args.db:
+        db.DB_PATH = args.db
+    filters = {k: getattr(args, k) for k in ("date_from", "date_to", "league") if getattr(args, k)}
+    export_to(sys.stdout.buffer if args.out == "-" else args.out, args.format, **filters)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+📤 批次匯入注單
+支援側邊欄匯出的 JSON ({"records": [...]})，以及 CSV / NDJSON (每列一筆注單)。
+逐段讀取、逐段交易寫入；查重完全交給 bets.id 主鍵與 idx_bets_pending_fp 唯一部分索引，
+不做逐筆 SELECT。已結算的注單會一併寫入帳本並調整資金池。
+"""
+import datetime
+import io
+import json
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from sniper import db
+from sniper.parsing import parse_bet, parse_model
+
+CHUNK_SIZE = 5000
+SQL_VAR_LIMIT = 900
+
+BET_COLUMNS = ["id", "created_at", "match_info", "bet_type", "stake", "odds",
+               "status", "profit", "settled_at", "notes"]
+
+REJECT_DUPLICATE_ID = "DUPLICATE_ID"
+REJECT_DUPLICATE_BET = "DUPLICATE_BET"
+REJECT_INVALID_ROW = "INVALID_ROW"
+
+
+def _detect_format(name):
+    name = (name or "").lower()
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if name.endswith(".json"):
+        return "json"
+    return "csv"
+
+
+def iter_bet_records(source, fmt=None, chunk_size=CHUNK_SIZE):
+    """逐段產生注單 DataFrame (欄位對齊 BET_COLUMNS，缺少的欄位補 None)"""
+    fmt = fmt or _detect_format(getattr(source, "name", source if isinstance(source, str) else ""))
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    if fmt == "json":
+        # 匯出檔為單一 JSON 物件，無法串流解析；讀入後再分段寫入
+        if isinstance(source, str):
+            with open(source, encoding="utf-8") as f:
+                payload = json.load(f)
+        else:
+            payload = json.load(source)
+        records = payload.get("records", []) if isinstance(payload, dict) else payload
+        chunks = (pd.DataFrame(records[i:i + chunk_size]) for i in range(0, len(records), chunk_size))
+    elif fmt == "ndjson":
+        chunks = pd.read_json(source, lines=True, chunksize=chunk_size, dtype=False)
+    else:
+        chunks = pd.read_csv(source, chunksize=chunk_size, dtype={"id": str, "notes": str})
+
+    for chunk in chunks:
+        chunk = chunk.reindex(columns=BET_COLUMNS)
+        yield chunk.astype(object).where(chunk.notna(), None)
+
+
+def _existing_ids(conn, ids):
+    found = set()
+    for i in range(0, len(ids), SQL_VAR_LIMIT):
+        part = ids[i:i + SQL_VAR_LIMIT]
+        marks = ",".join("?" * len(part))
+        found.update(r[0] for r in conn.execute(f"SELECT id FROM bets WHERE id IN ({marks})", part))
+    return found
+
+
+def _normalize(chunk, now_iso):
+    """補齊預設值並計算指紋；回傳 ([(pos, row), ...], invalid_positions)"""
+    rows, invalid = [], []
+    for pos, r in enumerate(chunk.itertuples(index=False)):
+        try:
+            stake, odds = float(r.stake), float(r.odds)
+        except (TypeError, ValueError):
+            invalid.append(pos)
+            continue
+        if not r.match_info or not r.bet_type or np.isnan(stake) or np.isnan(odds):
+            invalid.append(pos)
+            continue
+        status = r.status or "待定"
+        pending = status == "待定"
+        profit = 0.0 if pending or r.profit is None else float(r.profit)
+        rows.append((pos, (
+            str(r.id) if r.id else str(uuid.uuid4()),
+            r.created_at or now_iso,
+            str(r.match_info), str(r.bet_type), stake, odds, status, profit,
+            None if pending else (r.settled_at or now_iso),
+            r.notes or "",
+            db.bet_fingerprint(r.match_info, r.bet_type, stake, odds),
+        ) + parse_bet(r.match_info, r.bet_type) + parse_model(r.notes)))
+    return rows, invalid
+
+
+def _import_chunk(conn, chunk, batch_id):
+    now_iso = datetime.datetime.now(db.TZ_TAIPEI).isoformat()
+    rows, invalid = _normalize(chunk, now_iso)
+    rejects = [(p, chunk.iloc[p]["id"], REJECT_INVALID_ROW) for p in invalid]
+
+    clash = _existing_ids(conn, [r[0] for _, r in rows])
+    fresh = []
+    for pos, r in rows:
+        if r[0] in clash:
+            rejects.append((pos, r[0], REJECT_DUPLICATE_ID))
+        else:
+            clash.add(r[0])   # 同一段內重複的 id 也視為衝突
+            fresh.append((pos, r))
+
+    conn.executemany(f"""
+        INSERT OR IGNORE INTO bets ({db.INSERT_COLUMNS})
+        VALUES ({db.INSERT_MARKS})
+    """, [r for _, r in fresh])
+    # 被 OR IGNORE 略過的只可能是待定指紋衝突 (主鍵已先排除)
+    inserted = _existing_ids(conn, [r[0] for _, r in fresh])
+    done = [r for _, r in fresh if r[0] in inserted]
+    rejects += [(pos, r[0], REJECT_DUPLICATE_BET) for pos, r in fresh if r[0] not in inserted]
+
+    conn.executemany(
+        "INSERT INTO audit_log (ts, action, target_id, payload) VALUES (?, ?, ?, ?)",
+        ((now_iso, "ADD_BET", r[0], json.dumps({"match": r[2], "stake": r[4], "import": batch_id}, ensure_ascii=False))
+         for r in done),
+    )
+    settled = [(r[0], r[8], r[7]) for r in done if r[6] != "待定"]
+    delta = sum(e[2] for e in settled)
+    if settled:
+        conn.execute("UPDATE config SET value = value + ? WHERE key='bankroll'", (delta,))
+        db.ledger_append(conn, settled)
+    return len(done), delta, rejects
+
+
+def import_bets(source, fmt=None, chunk_size=CHUNK_SIZE):
+    """
+    匯入注單，每段獨立 commit。
+    回傳 {'batch_id', 'imported', 'profit', 'rejects': DataFrame[row, id, reason]}
+    """
+    batch_id = str(uuid.uuid4())
+    imported, profit, rejects, offset = 0, 0.0, [], 0
+    for chunk in iter_bet_records(source, fmt=fmt, chunk_size=chunk_size):
+        with db.write_txn() as conn:
+            n, delta, rej = _import_chunk(conn, chunk, batch_id)
+            if n:
+                db.log_audit(conn, "BATCH_IMPORT", batch_id, {"rows": n, "profit": delta})
+        imported += n
+        profit += delta
+        rejects += [(offset + p + 1, bid, reason) for p, bid, reason in sorted(rej, key=lambda x: x[0])]
+        offset += len(chunk)
+    return {
+        "batch_id": batch_id,
+        "imported": imported,
+        "profit": round(profit, 2),
+        "rejects": pd.DataFrame(rejects, columns=["row", "id", "reason"]),
+    }
@@ -0,0 +1,301 @@
+"""
+⏱ 每次 rerun 的熱點量測
+Streamlit 每次 rerun 都從頭執行 App.py；這裡以執行緒為單位記錄一次 rerun 內
+每個 UI 區段與 DB 函式的：耗時、SQL 陳述式數、回傳列數、記憶體峰值 (tracemalloc，選用)。
+
+- section(name)：with 區塊 (可巢狀)，子區段的 SQL / 列數會累加到外層
+- instrument：DB 讀寫函式的裝飾器 (放在 cached_query 外層，快取命中也會記錄)
+- trace_sql：掛在每條 sqlite 連線的 set_trace_callback，計算 SQL 陳述式數
+- capture() / attach()：寫入佇列把呼叫端的區段帶到寫入執行緒，寫入的 SQL 記回發出它的 rerun
+- finish_rerun()：把本次 rerun 附加到 SNIPER_METRICS_FILE (.ndjson 附加一行；.prom 覆寫為 Prometheus 文字格式)
+"""
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+METRICS_FILE = os.environ.get("SNIPER_METRICS_FILE", "")      # 未設定時不寫檔 (面板照常顯示)
+MAX_FILE_BYTES = 50 * 1024 * 1024     # 超過就輪替成 .1
+
+_local = threading.local()
+_tracing_owner = False     # tracemalloc 是否由本模組啟動 (關閉記憶體量測時才停掉)
+
+
+class _Frame:
+    __slots__ = ("name", "t0", "sql", "rows", "peak")
+
+    def __init__(self, name):
+        self.name = name
+        self.t0 = time.perf_counter()
+        self.sql = 0
+        self.rows = 0
+        self.peak = 0
+
+
+def _set_tracing(on):
+    global _tracing_owner
+    if on:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_owner = True
+        tracemalloc.reset_peak()
+    elif _tracing_owner and tracemalloc.is_tracing():
+        tracemalloc.stop()
+        _tracing_owner = False
+
+
+def _peak():
+    """目前的 tracemalloc 峰值並歸零 (其他 session 可能已關閉追蹤)"""
+    if not tracemalloc.is_tracing():
+        return 0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.reset_peak()
+    return peak
+
+
+class Rerun:
+    """一次 rerun 的量測結果；sections 以名稱彙總 (同名區段多次呼叫會累加)"""
+
+    def __init__(self, session=None, memory=False):
+        self.session = session
+        self.memory = memory
+        self.started = datetime.datetime.now(datetime.timezone.utc)
+        self.root = _Frame("rerun")
+        self.stack = [self.root]
+        self.sections = {}
+        self.total_ms = None
+        self.aborted = False
+        _set_tracing(memory)
+
+    def _push(self, name):
+        if self.memory:
+            parent = self.stack[-1]
+            parent.peak = max(parent.peak, _peak())
+        frame = _Frame(name)
+        self.stack.append(frame)
+        return frame
+
+    def _pop(self, frame):
+        ms = (time.perf_counter() - frame.t0) * 1000
+        if self.memory:
+            frame.peak = max(frame.peak, _peak())
+        self.stack.remove(frame)
+        parent = self.stack[-1]
+        parent.sql += frame.sql
+        parent.rows += frame.rows
+        parent.peak = max(parent.peak, frame.peak)
+        s = self.sections.setdefault(frame.name, {"calls": 0, "ms": 0.0, "sql": 0, "rows": 0, "peak_kb": 0.0})
+        s["calls"] += 1
+        s["ms"] += ms
+        s["sql"] += frame.sql
+        s["rows"] += frame.rows
+        s["peak_kb"] = max(s["peak_kb"], frame.peak / 1024)
+
+    def elapsed_ms(self):
+        if self.total_ms is not None:
+            return self.total_ms
+        return (time.perf_counter() - self.root.t0) * 1000
+
+    def finish(self, aborted=False):
+        if self.total_ms is not None:
+            return
+        # rerun 被 st.rerun() / st.stop() 中斷時，仍未關閉的區段一併收尾
+        for frame in reversed(self.stack[1:]):
+            self._pop(frame)
+        self.total_ms = (time.perf_counter() - self.root.t0) * 1000
+        if self.memory:
+            self.root.peak = max(self.root.peak, _peak())
+        self.aborted = aborted
+
+    def to_dict(self):
+        return {
+            "ts": self.started.isoformat(),
+            "session": self.session,
+            "total_ms": round(self.elapsed_ms(), 3),
+            "sql": self.root.sql,
+            "rows": self.root.rows,
+            "peak_kb": round(self.root.peak / 1024, 1) if self.memory else None,
+            "aborted": self.aborted,
+            "sections": {k: dict(v, ms=round(v["ms"], 3), peak_kb=round(v["peak_kb"], 1) if self.memory else None)
+                         for k, v in self.sections.items()},
+        }
+
+    def table(self):
+        """區段表 (效能面板顯示用)，依耗時由大到小"""
+        df = pd.DataFrame.from_dict(self.to_dict()["sections"], orient="index")
+        if df.empty:
+            return df
+        return df.rename_axis("section").reset_index().sort_values("ms", ascending=False, kind="stable")
+
+
+def current():
+    return getattr(_local, "rerun", None)
+
+
+def start_rerun(session=None, memory=False):
+    """開始新的 rerun；上一次若因 st.rerun() 中斷而未收尾，先寫出並標記 aborted"""
+    prev = current()
+    if prev is not None and prev.total_ms is None:
+        prev.finish(aborted=True)
+        _write(prev)
+    _local.rerun = Rerun(session, memory)
+    return _local.rerun
+
+
+def finish_rerun(path=None):
+    run = current()
+    if run is None:
+        return None
+    run.finish()
+    _write(run, path)
+    return run
+
+
+class section:
+    """with metrics.section("tab1"): ...   (沒有進行中的 rerun 時不做任何事)"""
+
+    __slots__ = ("name", "frame", "run")
+
+    def __init__(self, name):
+        self.name = name
+        self.frame = None
+        self.run = None
+
+    def __enter__(self):
+        self.run = current()
+        if self.run is not None and self.run.total_ms is None:
+            self.frame = self.run._push(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        if self.frame is not None and self.frame in self.run.stack:
+            self.run._pop(self.frame)
+        return False
+
+
+def add_rows(n):
+    run = current()
+    if run is not None and run.total_ms is None:
+        run.stack[-1].rows += n
+
+
+def trace_sql(statement):
+    """sqlite3 set_trace_callback：每個實際執行的陳述式 +1"""
+    frame = getattr(_local, "attached", None)
+    if frame is not None:
+        frame.sql += 1
+        return
+    run = current()
+    if run is not None and run.total_ms is None:
+        run.stack[-1].sql += 1
+
+
+def capture():
+    """目前 rerun 進行中的區段 (送進寫入佇列時一併帶走)；不在 rerun 內回傳 None"""
+    run = current()
+    if run is not None and run.total_ms is None:
+        return run.stack[-1]
+    return None
+
+
+class attach:
+    """with metrics.attach(frame): ...   在寫入執行緒把 SQL 計數記到 capture() 取得的區段"""
+
+    __slots__ = ("frame", "prev")
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.prev = None
+
+    def __enter__(self):
+        self.prev = getattr(_local, "attached", None)
+        _local.attached = self.frame
+        return self
+
+    def __exit__(self, *exc):
+        _local.attached = self.prev
+        return False
+
+
+def _result_rows(value):
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    if isinstance(value, tuple) and value and isinstance(value[0], pd.DataFrame):
+        return len(value[0])          # page_bets 回傳 (df, cursor)
+    if isinstance(value, list):
+        return len(value)
+    return 0
+
+
+def instrument(func):
+    """DB 函式裝飾器：以 db.<name> 為區段名稱記錄耗時 / SQL 數 / 回傳列數"""
+    name = f"db.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with section(name):
+            value = func(*args, **kwargs)
+            add_rows(_result_rows(value))
+            return value
+    return wrapper
+
+
+# ==========================================
+# 📄 輸出
+# ==========================================
+def _rotate(path):
+    try:
+        if os.path.getsize(path) > MAX_FILE_BYTES:
+            os.replace(path, path + ".1")
+    except OSError:
+        pass
+
+
+def _prometheus(record):
+    lines = []
+    for metric, key, help_text in (
+        ("sniper_rerun_section_seconds", "ms", "Wall time per section in the last rerun"),
+        ("sniper_rerun_section_sql_statements", "sql", "SQL statements per section in the last rerun"),
+        ("sniper_rerun_section_rows", "rows", "Rows returned per section in the last rerun"),
+        ("sniper_rerun_section_peak_bytes", "peak_kb", "tracemalloc peak per section in the last rerun"),
+    ):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} gauge")
+        for name, s in record["sections"].items():
+            value = s[key]
+            if value is None:
+                continue
+            if key == "ms":
+                value = value / 1000
+            elif key == "peak_kb":
+                value = value * 1024
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'{metric}{{section="{label}"}} {value}')
+    lines.append("# TYPE sniper_rerun_seconds gauge")
+    lines.append(f"sniper_rerun_seconds {record['total_ms'] / 1000}")
+    return "\n".join(lines) + "\n"
+
+
+def _write(run, path=None):
+    path = METRICS_FILE if path is None else path
+    if not path:
+        return
+    record = run.to_dict()
+    try:
+        if path.endswith(".prom"):
+            # node_exporter textfile collector：整檔覆寫，先寫暫存檔再 rename
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(_prometheus(record))
+            os.replace(tmp, path)
+        else:
+            _rotate(path)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError:
+        pass      # 量測檔寫不進去不能影響主畫面
@@ -0,0 +1,289 @@
+"""
+🧱 資料庫結構遷移 (PRAGMA user_version)
+每個步驟有固定版本號並依序執行，本身也必須可重複執行 (IF NOT EXISTS / 先查欄位)，
+因為舊版 sniper_v9.db 的 user_version 一律是 0，但可能已經有部分結構。
+- 已是最新版：只讀一次 PRAGMA user_version 就返回，同一行程內之後連這次都省略
+- 需要升級：先以 SQLite backup API 備份成 <db>.v<舊版本>.bak，再於單一 BEGIN IMMEDIATE 交易內
+  逐步執行並更新 user_version；任何一步失敗整批回滾，版本號不變
+"""
+import os
+import sqlite3
+import threading
+
+from sniper import db
+from sniper.parsing import parse_bet_type, parse_match_info, parse_model
+
+_migrated = set()
+_lock = threading.Lock()
+
+
+def _v1_base(conn):
+    """注單 / 設定 / 審計日誌 + 預設資金"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS bets (
+        id TEXT PRIMARY KEY,
+        created_at TEXT,
+        match_info TEXT,
+        bet_type TEXT,
+        stake REAL,
+        odds REAL,
+        status TEXT,
+        profit REAL,
+        settled_at TEXT,
+        notes TEXT
+    )""")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS config (
+        key TEXT PRIMARY KEY,
+        value REAL
+    )""")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS audit_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts TEXT,
+        action TEXT,
+        target_id TEXT,
+        payload TEXT
+    )""")
+    conn.execute("INSERT OR IGNORE INTO config (key, value) VALUES ('bankroll', 10000.0)")
+    conn.execute("INSERT OR IGNORE INTO config (key, value) VALUES ('initial', 10000.0)")
+
+
+def _v2_paging_indexes(conn):
+    """keyset 分頁：(created_at, id) 給 Mission Log，(status, created_at, id) 給待定清單，(settled_at, id) 給已結算清單"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bets_created_id ON bets(created_at, id);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bets_status_created ON bets(status, created_at, id);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bets_settled ON bets(settled_at, id);")
+
+
+def _v3_equity_ledger(conn):
+    """權益帳本：每筆結算一列，保存累積權益 / 峰值 / 最大回撤；新建時由 bets 全量重建"""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='equity_ledger'").fetchone()
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS equity_ledger (
+        bet_id TEXT PRIMARY KEY,
+        settled_at TEXT,
+        profit REAL,
+        equity REAL,
+        peak REAL,
+        max_dd REAL,
+        n_settled INTEGER,
+        n_wins INTEGER
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ledger_order ON equity_ledger(settled_at, bet_id);")
+    if not exists:
+        db.rebuild_equity_ledger(conn, rollup=False)      # pnl_rollup 在 v9 才建立
+
+
+def _v4_fingerprint(conn):
+    """bets.fingerprint + 待定注單的唯一部分索引 (取代逐筆 SELECT 查重)"""
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(bets)")}
+    if "fingerprint" not in cols:
+        conn.execute("ALTER TABLE bets ADD COLUMN fingerprint TEXT")
+        conn.create_function("bet_fp", 4, db.bet_fingerprint, deterministic=True)
+        conn.execute("UPDATE bets SET fingerprint = bet_fp(match_info, bet_type, stake, odds)")
+        # 舊資料若已有重複的待定注單，只保留最早一筆參與唯一性檢查
+        conn.execute("""
+            UPDATE bets SET fingerprint = NULL
+            WHERE status='待定' AND rowid NOT IN (
+                SELECT MIN(rowid) FROM bets WHERE status='待定' GROUP BY fingerprint
+            )""")
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_bets_pending_fp
+        ON bets(fingerprint) WHERE status='待定'
+    """)
+
+
+def _v5_structured_columns(conn):
+    """由 match_info / bet_type 拆出的結構化欄位 + 索引；舊資料一次性回填"""
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(bets)")}
+    missing = [(name, typ) for name, typ in db.STRUCTURED_COLUMNS if name not in cols]
+    for name, typ in missing:
+        conn.execute(f"ALTER TABLE bets ADD COLUMN {name} {typ}")
+    if missing:
+        conn.create_function("p_match", 2, lambda s, i: parse_match_info(s)[i], deterministic=True)
+        conn.create_function("p_bet", 2, lambda s, i: parse_bet_type(s)[i], deterministic=True)
+        conn.execute("""
+            UPDATE bets SET
+                league = p_match(match_info, 0), home = p_match(match_info, 1), away = p_match(match_info, 2),
+                market = p_bet(bet_type, 0), side = p_bet(bet_type, 1), line = p_bet(bet_type, 2)
+        """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bets_league ON bets(league, settled_at);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bets_market ON bets(market, line);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bets_home ON bets(home);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bets_away ON bets(away);")
+
+
+def _v6_audit_checkpoints(conn):
+    """稽核檢查點 (seq 之前含的資金 / 帳本快照) 與封存區段紀錄"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS audit_checkpoint (
+        seq INTEGER PRIMARY KEY,
+        ts TEXT,
+        bankroll REAL,
+        initial REAL,
+        equity REAL,
+        peak REAL,
+        max_dd REAL,
+        n_settled INTEGER,
+        n_wins INTEGER
+    )""")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS audit_archive (
+        first_seq INTEGER,
+        last_seq INTEGER PRIMARY KEY,
+        path TEXT,
+        n_rows INTEGER,
+        sha256 TEXT,
+        archived_at TEXT
+    )""")
+
+
+def _v7_drop_redundant_indexes(conn):
+    """
+    idx_bets_created / idx_bets_status 是 idx_bets_created_id / idx_bets_status_created 的前綴，
+    查詢都能改走複合索引；拿掉可減少每次寫入的索引維護。
+    """
+    conn.execute("DROP INDEX IF EXISTS idx_bets_created;")
+    conn.execute("DROP INDEX IF EXISTS idx_bets_status;")
+
+
+def _v8_fulltext(conn):
+    """
+    bets_fts：match_info / bet_type / notes 的 FTS5 全文索引 (external content，不重複存內容)。
+    trigram 分詞讓中文隊名 / 聯賽名可做子字串比對；由觸發器與 bets 同步 (結算只改 status/profit 不會觸發)。
+    SQLite 沒有 FTS5 或 trigram (< 3.34) 時略過，搜尋退回 LIKE。
+    以 bets 的隱含 rowid 對應，VACUUM 可能重編 rowid → 一律透過 db.vacuum() (會一併重建索引)。
+    """
+    try:
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS bets_fts USING fts5(
+                match_info, bet_type, notes,
+                content='bets', content_rowid='rowid', tokenize='trigram'
+            )""")
+    except sqlite3.OperationalError:
+        return
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS bets_fts_ai AFTER INSERT ON bets BEGIN
+            INSERT INTO bets_fts (rowid, match_info, bet_type, notes)
+            VALUES (new.rowid, new.match_info, new.bet_type, new.notes);
+        END""")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS bets_fts_ad AFTER DELETE ON bets BEGIN
+            INSERT INTO bets_fts (bets_fts, rowid, match_info, bet_type, notes)
+            VALUES ('delete', old.rowid, old.match_info, old.bet_type, old.notes);
+        END""")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS bets_fts_au AFTER UPDATE OF match_info, bet_type, notes ON bets BEGIN
+            INSERT INTO bets_fts (bets_fts, rowid, match_info, bet_type, notes)
+            VALUES ('delete', old.rowid, old.match_info, old.bet_type, old.notes);
+            INSERT INTO bets_fts (rowid, match_info, bet_type, notes)
+            VALUES (new.rowid, new.match_info, new.bet_type, new.notes);
+        END""")
+    # 相關度：賽事 > 玩法 > 筆記 (持久設定，ORDER BY rank 直接套用)
+    conn.execute("INSERT INTO bets_fts (bets_fts, rank) VALUES ('rank', 'bm25(5.0, 2.0, 1.0)')")
+    conn.execute("INSERT INTO bets_fts (bets_fts) VALUES ('rebuild')")
+
+
+def _v9_pnl_rollup(conn):
+    """日 / 週 / 月損益彙總 (台北時間)，由帳本維護時同步更新；新建時由帳本全量產生"""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='pnl_rollup'").fetchone()
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS pnl_rollup (
+        grain TEXT,
+        bucket TEXT,
+        n INTEGER,
+        n_wins INTEGER,
+        profit REAL,
+        turnover REAL,
+        eq_close REAL,
+        eq_min REAL,
+        eq_max REAL,
+        PRIMARY KEY (grain, bucket)
+    ) WITHOUT ROWID""")
+    if not exists:
+        db._rollup_from(conn, "")
+
+
+def _v10_model_columns(conn):
+    """模型輸入 (EV / Sharpe / P) 與收盤賠率的型別化欄位；舊資料由 notes 一次性回填"""
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(bets)")}
+    missing = [(name, typ) for name, typ in db.MODEL_COLUMNS if name not in cols]
+    for name, typ in missing:
+        conn.execute(f"ALTER TABLE bets ADD COLUMN {name} {typ}")
+    if any(name == "model_p" for name, _ in missing):
+        conn.create_function("p_model", 2, lambda s, i: parse_model(s)[i], deterministic=True)
+        conn.execute("""
+            UPDATE bets SET model_ev = p_model(notes, 0), model_sharpe = p_model(notes, 1), model_p = p_model(notes, 2)
+            WHERE notes LIKE '%P:%' OR notes LIKE '%EV:%'
+        """)
+
+
+# (版本, 說明, 步驟)；只能在尾端新增，已發佈的步驟不可修改或重排
+MIGRATIONS = (
+    (1, "base tables", _v1_base),
+    (2, "paging indexes", _v2_paging_indexes),
+    (3, "equity ledger", _v3_equity_ledger),
+    (4, "pending fingerprint", _v4_fingerprint),
+    (5, "structured columns", _v5_structured_columns),
+    (6, "audit checkpoints", _v6_audit_checkpoints),
+    (7, "drop redundant indexes", _v7_drop_redundant_indexes),
+    (8, "full-text search", _v8_fulltext),
+    (9, "pnl rollups", _v9_pnl_rollup),
+    (10, "model columns", _v10_model_columns),
+)
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def user_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _has_data(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='bets'").fetchone() is not None
+
+
+def _backup(conn, path, version):
+    """升級前以 backup API 做一份完整快照 (線上、一致，不需停寫)"""
+    if path == ":memory:" or path.startswith("file:"):
+        return None
+    target = f"{path}.v{version}.bak"
+    dst = sqlite3.connect(target)
+    try:
+        conn.backup(dst)
+    finally:
+        dst.close()
+    return target
+
+
+def forget(path=None):
+    """DB 檔被換掉 (還原快照) 後，下次 migrate 需要重新檢查版本"""
+    _migrated.discard(db.get_pool(path).path)
+
+
+def migrate(path=None, backup=True):
+    """把 DB 升到 SCHEMA_VERSION；回傳 (舊版本, 新版本)。同一行程內同一路徑只檢查一次。"""
+    pool = db.get_pool(path)
+    if pool.path in _migrated:
+        return SCHEMA_VERSION, SCHEMA_VERSION
+    with _lock:
+        if pool.path in _migrated:
+            return SCHEMA_VERSION, SCHEMA_VERSION
+        with pool.read() as conn:
+            before = user_version(conn)
+            if before < SCHEMA_VERSION and backup and _has_data(conn) and os.path.exists(pool.path):
+                _backup(conn, pool.path, before)
+        if before < SCHEMA_VERSION:
+            with pool.write() as conn:
+                before = user_version(conn)      # 其他行程可能剛升級完
+                for version, _, step in MIGRATIONS:
+                    if version <= before:
+                        continue
+                    step(conn)
+                    conn.execute(f"PRAGMA user_version = {version}")
+                if before < SCHEMA_VERSION:
+                    db.log_audit(conn, "SCHEMA_MIGRATE", "SYSTEM", {"from": before, "to": SCHEMA_VERSION})
+        elif before > SCHEMA_VERSION:
+            raise RuntimeError(f"資料庫版本 {before} 比程式支援的 {SCHEMA_VERSION} 新，請更新程式")
+        _migrated.add(pool.path)
+        return before, max(before, SCHEMA_VERSION)
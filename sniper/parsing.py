@@ -0,0 +1,108 @@
+"""
+🔎 注單字串解析
+把 UI 產生的 match_info / bet_type 字串拆成結構化欄位：
+- "[英超] 曼城 vs 兵工廠"     -> league='英超', home='曼城', away='兵工廠'
+- "獨贏 [主勝]"               -> market='獨贏', side='home', line=None
+- "讓分 [主隊 讓 (-) 0/0.5]"  -> market='讓分', side='home', line=-0.25
+- "大小 [大 (Over) 2.5]"      -> market='大小', side='over', line=2.5
+讓分 line 以「下注方」角度記錄：讓球為負、受讓為正；0/0.5 這類分盤記為平均值 (0.25)。
+戰術筆記 notes 內的 "P:52.6%" 為下單時反推的隱含勝率 (parse_prob)；
+"EV:5.0% | Sharpe:0.0 | P:55.3%" 整組模型輸入由 parse_model 取出 (舊資料回填 bets.model_* 用)。
+"""
+import re
+
+MARKET_TYPES = ['獨贏', '讓分', '大小']
+
+_MATCH_RE = re.compile(r'^\[(?P<league>[^\]]+)\]\s*(?P<home>.+?)\s+vs\s+(?P<away>.+?)\s*$')
+_BET_RE = re.compile(r'^(?P<market>\S+)\s*\[(?P<body>.*)\]\s*$')
+_1X2_SIDES = {'主勝': 'home', '和局': 'draw', '客勝': 'away'}
+_AH_SIDES = {'主隊': 'home', '客隊': 'away'}
+_OU_SIDES = {'大': 'over', '小': 'under'}
+_PROB_RE = re.compile(r'\bP:\s*(?P<p>[0-9]+(?:\.[0-9]+)?)\s*%')
+_EV_RE = re.compile(r'\bEV:\s*(?P<ev>[-+]?[0-9]+(?:\.[0-9]+)?)\s*%')
+_SHARPE_RE = re.compile(r'\bSharpe:\s*(?P<sharpe>[-+]?[0-9]+(?:\.[0-9]+)?)')
+
+
+def parse_league(match_info):
+    """'[英超] 曼城 vs 兵工廠' -> '英超'"""
+    if isinstance(match_info, str) and match_info.startswith('[') and ']' in match_info:
+        return match_info[1:match_info.index(']')]
+    return None
+
+
+def parse_market(bet_type):
+    """'讓分 [主隊 讓 (-) 0.5]' -> '讓分'"""
+    if isinstance(bet_type, str):
+        head = bet_type.split(' ', 1)[0]
+        if head in MARKET_TYPES:
+            return head
+    return None
+
+
+def parse_line(text):
+    """'0/0.5' -> 0.25；'2.5' -> 2.5；無法解析回傳 None"""
+    try:
+        parts = [float(p) for p in str(text).split('/')]
+    except ValueError:
+        return None
+    return sum(parts) / len(parts)
+
+
+def parse_prob(notes):
+    """'EV:5.0% | Sharpe:0.0 | P:55.3%' -> 0.553；沒有 P: 或超出 0~100% 回傳 None"""
+    if not isinstance(notes, str):
+        return None
+    m = _PROB_RE.search(notes)
+    if not m:
+        return None
+    p = float(m.group('p')) / 100
+    return p if 0 <= p <= 1 else None
+
+
+def parse_match_info(match_info):
+    """回傳 (league, home, away)；格式不符時對應欄位為 None"""
+    if not isinstance(match_info, str):
+        return None, None, None
+    m = _MATCH_RE.match(match_info)
+    if not m:
+        return parse_league(match_info), None, None
+    return m.group('league'), m.group('home'), m.group('away')
+
+
+def parse_bet_type(bet_type):
+    """回傳 (market, side, line)；格式不符時對應欄位為 None"""
+    if not isinstance(bet_type, str):
+        return None, None, None
+    m = _BET_RE.match(bet_type)
+    market = parse_market(bet_type)
+    if not m or market is None:
+        return market, None, None
+    tokens = m.group('body').split()
+    if market == '獨贏':
+        return market, _1X2_SIDES.get(m.group('body').strip()), None
+    if market == '讓分' and len(tokens) >= 3:
+        # [主隊 讓 (-) 0.5] / [客隊 受讓 (+) 0/0.5]
+        line = parse_line(tokens[-1])
+        if line and tokens[1] == '讓':
+            line = -line
+        return market, _AH_SIDES.get(tokens[0]), line
+    if market == '大小' and len(tokens) >= 2:
+        # [大 (Over) 2.5]
+        return market, _OU_SIDES.get(tokens[0]), parse_line(tokens[-1])
+    return market, None, None
+
+
+def parse_model(notes):
+    """'EV:5.0% | Sharpe:0.0 | P:55.3%' -> (0.05, 0.0, 0.553)；缺少的欄位為 None"""
+    if not isinstance(notes, str):
+        return None, None, None
+    ev = _EV_RE.search(notes)
+    sharpe = _SHARPE_RE.search(notes)
+    return (float(ev.group('ev')) / 100 if ev else None,
+            float(sharpe.group('sharpe')) if sharpe else None,
+            parse_prob(notes))
+
+
+def parse_bet(match_info, bet_type):
+    """一次取得全部結構化欄位 (league, home, away, market, side, line)"""
+    return parse_match_info(match_info) + parse_bet_type(bet_type)
@@ -0,0 +1,358 @@
+"""
+📥 批次結算引擎
+讀取 CSV / NDJSON 的 (id, result)，以向量化損益計算，分段交易批次寫入：
+- 每段一個 BEGIN IMMEDIATE 交易：executemany 更新注單、寫審計、更新帳本
+- 資金池只更新一次 (該段損益總和)
+- 逐列回報拒絕原因 (未知 ID、已結算、結果代碼錯誤、檔案內重複)
+
+🏁 比分自動結算 (settle_scores)：讀取終場比分 (CSV / JSON / NDJSON：match 或 home / away、
+date、home_score、away_score，可選 league)，以注單的結構化欄位 (home / away / market / side / line)
+對上比賽日期前 MATCH_WINDOW_DAYS 天內下單的待定注單，向量化判定結果 (含四分之一盤的贏半 / 輸半)
+後在單一交易內全部結算。比賽日之後下的注 (下一次交手) 不動；同一筆注單落在檔內多場比賽的區間時
+列為 AMBIGUOUS_MATCH 不結算。
+"""
+import datetime
+import io
+import json
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from sniper import db
+from sniper.betting import RESULT_CODES, calculate_pnl_vec, grade_results_vec
+from sniper.parsing import parse_match_info
+
+CHUNK_SIZE = 5000
+SQL_VAR_LIMIT = 900   # 單一 IN (...) 查詢的參數上限
+
+REJECT_UNKNOWN_ID = "UNKNOWN_ID"
+REJECT_ALREADY_SETTLED = "ALREADY_SETTLED"
+REJECT_INVALID_RESULT = "INVALID_RESULT"
+REJECT_DUPLICATE_ROW = "DUPLICATE_ROW"
+REJECT_MISSING_ID = "MISSING_ID"
+REJECT_MISSING_MATCH = "MISSING_MATCH"
+REJECT_INVALID_SCORE = "INVALID_SCORE"
+REJECT_NO_PENDING = "NO_PENDING_BETS"
+REJECT_UNGRADABLE = "UNGRADABLE"
+REJECT_INVALID_DATE = "INVALID_DATE"
+REJECT_OUTSIDE_WINDOW = "OUTSIDE_WINDOW"
+REJECT_AMBIGUOUS = "AMBIGUOUS_MATCH"
+
+MATCH_WINDOW_DAYS = 7      # 比賽日 (含) 往前幾天內下的注單才算這場
+
+
+def _detect_format(name):
+    name = (name or "").lower()
+    if name.endswith((".ndjson", ".jsonl", ".json")):
+        return "ndjson"
+    return "csv"
+
+
+def _clean(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    return str(value).strip()
+
+
+def iter_settlement_rows(source, fmt=None, chunk_size=CHUNK_SIZE):
+    """
+    逐段讀取結算檔，產生只含 id / result 兩欄的 DataFrame。
+    source 可為路徑、bytes 或 file-like (例如 st.file_uploader 的回傳值)。
+    """
+    fmt = fmt or _detect_format(getattr(source, "name", source if isinstance(source, str) else ""))
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    if fmt == "ndjson":
+        reader = pd.read_json(source, lines=True, chunksize=chunk_size, dtype={"id": str, "result": str})
+    else:
+        reader = pd.read_csv(source, chunksize=chunk_size, dtype=str, skipinitialspace=True)
+    offset = 0
+    for chunk in reader:
+        chunk.columns = [str(c).strip().lower() for c in chunk.columns]
+        if "id" not in chunk.columns or "result" not in chunk.columns:
+            raise ValueError("結算檔需要 id 與 result 欄位")
+        out = pd.DataFrame({
+            "row": np.arange(offset, offset + len(chunk)) + 1,
+            "id": [_clean(v) for v in chunk["id"].tolist()],
+            "result": [_clean(v) for v in chunk["result"].tolist()],
+        }, dtype=object)
+        offset += len(chunk)
+        yield out
+
+
+def _fetch_bets(conn, ids):
+    """以 IN (...) 分批查出 stake / odds / status"""
+    found = []
+    for i in range(0, len(ids), SQL_VAR_LIMIT):
+        part = ids[i:i + SQL_VAR_LIMIT]
+        marks = ",".join("?" * len(part))
+        found.extend(conn.execute(
+            f"SELECT id, stake, odds, status FROM bets WHERE id IN ({marks})", part
+        ).fetchall())
+    return found
+
+
+def _settle_chunk(conn, chunk, seen, batch_id):
+    """在同一個寫入交易內處理一段；回傳 (settled_df, rejects_df)"""
+    ids = chunk["id"].tolist()
+    results = chunk["result"].tolist()
+    reason = [None] * len(ids)
+    for i, (bid, res) in enumerate(zip(ids, results)):
+        if not bid:
+            reason[i] = REJECT_MISSING_ID
+        elif res not in RESULT_CODES:
+            reason[i] = REJECT_INVALID_RESULT
+        elif bid in seen:
+            reason[i] = REJECT_DUPLICATE_ROW
+        if bid:
+            seen.add(bid)
+
+    todo = [i for i, r in enumerate(reason) if r is None]
+    bets = {row[0]: row[1:] for row in _fetch_bets(conn, [ids[i] for i in todo])}
+    for i in todo:
+        bet = bets.get(ids[i])
+        if bet is None:
+            reason[i] = REJECT_UNKNOWN_ID
+        elif bet[2] != "待定":
+            reason[i] = REJECT_ALREADY_SETTLED
+
+    reason = np.array(reason, dtype=object)
+    ok_mask = np.equal(reason, None)
+    rejects = chunk[~ok_mask].assign(reason=reason[~ok_mask])
+    ok = chunk[ok_mask]
+    if ok.empty:
+        return ok.assign(profit=[]), rejects
+
+    ids = ok["id"].tolist()
+    stake = np.array([bets[b][0] for b in ids], dtype=float)
+    odds = np.array([bets[b][1] for b in ids], dtype=float)
+    result = ok["result"].to_numpy(dtype=object)
+    profit = calculate_pnl_vec(stake, odds, result)
+    _apply(conn, ids, result.tolist(), profit.tolist(), batch_id)
+    return ok.assign(profit=profit), rejects
+
+
+def _apply(conn, ids, results, profits, batch_id):
+    """寫入一批待定注單的結算：注單、逐筆審計、資金 (一次加總)、權益帳本"""
+    now_iso = datetime.datetime.now(db.TZ_TAIPEI).isoformat()
+    conn.executemany(
+        "UPDATE bets SET status=?, profit=?, settled_at=? WHERE id=? AND status='待定'",
+        zip(results, profits, [now_iso] * len(ids), ids),
+    )
+    conn.executemany(
+        "INSERT INTO audit_log (ts, action, target_id, payload) VALUES (?, ?, ?, ?)",
+        ((now_iso, "SETTLE_BET", bid,
+          json.dumps({"status": r, "profit": p, "old_profit": 0.0, "batch": batch_id}, ensure_ascii=False))
+         for bid, r, p in zip(ids, results, profits)),
+    )
+    conn.execute("UPDATE config SET value = value + ? WHERE key='bankroll'", (float(np.sum(profits)),))
+    db.ledger_append(conn, [(bid, now_iso, p) for bid, p in zip(ids, profits)])
+
+
+def settle_batch(source, fmt=None, chunk_size=CHUNK_SIZE):
+    """
+    執行批次結算。每段獨立 commit：某段失敗不影響已完成的段落。
+    回傳 {'batch_id', 'settled', 'profit', 'rejects': DataFrame[row, id, result, reason]}
+    """
+    batch_id = str(uuid.uuid4())
+    seen = set()
+    settled, total_profit, rejects = 0, 0.0, []
+    for chunk in iter_settlement_rows(source, fmt=fmt, chunk_size=chunk_size):
+        with db.write_txn() as conn:
+            done, rej = _settle_chunk(conn, chunk, seen, batch_id)
+            if len(done):
+                db.log_audit(conn, "BATCH_SETTLE", batch_id,
+                             {"rows": int(len(done)), "profit": float(done["profit"].sum())})
+        settled += len(done)
+        total_profit += float(done["profit"].sum()) if len(done) else 0.0
+        if len(rej):
+            rejects.append(rej)
+    rejects = pd.concat(rejects, ignore_index=True) if rejects else \
+        pd.DataFrame(columns=["row", "id", "result", "reason"])
+    return {"batch_id": batch_id, "settled": settled, "profit": round(total_profit, 2), "rejects": rejects}
+
+
+# ==========================================
+# 🏁 比分自動結算
+# ==========================================
+SCORE_COLUMNS = ["row", "league", "home", "away", "date", "home_score", "away_score"]
+
+
+def _read_feed(source, fmt=None):
+    """比分檔 → DataFrame (欄名小寫)；JSON 陣列與 NDJSON 皆可"""
+    if isinstance(source, pd.DataFrame):
+        return source.copy()
+    if isinstance(source, list):
+        return pd.DataFrame(source)
+    fmt = fmt or _detect_format(getattr(source, "name", source if isinstance(source, str) else ""))
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            data = f.read()
+    elif isinstance(source, (bytes, bytearray)):
+        data = bytes(source)
+    else:
+        data = source.getvalue() if hasattr(source, "getvalue") else source.read()   # 上傳檔 rerun 時可重複讀取
+        data = data.encode("utf-8") if isinstance(data, str) else data
+    if fmt == "ndjson":
+        lines = not data.lstrip().startswith(b"[")
+        return pd.read_json(io.BytesIO(data), lines=lines, dtype=False)
+    return pd.read_csv(io.BytesIO(data), dtype=str, skipinitialspace=True)
+
+
+def _match_date(value):
+    """比賽日期 (台北) YYYY-MM-DD；可給日期或含時區的開賽時間，無法解析回傳 None"""
+    text = _clean(value)
+    if not text:
+        return None
+    try:
+        day = db.local_day(text) if len(text) > 10 else text
+        return datetime.date.fromisoformat(day).isoformat()
+    except ValueError:
+        return None
+
+
+def _score(value):
+    """非負整數比分；其他回傳 None"""
+    text = _clean(value)
+    try:
+        n = float(text)
+    except ValueError:
+        return None
+    return int(n) if n >= 0 and n == int(n) else None
+
+
+def read_scores(source, fmt=None):
+    """
+    讀取終場比分，回傳 (scores, rejects)：
+    scores 為 DataFrame[row, league, home, away, date, home_score, away_score] (同一天同一組主客隊只取第一列)；
+    rejects 為 DataFrame[row, id, match, reason]。
+    """
+    df = _read_feed(source, fmt)
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    if "home_score" not in df.columns or "away_score" not in df.columns:
+        raise ValueError("比分檔需要 home_score 與 away_score 欄位")
+    if "match" not in df.columns and not {"home", "away"} <= set(df.columns):
+        raise ValueError("比分檔需要 match 欄位，或 home 與 away 欄位")
+    date_col = next((c for c in ("date", "kickoff") if c in df.columns), None)
+    if date_col is None:
+        raise ValueError("比分檔需要比賽日期 date (或開賽時間 kickoff) 欄位")
+
+    rows, rejects, seen = [], [], set()
+    for i, rec in enumerate(df.to_dict("records"), start=1):
+        league, home, away = (_clean(rec.get(k)) or None for k in ("league", "home", "away"))
+        match = _clean(rec.get("match"))
+        if match and not (home and away):
+            lg, home, away = parse_match_info(match)
+            if home is None and " vs " in match:         # 沒有 [聯賽] 前綴的 "主 vs 客"
+                home, away = (t.strip() for t in match.split(" vs ", 1))
+            league = league or lg
+        label = match or f"{home} vs {away}"
+        hs, as_ = _score(rec.get("home_score")), _score(rec.get("away_score"))
+        day = _match_date(rec.get(date_col))
+        if not home or not away:
+            rejects.append((i, "", label, REJECT_MISSING_MATCH))
+        elif day is None:
+            rejects.append((i, "", label, REJECT_INVALID_DATE))
+        elif hs is None or as_ is None:
+            rejects.append((i, "", label, REJECT_INVALID_SCORE))
+        elif (home, away, day) in seen:
+            rejects.append((i, "", label, REJECT_DUPLICATE_ROW))
+        else:
+            seen.add((home, away, day))
+            rows.append((i, league, home, away, day, hs, as_))
+    return (pd.DataFrame(rows, columns=SCORE_COLUMNS),
+            pd.DataFrame(rejects, columns=["row", "id", "match", "reason"]))
+
+
+def _fetch_pending(conn, homes):
+    """以 home IN (...) 分批查出待定注單 (走 idx_bets_home)"""
+    cols = ["id", "created_at", "match_info", "bet_type", "stake", "odds", "league", "home", "away",
+            "market", "side", "line"]
+    found = []
+    for i in range(0, len(homes), SQL_VAR_LIMIT):
+        part = homes[i:i + SQL_VAR_LIMIT]
+        marks = ",".join("?" * len(part))
+        found.extend(conn.execute(
+            f"SELECT {', '.join(cols)} FROM bets WHERE home IN ({marks}) AND status='待定'", part
+        ).fetchall())
+    return pd.DataFrame(found, columns=cols)
+
+
+def grade_pending(conn, scores):
+    """
+    以比分對上待定注單並判定結果，回傳 (graded, rejects)：
+    graded 為 DataFrame[row, id, match_info, bet_type, score, result, stake, odds]；
+    rejects 列出沒有待定注單的場次、區間外 / 對到多場 / 無法判定的注單。
+    """
+    bets = _fetch_pending(conn, scores["home"].drop_duplicates().tolist())
+    # 比分檔有填聯賽時必須相符，沒填則只比對主客隊
+    merged = bets.merge(scores, on=["home", "away"], suffixes=("", "_feed"))
+    merged = merged[merged["league_feed"].isna() | (merged["league_feed"] == merged["league"])]
+
+    # 只認比賽日 (含) 往前 MATCH_WINDOW_DAYS 天內下的注；比賽日之後下的注屬於之後的交手，不回報
+    bet_day = merged["created_at"].map(db.local_day)
+    window_start = (pd.to_datetime(merged["date"]) - pd.Timedelta(days=MATCH_WINDOW_DAYS)).dt.strftime("%Y-%m-%d")
+    stale = bet_day < window_start
+    stale_rows, merged = merged[stale], merged[~stale & (bet_day <= merged["date"])]
+    stale_rows = stale_rows[~stale_rows["id"].isin(merged["id"])].drop_duplicates("id")
+    rejects = [(r.row, r.id, r.match_info, REJECT_OUTSIDE_WINDOW) for r in stale_rows.itertuples(index=False)]
+    # 同一筆注單落在檔內多場 (同主客隊、不同日期) 的區間 → 無法確定是哪一場
+    multi = merged["id"].duplicated(keep=False)
+    rejects.extend((r.row, r.id, r.match_info, REJECT_AMBIGUOUS)
+                   for r in merged[multi].drop_duplicates("id").itertuples(index=False))
+    hit = set(merged["row"].tolist()) | set(stale_rows["row"].tolist())
+    merged = merged[~multi]
+
+    for r in scores.itertuples(index=False):
+        if r.row not in hit:
+            rejects.append((r.row, "", f"{r.home} vs {r.away}", REJECT_NO_PENDING))
+
+    result = grade_results_vec(merged["market"].to_numpy(dtype=object), merged["side"].to_numpy(dtype=object),
+                               merged["line"].astype(object).where(merged["line"].notna(), None).tolist(),
+                               merged["home_score"].to_numpy(), merged["away_score"].to_numpy())
+    graded = merged.assign(
+        result=result,
+        score=merged["home_score"].astype(str) + "-" + merged["away_score"].astype(str),
+    )
+    bad = graded["result"].isna()
+    rejects.extend((r.row, r.id, r.match_info, REJECT_UNGRADABLE) for r in graded[bad].itertuples(index=False))
+    graded = graded[~bad][["row", "id", "match_info", "bet_type", "score", "result", "stake", "odds"]]
+    rejects = pd.DataFrame(rejects, columns=["row", "id", "match", "reason"])
+    return graded.sort_values(["row", "id"], kind="stable").reset_index(drop=True), rejects
+
+
+def settle_scores(source, fmt=None, dry_run=False):
+    """
+    依終場比分結算所有相符的待定注單：查詢、判定與寫入都在同一個寫入交易內 (一次 commit)。
+    dry_run=True 時只判定不寫入 (預覽用)。
+    回傳 {'batch_id', 'fixtures', 'settled', 'profit', 'details': DataFrame, 'rejects': DataFrame[row, id, match, reason]}
+    """
+    scores, feed_rejects = read_scores(source, fmt)
+    batch_id = str(uuid.uuid4())
+
+    def _run(conn):
+        graded, rejects = grade_pending(conn, scores)
+        graded["profit"] = calculate_pnl_vec(graded["stake"].to_numpy(dtype=float),
+                                             graded["odds"].to_numpy(dtype=float),
+                                             graded["result"].to_numpy(dtype=object))
+        if len(graded) and not dry_run:
+            _apply(conn, graded["id"].tolist(), graded["result"].tolist(), graded["profit"].tolist(), batch_id)
+            db.log_audit(conn, "BATCH_SETTLE", batch_id,
+                         {"rows": int(len(graded)), "profit": float(graded["profit"].sum()),
+                          "source": "scores", "fixtures": int(len(scores))})
+        return graded, rejects
+
+    if scores.empty:
+        graded, rejects = pd.DataFrame(columns=["row", "id", "match_info", "bet_type", "score", "result",
+                                                "stake", "odds", "profit"]), feed_rejects.iloc[:0]
+    elif dry_run:
+        with db.read_conn() as conn:
+            graded, rejects = _run(conn)
+    else:
+        with db.write_txn() as conn:
+            graded, rejects = _run(conn)
+    rejects = pd.concat([feed_rejects, rejects], ignore_index=True).sort_values("row", kind="stable")
+    return {"batch_id": batch_id, "fixtures": int(len(scores)), "settled": int(len(graded)),
+            "profit": round(float(graded["profit"].sum()), 2) if len(graded) else 0.0,
+            "details": graded.drop(columns=["stake", "odds"]), "rejects": rejects.reset_index(drop=True)}
@@ -0,0 +1,157 @@
+"""
+🎲 蒙地卡羅資金模擬
+以每筆注單的模型勝率 (bets.model_p；舊資料退回 notes 內的 P:) 模擬大量資金路徑，估計：
+- 破產機率 (risk of ruin)：路徑中任一時點權益 ≤ 起始本金 × ruin_level
+- 最大回撤分位數：定義與 calculate_max_drawdown / analytics.max_drawdown 相同
+- 期末資金分布
+每段 (chunk) 路徑以 NumPy 一次計算，多段分給 ProcessPoolExecutor 並行。
+亂數以 SeedSequence(seed).spawn() 依段切分，段大小只由注單數決定，
+因此同一 seed 的結果與 worker 數量無關，可重現也可拿來做效能基準。
+模型只區分全贏 / 全輸 (P 沒有提供贏半 / 輸半的機率)。
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from sniper.parsing import parse_prob
+
+DEFAULT_PATHS = 100_000
+DEFAULT_SEED = 20240101
+CHUNK_CELLS = 4_000_000          # 每段約 paths × bets 個 float64 (~32 MB)
+MIN_CHUNK_PATHS = 1_000
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+STAKE_MODES = ("fixed", "kelly")
+
+
+def plan_from_pending(df):
+    """
+    待定注單 → 模擬計畫 (stake, odds, p)，依下單時間排序。
+    勝率取結構化欄位 model_p；只有 model_p 為空的舊資料才解析 notes 內的 P:。
+    兩者都沒有的注單無法模擬，回傳 (plan, 略過筆數)。
+    """
+    if df.empty:
+        return pd.DataFrame({'stake': [], 'odds': [], 'p': []}), 0
+    df = df.sort_values('created_at', kind='stable')
+    if 'model_p' in df:
+        p = pd.to_numeric(df['model_p'], errors='coerce').astype(float)
+    else:
+        p = pd.Series(np.nan, index=df.index)
+    legacy = p.isna()
+    if legacy.any():
+        p[legacy] = df.loc[legacy, 'notes'].map(parse_prob).astype(float)
+    ok = p.notna()
+    plan = pd.DataFrame({
+        'stake': df.loc[ok, 'stake'].astype(float).to_numpy(),
+        'odds': df.loc[ok, 'odds'].astype(float).to_numpy(),
+        'p': p[ok].astype(float).to_numpy(),
+    })
+    return plan, int((~ok).sum())
+
+
+def plan_from_slate(df):
+    """screen_slate() 的結果 → 以 kelly_frac 佔當下資金比例下注的計畫"""
+    df = df[df['kelly_frac'] > 0]
+    return pd.DataFrame({
+        'stake': df['kelly_frac'].astype(float).to_numpy(),
+        'odds': df['odds'].astype(float).to_numpy(),
+        'p': df['implied_p'].astype(float).to_numpy(),
+    })
+
+
+def _chunk_sizes(n_paths, n_bets):
+    """固定的分段方式 (只依 n_paths / n_bets)，確保不同 worker 數結果一致"""
+    size = max(MIN_CHUNK_PATHS, CHUNK_CELLS // max(n_bets, 1))
+    sizes = [size] * (n_paths // size)
+    if n_paths % size:
+        sizes.append(n_paths % size)
+    return sizes
+
+
+def _simulate_chunk(args):
+    """
+    模擬一段路徑，回傳 (期末資金, 最大回撤 %, 是否破產)。
+    fixed：stake 為金額；kelly：stake 為下注當下資金的比例 (複利)。
+    """
+    seed, n, stake, odds, p, bankroll, mode, ruin_at = args
+    rng = np.random.default_rng(seed)
+    wins = rng.random((n, len(p))) < p
+    if mode == "kelly":
+        # 每筆報酬率 1 + f·(o-1) 或 1 - f，以累乘得到權益曲線
+        growth = np.where(wins, 1 + stake * (odds - 1), 1 - stake)
+        equity = bankroll * np.cumprod(growth, axis=1)
+    else:
+        pnl = np.where(wins, stake * (odds - 1), -stake)
+        equity = bankroll + np.cumsum(pnl, axis=1)
+    equity = np.concatenate([np.full((n, 1), float(bankroll)), equity], axis=1)
+
+    peak = np.maximum.accumulate(equity, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dd = np.where(peak > 0, (peak - equity) / peak, 0.0)
+    max_dd = dd.max(axis=1) * 100
+    ruined = equity.min(axis=1) <= ruin_at
+    return equity[:, -1], max_dd, ruined
+
+
+def simulate(plan, bankroll, n_paths=DEFAULT_PATHS, seed=DEFAULT_SEED, mode="fixed",
+             ruin_level=0.0, workers=None):
+    """
+    依 plan (stake / odds / p 欄位，依下注順序) 模擬 n_paths 條資金路徑。
+    ruin_level 為起始本金的比例 (0 = 輸光)；workers=1 時不開行程池。
+    回傳 {'terminal', 'max_dd', 'risk_of_ruin', 'dd_quantiles', 'terminal_quantiles', ...}
+    """
+    if mode not in STAKE_MODES:
+        raise ValueError(f"mode 必須是 {STAKE_MODES}")
+    stake = np.asarray(plan['stake'], dtype=float)
+    odds = np.asarray(plan['odds'], dtype=float)
+    p = np.clip(np.asarray(plan['p'], dtype=float), 0.0, 1.0)
+    bankroll = float(bankroll)
+    n_paths = int(n_paths)
+
+    sizes = _chunk_sizes(n_paths, len(p))
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    ruin_at = bankroll * ruin_level
+    tasks = [(s, n, stake, odds, p, bankroll, mode, ruin_at) for s, n in zip(seeds, sizes)]
+
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        parts = [_simulate_chunk(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_simulate_chunk, tasks))
+
+    if parts:
+        terminal, max_dd, ruined = (np.concatenate(x) for x in zip(*parts))
+    else:
+        terminal, max_dd, ruined = np.empty(0), np.empty(0), np.empty(0, dtype=bool)
+    return {
+        'n_paths': n_paths,
+        'n_bets': len(p),
+        'seed': seed,
+        'mode': mode,
+        'bankroll': bankroll,
+        'terminal': terminal,
+        'max_dd': max_dd,
+        'risk_of_ruin': float(ruined.mean()) if n_paths else 0.0,
+        'mean_terminal': float(terminal.mean()) if n_paths else bankroll,
+        'prob_loss': float((terminal < bankroll).mean()) if n_paths else 0.0,
+        'dd_quantiles': dict(zip(QUANTILES, np.quantile(max_dd, QUANTILES))) if n_paths else {},
+        'terminal_quantiles': dict(zip(QUANTILES, np.quantile(terminal, QUANTILES))) if n_paths else {},
+    }
+
+
+def dd_percentile(result, max_dd):
+    """實際最大回撤 (calculate_max_drawdown 的值) 落在模擬分布的百分位"""
+    if not len(result['max_dd']):
+        return 0.0
+    return float((result['max_dd'] <= max_dd).mean() * 100)
+
+
+def quantile_table(result):
+    """分位數表 (UI 顯示用)"""
+    return pd.DataFrame({
+        'quantile': [f"P{int(q * 100)}" for q in QUANTILES],
+        'max_dd_pct': [result['dd_quantiles'].get(q, 0.0) for q in QUANTILES],
+        'terminal': [result['terminal_quantiles'].get(q, result['bankroll']) for q in QUANTILES],
+    })
@@ -0,0 +1,35 @@
+"""
+測試共用：每個測試一個全新的暫存 DB (已遷移到最新版本)。
+db 以模組層級的 DB_PATH 選連線池，查詢快取以寫入世代為鍵 → 換檔前後都要清快取。
+"""
+import pytest
+
+from sniper import db, migrations
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """指向暫存檔的 DB_PATH (尚未建立結構)"""
+    path = str(tmp_path / "sniper_test.db")
+    monkeypatch.setattr(db, "DB_PATH", path)
+    db.clear_cache()
+    yield path
+    migrations.forget(path)
+    db._pools.pop(path).close()
+    db.clear_cache()
+
+
+@pytest.fixture
+def bet_db(db_path):
+    db.init_db()
+    return db_path
+
+
+@pytest.fixture
+def add_bet(bet_db):
+    """下一筆注單並回傳 id (重複注單視為測試錯誤)"""
+    def _add(match="[英超] 阿仙奴 vs 車路士", bet_type="讓分 [主隊 讓 0.5]", stake=100.0, odds=1.9, notes=""):
+        ok, bet_id = db.add_bet_db(match, bet_type, stake, odds, notes)
+        assert ok, bet_id
+        return bet_id
+    return _add
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sniper import analytics
+from sniper.betting import calculate_max_drawdown
+
+INITIAL = 10000.0
+LEAGUES = ["英超", "西甲", "德甲", "意甲"]
+MARKETS = ["讓分 [主隊 讓 0.5]", "大小 [大 (Over) 2.5]", "獨贏 [主勝]"]
+
+
+@pytest.fixture(scope="module")
+def frame():
+    """隨機注單 (含待定)；結算時間互不相同且未排序"""
+    rng = np.random.default_rng(7)
+    n = 3000
+    odds = rng.uniform(1.3, 4.0, n).round(2)
+    stake = rng.integers(10, 500, n).astype(float)
+    win = rng.random(n) < 0.48
+    profit = np.where(win, stake * (odds - 1), -stake * rng.choice([1.0, 0.5], n)).round(2)
+    status = np.where(rng.random(n) < 0.1, "待定", np.where(win, "贏", "輸"))
+    ts = pd.Timestamp("2026-01-01 00:00:00") + pd.to_timedelta(rng.permutation(n) * 3677, unit="s")
+    return pd.DataFrame({
+        "match_info": [f"[{LEAGUES[i % 4]}] 主{i} vs 客{i}" for i in rng.integers(0, 400, n)],
+        "bet_type": rng.choice(MARKETS, n),
+        "stake": stake, "odds": odds,
+        "profit": np.where(status == "待定", 0.0, profit),
+        "status": status,
+        "settled_at": np.where(status == "待定", None, ts.strftime("%Y-%m-%dT%H:%M:%S+08:00")),
+    })
+
+
+def _tab3_reference(df_all, initial):
+    """舊版戰情室 (逐筆 iterrows 累加 + calculate_max_drawdown)"""
+    df_settled = df_all[df_all['status'] != '待定'].copy()
+    df_settled['sort_time'] = pd.to_datetime(df_settled['settled_at'])
+    df_settled = df_settled.sort_values('sort_time')
+    equity_curve = [initial]
+    cum_profit = 0
+    for _, r in df_settled.iterrows():
+        cum_profit += r['profit']
+        equity_curve.append(initial + cum_profit)
+    wins = len(df_settled[df_settled['profit'] > 0])
+    total = len(df_settled)
+    return {
+        'equity': equity_curve[-1],
+        'max_dd': calculate_max_drawdown(equity_curve),
+        'n_settled': total,
+        'n_wins': wins,
+        'win_rate': (wins / total * 100) if total > 0 else 0,
+        'roi': ((equity_curve[-1] - initial) / initial * 100),
+    }
+
+
+def test_max_drawdown_matches_loop():
+    rng = np.random.default_rng(3)
+    for _ in range(50):
+        curve = list(np.cumsum(rng.normal(0, 300, 200)) + rng.uniform(-2000, 10000))
+        assert analytics.max_drawdown(curve) == pytest.approx(calculate_max_drawdown(curve), abs=1e-9)
+    assert analytics.max_drawdown([]) == calculate_max_drawdown([]) == 0.0
+
+
+def test_summary_matches_tab3(frame):
+    stats = analytics.summarize(analytics.prepare(frame), INITIAL)
+    ref = _tab3_reference(frame, INITIAL)
+    for key, value in ref.items():
+        assert stats[key] == pytest.approx(value), key
+
+
+def test_league_segments_match_filtered_tab3(frame):
+    """分段表每個聯賽 = 舊版選了該聯賽後的戰情室數字"""
+    seg = analytics.breakdown(analytics.prepare(frame), "league", INITIAL).set_index("league")
+    assert sorted(seg.index) == sorted(LEAGUES)
+    for lg in LEAGUES:
+        ref = _tab3_reference(frame[frame['match_info'].str.contains(lg)], INITIAL)
+        row = seg.loc[lg]
+        for key, value in ref.items():
+            if key != 'equity':
+                assert row[key] == pytest.approx(value), (lg, key)
+        assert INITIAL + row['profit'] == pytest.approx(ref['equity'])
+
+
+def test_cross_segments_match_groupby(frame):
+    prepared = analytics.prepare(frame)
+    seg = analytics.breakdown(prepared, ["market", "month"], INITIAL)
+    ref = prepared.groupby(["market", "month"], observed=True).agg(
+        n_settled=("profit", "size"), profit=("profit", "sum"), turnover=("stake", "sum"),
+        avg_odds=("odds", "mean")).reset_index()
+    assert seg[["market", "month"]].astype(str).values.tolist() == ref[["market", "month"]].astype(str).values.tolist()
+    for col in ("n_settled", "profit", "turnover", "avg_odds"):
+        assert seg[col].tolist() == pytest.approx(ref[col].tolist()), col
+    assert seg['n_settled'].sum() == len(prepared)
@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import pytest
+
+from sniper import api, db
+
+
+async def _raw(port, data):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(data)
+    await writer.drain()
+    out = await reader.read()
+    writer.close()
+    head, _, body = out.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+def _exchange(requests, token="s3cret"):
+    """啟動行程內伺服器，依序送出原始請求，回傳 [(status, payload), ...]"""
+    async def _main():
+        server = await api.Server("127.0.0.1", 0, token=token, workers=4).start()
+        try:
+            return [await _raw(server.port, r) for r in requests]
+        finally:
+            await server.shutdown()
+            server.close()
+    return asyncio.run(_main())
+
+
+def _req(method, path, body=b"", token="s3cret", headers=""):
+    auth = f"Authorization: Bearer {token}\r\n" if token else ""
+    return (f"{method} {path} HTTP/1.1\r\nConnection: close\r\n{auth}{headers}"
+            f"Content-Length: {len(body)}\r\n\r\n").encode("utf-8") + body
+
+
+def test_token_required(bet_db):
+    out = _exchange([_req("GET", "/health", token=None), _req("GET", "/health", token="wrong"),
+                     _req("GET", "/health", token="s3creté"), _req("GET", "/health")])
+    assert [s for s, _ in out] == [401, 401, 401, 200]
+
+
+@pytest.mark.parametrize("query", ["limit=abc", "limit=0", "limit=-3", "limit=1.5"])
+def test_bad_limit_is_400(bet_db, query):
+    [(status, payload)] = _exchange([_req("GET", f"/pending?{query}")])
+    assert status == 400 and payload["error"] == api.ERR_INVALID
+
+
+@pytest.mark.parametrize("length", ["abc", "-1", "1e3"])
+def test_bad_content_length_is_400(bet_db, length):
+    raw = f"POST /bets HTTP/1.1\r\nAuthorization: Bearer s3cret\r\nContent-Length: {length}\r\n\r\n".encode()
+    [(status, payload)] = _exchange([raw])
+    assert status == 400 and payload["error"] == api.ERR_INVALID
+
+
+def test_add_settle_revoke_round_trip(bet_db):
+    bet = {"match": "[英超] 阿仙奴 vs 車路士", "bet_type": "讓分 [主隊 讓 0.5]", "odds": 1.9, "stake": 100}
+    [(status, added)] = _exchange([_req("POST", "/bets", json.dumps(bet).encode())])
+    assert status == 200 and added["ok"]
+    out = _exchange([
+        _req("POST", "/bets", json.dumps(bet).encode()),
+        _req("POST", "/settle", json.dumps([{"id": added["id"], "result": "贏"},
+                                            {"id": added["id"], "result": "輸"},
+                                            {"id": "nope", "result": "贏"}]).encode()),
+        _req("GET", "/pending?limit=5"),
+        _req("POST", "/revoke", json.dumps({"id": added["id"]}).encode()),
+        _req("POST", "/revoke", json.dumps({"id": added["id"]}).encode()),
+    ])
+    assert out[0] == (400, {"ok": False, "error": api.ERR_DUPLICATE, "message": out[0][1]["message"]})
+    settle = out[1][1]
+    assert (settle["ok"], settle["failed"]) == (1, 2)
+    assert sorted(r.get("error", "") for r in settle["results"]) == ["", api.ERR_ALREADY_SETTLED, api.ERR_UNKNOWN_ID]
+    assert out[2] == (200, [])
+    assert out[3][0] == 200 and out[4][1]["error"] == api.ERR_NOT_SETTLED
+    assert db.get_config()[0] == pytest.approx(10000.0)
+
+
+def test_not_found_vs_internal_error(bet_db, monkeypatch):
+    out = _exchange([_req("GET", "/nope"), _req("POST", "/nope", b"{}")])
+    assert [(s, p["error"]) for s, p in out] == [(404, "NOT_FOUND"), (404, "NOT_FOUND")]
+
+    # 內部的 KeyError 是程式錯誤，不能被當成 404
+    def _broken():
+        raise KeyError("bankroll")
+    monkeypatch.setattr(db, "get_config", _broken)
+    [(status, payload)] = _exchange([_req("GET", "/config")])
+    assert status == 500 and payload["error"] == "KeyError"
@@ -0,0 +1,105 @@
+import gzip
+
+import pytest
+
+from sniper import audit, db
+
+
+@pytest.fixture
+def history(add_bet):
+    """下注 / 結算 / 改判 / 撤銷 / 調整資金混合的日誌"""
+    ids = [add_bet(f"[英超] 主{i} vs 客{i}", stake=100 + i) for i in range(8)]
+    for i, b in enumerate(ids[:6]):
+        db.settle_bet_db(b, 50.0 + i if i % 2 else -100.0 - i, "贏" if i % 2 else "輸")
+    db.settle_bet_db(ids[0], 95.0, "贏")          # 改判
+    db.revoke_settlement_db(ids[1])
+    return ids
+
+
+def _audit_count():
+    with db.read_conn() as conn:
+        return conn.execute("SELECT COUNT(*) FROM audit_log").fetchone()[0]
+
+
+def test_replay_from_checkpoint_and_archive(history, tmp_path):
+    assert audit.checkpoint() > 0
+    for b in history[6:]:
+        db.settle_bet_db(b, 40.0, "贏半")
+    arch = audit.archive(str(tmp_path), keep=0)
+    assert arch["rows"] > 0 and arch["last_seq"] == audit.stats()["checkpoint_seq"]
+    db.update_config(bankroll=db.get_config()[0] + 500)      # 封存後的尾段
+    db.settle_bet_db(history[2], 10.0, "贏半")
+
+    bankroll = db.get_config()[0]
+    quick = audit.replay()
+    assert quick["ok"] and quick["bankroll"] == pytest.approx(bankroll)
+    assert quick["checkpoint_seq"] == arch["last_seq"]
+
+    full = audit.replay(full=True)
+    assert full["ok"] and full["checkpoint_ok"] and full["archives_verified"] == 1
+    assert full["bankroll"] == pytest.approx(bankroll)
+    assert full["replayed"] == arch["rows"] + _audit_count()
+    assert [(n, ok) for _, n, ok in audit.verify_archives()] == [(arch["rows"], True)]
+
+
+def test_tampered_archive_is_detected(history, tmp_path):
+    audit.checkpoint()
+    arch = audit.archive(str(tmp_path))
+    with gzip.open(arch["path"], "rt", encoding="utf-8") as f:
+        lines = f.readlines()
+    tampered = lines[-1].replace('"target_id": "', '"target_id": "x')
+    assert tampered != lines[-1]
+    lines[-1] = tampered
+    with gzip.open(arch["path"], "wt", encoding="utf-8") as f:
+        f.writelines(lines)
+
+    assert audit.replay()["ok"]                          # 快速重播只看檢查點之後
+    full = audit.replay(full=True, repair=True)
+    assert not full["ok"] and not full["repaired"] and full["bad_archives"]
+    assert [ok for _, _, ok in audit.verify_archives()] == [False]
+    assert audit.main(["verify"]) == 1
+
+
+def test_missing_archive_is_detected(history, tmp_path):
+    audit.checkpoint()
+    arch = audit.archive(str(tmp_path))
+    (tmp_path / arch["path"].rsplit("/", 1)[-1]).unlink()
+    assert audit.replay(full=True)["bad_archives"]
+
+
+def test_tampered_checkpoint_is_detected(history):
+    seq = audit.checkpoint()
+    with db.write_txn() as conn:
+        conn.execute("UPDATE audit_checkpoint SET bankroll = bankroll + 1000 WHERE seq=?", (seq,))
+    assert not audit.replay()["ok"]                      # 從被改過的檢查點起算，與資金對不上
+    full = audit.replay(full=True)
+    assert full["checkpoint_ok"] is False and not full["ok"]
+    assert full["bankroll"] == pytest.approx(db.get_config()[0])
+
+
+def test_repair_bankroll(history):
+    expected = db.get_config()[0]
+    with db.write_txn() as conn:
+        conn.execute("UPDATE config SET value = value + 123 WHERE key='bankroll'")
+    result = audit.replay(repair=True)
+    assert not result["ok"] and result["repaired"] and result["diff"] == 123.0
+    assert db.get_config()[0] == pytest.approx(expected)
+    assert audit.replay()["ok"]
+
+
+def test_auto_checkpoint(history, monkeypatch):
+    monkeypatch.setattr(db, "CHECKPOINT_EVERY", 5)
+    for b in history[6:]:
+        db.settle_bet_db(b, 10.0, "贏")
+    stats = audit.stats()
+    assert stats["checkpoint_seq"] is not None and stats["tail"] < 5
+    assert audit.replay(full=True)["ok"]
+
+
+def test_stats_count_with_gaps(history):
+    n = _audit_count()
+    with db.write_txn() as conn:
+        conn.execute("DELETE FROM audit_log WHERE id = (SELECT MIN(id) + 3 FROM audit_log)")
+    stats = audit.stats()
+    assert stats["rows"] == n - 1
+    assert stats["last_seq"] - stats["first_seq"] + 1 == n          # 序號不連續
@@ -0,0 +1,66 @@
+import gzip
+import os
+
+import pytest
+
+from sniper import audit, backup, db
+
+
+@pytest.fixture
+def snap_dir(tmp_path):
+    return str(tmp_path / "snapshots")
+
+
+def _bankroll_and_count():
+    with db.read_conn() as conn:
+        n = conn.execute("SELECT COUNT(*) FROM bets").fetchone()[0]
+        n_audit = conn.execute("SELECT COUNT(*) FROM audit_log").fetchone()[0]
+    return db.get_config()[0], n, n_audit
+
+
+def test_snapshot_restore_round_trip(add_bet, bet_db, snap_dir):
+    a = add_bet()
+    db.settle_bet_db(a, 90.0, "贏")
+    snap = backup.create(bet_db, snap_dir)
+    assert not snap["skipped"] and backup.verify(snap["path"])
+    with open(snap["path"] + ".sha256", encoding="utf-8") as f:
+        assert f.read().split() == [snap["sha256"], os.path.basename(snap["path"])]
+    before = _bankroll_and_count()
+
+    # 內容沒變 → 不另存
+    assert backup.create(bet_db, snap_dir)["skipped"]
+
+    add_bet("[西甲] 皇馬 vs 巴塞")
+    db.revoke_settlement_db(a)
+    assert _bankroll_and_count() != before
+
+    report = backup.restore(snap["path"], bet_db, snap_dir)
+    assert report["pre_restore"] and os.path.exists(report["pre_restore"])
+    bankroll, n, n_audit = _bankroll_and_count()
+    assert (bankroll, n) == before[:2]
+    assert n_audit == before[2] + 1                  # 快照內的 audit_log + RESTORE_BACKUP
+    assert db.get_equity_summary()["equity"] == pytest.approx(10090.0)
+    assert audit.replay()["ok"]                      # 還原後由審計日誌重播的資金一致
+
+
+def test_corrupted_snapshot_is_rejected(add_bet, bet_db, snap_dir):
+    add_bet()
+    snap = backup.create(bet_db, snap_dir)
+    with open(snap["path"], "r+b") as f:
+        f.seek(20)
+        f.write(b"\x00\x00\x00\x00")
+    assert not backup.verify(snap["path"])
+    with pytest.raises(ValueError):
+        backup.restore(snap["path"], bet_db, snap_dir)
+    assert _bankroll_and_count()[1] == 1             # 現行 DB 未被動到
+
+
+def test_rotation_keeps_newest(add_bet, bet_db, snap_dir):
+    for i in range(4):
+        add_bet(f"[英超] 主{i} vs 客{i}")
+        backup.create(bet_db, snap_dir, keep=2, force=True)
+    snaps = backup.list_snapshots(snap_dir, bet_db)
+    assert len(snaps) == 2
+    assert len(os.listdir(snap_dir)) == 2 * 3        # 快照 + .sha256 + .json
+    with gzip.open(snaps[0]["path"]) as gz:
+        assert gz.read(16) == b"SQLite format 3\x00"
@@ -0,0 +1,140 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sniper.betting import (calculate_reverse_metrics, calculate_reverse_metrics_vec, grade_results_vec,
+                            screen_slate)
+from sniper.parsing import parse_bet_type
+
+
+def _decimal(ev, odds, fraction=0.25, bankroll=10000):
+    p, k_frac, stake = calculate_reverse_metrics(ev, odds, fraction=fraction, bankroll=bankroll)
+    return float(p), float(k_frac), float(stake)
+
+
+# ==========================================
+# 向量化 Kelly == 逐筆 Decimal
+# ==========================================
+def test_reverse_metrics_vec_matches_decimal_random():
+    rng = random.Random(10)
+    ev = [round(rng.uniform(-20, 40), 2) for _ in range(3000)]
+    odds = [round(rng.uniform(1.01, 12), 2) for _ in range(3000)]
+    out = calculate_reverse_metrics_vec(ev, odds)
+    expected = [_decimal(e, o) for e, o in zip(ev, odds)]
+    assert out["stake"].tolist() == [s for _, _, s in expected]
+    np.testing.assert_allclose(out["implied_p"], [p for p, _, _ in expected], rtol=0, atol=1e-12)
+    np.testing.assert_allclose(out["kelly_frac"], [k for _, k, _ in expected], rtol=0, atol=1e-12)
+
+
+# odds = 2 時 kelly_full = ev，stake = ev% × 25：剛好落在 .5，須照 ROUND_HALF_UP 進位。
+# 浮點直接算 (例如 4.1 × 25 = 102.4999…) 會捨去，要靠 Decimal 重算修正
+@pytest.mark.parametrize("ev, expected", [
+    (0.02, 1), (0.06, 2), (0.1, 3), (0.14, 4), (0.3, 8), (1.02, 26), (4.1, 103), (9.98, 250),
+])
+def test_reverse_metrics_vec_half_boundaries(ev, expected):
+    stake = calculate_reverse_metrics_vec([ev], [2.0])["stake"][0]
+    assert stake == expected == _decimal(ev, 2.0)[2]
+
+
+@pytest.mark.parametrize("fraction, bankroll", [(0.5, 9999), (1.0, 12345.5), (0.1, 500)])
+def test_reverse_metrics_vec_other_sizing(fraction, bankroll):
+    ev = [0.02, 3.5, 12.0, -4.0, 0.0]
+    odds = [2.0, 1.85, 3.1, 2.2, 1.0]
+    out = calculate_reverse_metrics_vec(ev, odds, fraction=fraction, bankroll=bankroll)
+    assert out["stake"].tolist() == [_decimal(e, o, fraction, bankroll)[2] for e, o in zip(ev, odds)]
+
+
+def test_non_positive_edge_or_odds_gives_zero_stake():
+    out = calculate_reverse_metrics_vec([-5.0, 0.0, 10.0, 10.0], [2.0, 2.0, 1.0, 0.0])
+    assert out["stake"].tolist() == [0.0, 0.0, 0.0, 0.0]
+    assert out["implied_p"][3] == 0.0
+
+
+# ==========================================
+# 同時下注等比例縮放
+# ==========================================
+def test_simultaneous_scales_to_max_exposure():
+    ev, odds = [20.0, 30.0, 25.0], [2.0, 2.5, 3.0]
+    single = calculate_reverse_metrics_vec(ev, odds)["kelly_frac"]
+    assert single.sum() > 0.1
+    out = calculate_reverse_metrics_vec(ev, odds, simultaneous=True, max_exposure=0.1)
+    assert out["kelly_frac"].sum() == pytest.approx(0.1)
+    np.testing.assert_allclose(out["kelly_frac"] / single, 0.1 / single.sum())
+    np.testing.assert_array_equal(out["stake"], np.floor(out["kelly_frac"] * 10000 + 0.5))
+
+
+def test_simultaneous_under_cap_is_unchanged():
+    ev, odds = [2.0, 3.0], [2.0, 1.9]
+    plain = calculate_reverse_metrics_vec(ev, odds)
+    out = calculate_reverse_metrics_vec(ev, odds, simultaneous=True, max_exposure=1.0)
+    np.testing.assert_array_equal(out["stake"], plain["stake"])
+
+
+def test_screen_slate_sorts_by_stake():
+    df = pd.DataFrame({"match": ["a", "b", "c"], "ev": [1.0, 10.0, 5.0], "odds": [2.0, 2.0, 2.0]})
+    out = screen_slate(df)
+    assert out["match"].tolist() == ["b", "c", "a"]
+    assert {"implied_p", "kelly_full", "kelly_frac", "stake"} <= set(out.columns)
+    assert len(df.columns) == 3       # 不修改輸入
+
+
+# ==========================================
+# 由比分判定結果 (含四分之一盤)
+# ==========================================
+def _grade(market, side, line, home, away):
+    return grade_results_vec([market], [side], [line], [home], [away])[0]
+
+
+@pytest.mark.parametrize("side, line, home, away, expected", [
+    # 主讓 0/0.5 (-0.25)：贏 1 球全贏，和局輸半，輸球全輸
+    ("home", -0.25, 1, 0, "贏"), ("home", -0.25, 0, 0, "輸半"), ("home", -0.25, 0, 1, "輸"),
+    # 客受讓 0/0.5 (+0.25)：和局贏半
+    ("away", 0.25, 0, 0, "贏半"), ("away", 0.25, 1, 0, "輸"), ("away", 0.25, 1, 2, "贏"),
+    # 平手盤與整數盤走水
+    ("home", 0.0, 2, 2, "走水"), ("home", -1.0, 2, 1, "走水"), ("away", 1.0, 2, 1, "走水"),
+    # 主讓 1/1.5 (-1.25)：贏 1 球輸半，贏 2 球全贏
+    ("home", -1.25, 1, 0, "輸半"), ("home", -1.25, 2, 0, "贏"),
+    # 主讓 0.5/1 (-0.75)：贏 1 球贏半
+    ("home", -0.75, 1, 0, "贏半"), ("home", -0.75, 0, 0, "輸"),
+    # 半球盤沒有走水
+    ("home", -0.5, 1, 0, "贏"), ("home", -0.5, 0, 0, "輸"),
+])
+def test_grade_handicap(side, line, home, away, expected):
+    assert _grade("讓分", side, line, home, away) == expected
+
+
+@pytest.mark.parametrize("side, line, home, away, expected", [
+    # 大小 2.5/3 (2.75)：3 球大贏半 / 小輸半，4 球大全贏，2 球小全贏
+    ("over", 2.75, 2, 1, "贏半"), ("under", 2.75, 2, 1, "輸半"),
+    ("over", 2.75, 3, 1, "贏"), ("under", 2.75, 1, 1, "贏"),
+    # 大小 2/2.5 (2.25)：2 球大輸半 / 小贏半
+    ("over", 2.25, 1, 1, "輸半"), ("under", 2.25, 1, 1, "贏半"),
+    ("over", 3.0, 2, 1, "走水"), ("over", 2.5, 2, 1, "贏"), ("under", 2.5, 2, 1, "輸"),
+])
+def test_grade_over_under(side, line, home, away, expected):
+    assert _grade("大小", side, line, home, away) == expected
+
+
+@pytest.mark.parametrize("side, home, away, expected", [
+    ("home", 2, 1, "贏"), ("home", 1, 1, "輸"), ("draw", 1, 1, "贏"),
+    ("draw", 0, 1, "輸"), ("away", 0, 1, "贏"), ("away", 3, 0, "輸"),
+])
+def test_grade_1x2(side, home, away, expected):
+    assert _grade("獨贏", side, None, home, away) == expected
+
+
+@pytest.mark.parametrize("market, side, line", [
+    (None, "home", -0.5), ("讓分", None, -0.5), ("讓分", "home", None),
+    ("大小", "home", 2.5), ("獨贏", "over", None),
+])
+def test_grade_ungradable_is_none(market, side, line):
+    assert _grade(market, side, line, 1, 0) is None
+
+
+def test_grade_from_parsed_bet_types():
+    bet_types = ["讓分 [主隊 讓 0/0.5]", "讓分 [客隊 受讓 0/0.5]", "大小 [大 (Over) 2.5/3]", "獨贏 [和局]"]
+    market, side, line = zip(*(parse_bet_type(b) for b in bet_types))
+    out = grade_results_vec(market, side, line, [0] * 4, [0] * 4)
+    assert out.tolist() == ["輸半", "贏半", "輸", "贏"]
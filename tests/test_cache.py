@@ -0,0 +1,104 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from sniper import db
+from sniper.cache import QueryCache
+
+
+def _counts():
+    info = db.cache_info()
+    return info["hits"], info["misses"]
+
+
+def test_read_without_write_hits_cache(add_bet):
+    add_bet()
+    first = db.get_pending_bets()
+    hits, misses = _counts()
+    assert db.get_pending_bets() is first
+    assert db.get_config() == db.get_config()
+    assert _counts() == (hits + 2, misses + 1)
+
+
+def test_pool_write_invalidates(add_bet):
+    add_bet("[英超] 主1 vs 客1")
+    assert len(db.get_pending_bets()) == 1
+    hits, misses = _counts()
+    add_bet("[英超] 主2 vs 客2")
+    assert len(db.get_pending_bets()) == 2
+    assert _counts() == (hits, misses + 1)
+
+
+def test_write_through_other_connection_invalidates(add_bet):
+    add_bet()
+    bankroll = db.get_config()[0]
+    assert db.get_config()[0] == bankroll                # 已快取
+    # 不經連線池 (等同另一個行程) 直接改 DB → PRAGMA data_version 改變
+    other = sqlite3.connect(db.DB_PATH)
+    with other:
+        other.execute("UPDATE config SET value = value + 250 WHERE key = 'bankroll'")
+        other.execute("DELETE FROM bets")
+    other.close()
+    hits, misses = _counts()
+    assert db.get_config()[0] == pytest.approx(bankroll + 250)
+    assert db.get_pending_bets().empty and not db.has_bets()
+    assert _counts() == (hits, misses + 3)
+
+
+def test_generation_tracks_both_sources(bet_db):
+    pool = db.get_pool()
+    g0 = pool.generation()
+    assert pool.generation() == g0
+    with db.write_txn() as conn:
+        conn.execute("UPDATE config SET value = value + 1 WHERE key = 'bankroll'")
+    g1 = pool.generation()
+    assert g1 != g0 and g1[1][0] == g0[1][0] + 1          # 本行程 commit 次數
+    other = sqlite3.connect(bet_db)
+    with other:
+        other.execute("UPDATE config SET value = value + 1 WHERE key = 'bankroll'")
+    other.close()
+    g2 = pool.generation()
+    assert g2[1][0] == g1[1][0] and g2[1][1] != g1[1][1]  # 只有 data_version 改變
+
+
+# ==========================================
+# QueryCache 本身 (世代由測試控制)
+# ==========================================
+@pytest.fixture
+def gen():
+    return {"v": 0}
+
+
+def test_result_computed_across_write_is_not_reused(gen):
+    cache = QueryCache(lambda: ("db", gen["v"]))
+    calls = []
+
+    @cache.cached
+    def read(x):
+        calls.append(x)
+        gen["v"] += 1          # 計算期間有寫入：結果屬於舊世代
+        return x * 2
+
+    assert read(3) == 6 and read(3) == 6
+    assert calls == [3, 3] and cache.info()["hits"] == 0
+
+
+def test_lru_and_size_limits(gen):
+    cache = QueryCache(lambda: ("db", gen["v"]), max_entries=2)
+    calls = []
+
+    @cache.cached
+    def read(x):
+        calls.append(x)
+        return pd.DataFrame({"x": [x]})
+
+    for x in (1, 2, 1, 3, 1, 2):
+        read(x)
+    assert calls == [1, 2, 3, 2]                          # 2 最久未用 → 先被淘汰
+    read([1])                                             # 不可雜湊的參數不快取
+    assert cache.info()["entries"] == 2
+
+    cache.max_bytes = 1
+    read(99)
+    assert cache.info()["entries"] == 2                   # 超過位元組上限的結果不快取
@@ -0,0 +1,115 @@
+import json
+import sqlite3
+
+import pytest
+
+from sniper import audit, db
+from sniper.importer import REJECT_DUPLICATE_BET, REJECT_DUPLICATE_ID, REJECT_INVALID_ROW, import_bets
+
+MATCH, BET_TYPE = "[英超] 阿仙奴 vs 車路士", "讓分 [主隊 讓 0.5]"
+
+
+def _statuses():
+    with db.read_conn() as conn:
+        return conn.execute("SELECT status, COUNT(*) FROM bets GROUP BY status ORDER BY status").fetchall()
+
+
+# ==========================================
+# 單筆下注查重 (idx_bets_pending_fp)
+# ==========================================
+def test_duplicate_pending_bet_is_blocked(bet_db):
+    ok, first = db.add_bet_db(MATCH, BET_TYPE, 100, 1.9)
+    assert ok
+    ok, message = db.add_bet_db(MATCH, BET_TYPE, 100, 1.9)
+    assert not ok and "重複" in message
+    # 金額 / 賠率不同就不是同一注；100 與 100.0 是同一注
+    assert db.add_bet_db(MATCH, BET_TYPE, 150, 1.9)[0]
+    assert db.add_bet_db(MATCH, BET_TYPE, 100, 1.95)[0]
+    assert not db.add_bet_db(MATCH, BET_TYPE, 100.0, 1.90)[0]
+    with db.read_conn() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM audit_log WHERE action='ADD_BET'").fetchone()[0] == 3
+
+
+def test_same_bet_allowed_again_after_settle(bet_db):
+    _, first = db.add_bet_db(MATCH, BET_TYPE, 100, 1.9)
+    db.settle_bet_db(first, 90.0, "贏")
+    ok, second = db.add_bet_db(MATCH, BET_TYPE, 100, 1.9)        # 唯一索引只涵蓋待定
+    assert ok and second != first
+
+
+def test_index_enforced_at_sql_level(bet_db):
+    db.add_bet_db(MATCH, BET_TYPE, 100, 1.9)
+    fp = db.bet_fingerprint(MATCH, BET_TYPE, 100, 1.9)
+    with pytest.raises(sqlite3.IntegrityError):
+        with db.write_txn() as conn:
+            conn.execute("INSERT INTO bets (id, status, fingerprint) VALUES ('x', '待定', ?)", (fp,))
+
+
+# ==========================================
+# 撤銷結算撞上相同的待定注單
+# ==========================================
+def test_revoke_with_identical_pending_bet(bet_db):
+    _, first = db.add_bet_db(MATCH, BET_TYPE, 100, 1.9)
+    db.settle_bet_db(first, 100.0, "贏")
+    _, second = db.add_bet_db(MATCH, BET_TYPE, 100, 1.9)
+    assert db.get_config()[0] == 10100.0
+
+    assert db.revoke_settlement_db(first)
+    assert db.get_config()[0] == 10000.0
+    bets = db.get_bets_by_ids([first, second], columns=("id", "status", "fingerprint"))
+    assert bets[first]["status"] == bets[second]["status"] == "待定"
+    assert bets[first]["fingerprint"] is None and bets[second]["fingerprint"] is not None
+    assert db.get_equity_summary() is None
+    assert audit.replay()["ok"]
+    with db.read_conn() as conn:
+        payload = conn.execute("SELECT payload FROM audit_log WHERE action='REVOKE_SETTLE'").fetchone()[0]
+    assert json.loads(payload) == {"removed_profit": 100.0, "duplicate_pending": True}
+
+    # 仍然擋下第三筆相同的待定注單；撤銷的那筆可以照常再結算
+    assert not db.add_bet_db(MATCH, BET_TYPE, 100, 1.9)[0]
+    assert db.settle_bet_db(first, -100.0, "輸", pending_only=True)
+    assert db.get_config()[0] == 9900.0
+
+
+def test_revoke_without_collision_keeps_fingerprint(bet_db):
+    _, first = db.add_bet_db(MATCH, BET_TYPE, 100, 1.9)
+    db.settle_bet_db(first, 90.0, "贏")
+    assert db.revoke_settlement_db(first)
+    assert db.get_bets_by_ids([first], columns=("id", "fingerprint"))[first]["fingerprint"] is not None
+    assert not db.add_bet_db(MATCH, BET_TYPE, 100, 1.9)[0]
+
+
+# ==========================================
+# 批次匯入
+# ==========================================
+def test_import_skip_counts(bet_db):
+    _, existing = db.add_bet_db(MATCH, BET_TYPE, 100, 1.9)
+    csv = "\n".join([
+        "id,created_at,match_info,bet_type,stake,odds,status,profit,settled_at,notes",
+        f"{existing},,{MATCH},{BET_TYPE},100,1.9,待定,0,,",                       # 1 主鍵已存在
+        f"n1,,{MATCH},{BET_TYPE},100,1.9,待定,0,,",                               # 2 與既有待定同一注
+        f"n2,,{MATCH},{BET_TYPE},200,1.9,待定,0,,",                               # 3 ok
+        f"n3,,{MATCH},{BET_TYPE},200,1.9,待定,0,,",                               # 4 與第 3 列同一注
+        f"n4,,{MATCH},{BET_TYPE},100,1.9,贏,90,2026-10-01T10:00:00+08:00,",       # 5 已結算不參與查重
+        f"n2,,{MATCH},{BET_TYPE},300,1.9,待定,0,,",                               # 6 檔內重複 id
+        f"n5,,{MATCH},{BET_TYPE},abc,1.9,待定,0,,",                               # 7 金額錯誤
+        f"n6,,,{BET_TYPE},100,1.9,待定,0,,",                                      # 8 缺賽事
+    ]).encode("utf-8")
+    report = import_bets(csv, fmt="csv", chunk_size=3)
+    assert report["imported"] == 2
+    assert report["profit"] == 90.0
+    assert report["rejects"][["row", "reason"]].values.tolist() == [
+        [1, REJECT_DUPLICATE_ID],
+        [2, REJECT_DUPLICATE_BET],
+        [4, REJECT_DUPLICATE_BET],
+        [6, REJECT_DUPLICATE_ID],
+        [7, REJECT_INVALID_ROW],
+        [8, REJECT_INVALID_ROW],
+    ]
+    assert _statuses() == [("待定", 2), ("贏", 1)]
+    assert db.get_config()[0] == 10090.0
+    assert db.get_equity_summary()["equity"] == 10090.0
+
+    # 同一檔再匯入一次：全部略過
+    again = import_bets(csv, fmt="csv")
+    assert again["imported"] == 0 and len(again["rejects"]) == 8
@@ -0,0 +1,160 @@
+import pytest
+
+from sniper import db
+from sniper.betting import calculate_max_drawdown
+
+
+def _settle_at(bet_id, profit, status, ts):
+    """以指定結算時間寫入 (與 settle_bet_db 同一段程式，只是時間可控)"""
+    with db.write_txn() as conn:
+        assert db._settle_bet(conn, bet_id, profit, status, ts)
+
+
+def _ledger():
+    with db.read_conn() as conn:
+        return conn.execute("""
+            SELECT bet_id, settled_at, profit, equity, peak, max_dd, n_settled, n_wins
+            FROM equity_ledger ORDER BY settled_at, bet_id
+        """).fetchall()
+
+
+def _rollups():
+    with db.read_conn() as conn:
+        return conn.execute("SELECT * FROM pnl_rollup ORDER BY grain, bucket").fetchall()
+
+
+def _assert_rows_equal(actual, expected):
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        assert [x for x in a if isinstance(x, str)] == [x for x in e if isinstance(x, str)]
+        assert [x for x in a if not isinstance(x, str)] == pytest.approx([x for x in e if not isinstance(x, str)])
+
+
+def _assert_matches_rebuild():
+    """增量維護的帳本 / 彙總必須與由 bets 全量重建的結果相同"""
+    ledger, rollups = _ledger(), _rollups()
+    db.rebuild_equity_ledger()
+    _assert_rows_equal(ledger, _ledger())
+    _assert_rows_equal(rollups, _rollups())
+
+
+@pytest.fixture
+def bets(add_bet):
+    return [add_bet(f"[英超] 主{i} vs 客{i}", stake=100 + i) for i in range(6)]
+
+
+# ==========================================
+# 權益帳本
+# ==========================================
+def test_ledger_tracks_settle_and_revoke(bets):
+    profits = [90.0, -101.0, -102.0, 51.5, 0.0, 94.5]
+    for b, p in zip(bets, profits):
+        assert db.settle_bet_db(b, p, "贏" if p > 0 else "輸" if p < 0 else "走水")
+
+    curve = [10000.0]
+    for p in profits:
+        curve.append(curve[-1] + p)
+    summary = db.get_equity_summary()
+    assert summary["equity"] == pytest.approx(curve[-1])
+    assert summary["peak"] == pytest.approx(max(curve))
+    assert summary["max_dd"] == pytest.approx(calculate_max_drawdown(curve))
+    assert (summary["n_settled"], summary["n_wins"]) == (6, 3)
+    assert db.get_equity_curve()["equity"].tolist() == pytest.approx(curve[1:])
+    _assert_matches_rebuild()
+
+    # 撤銷中段一筆：後面各列的累積狀態要重算
+    assert db.revoke_settlement_db(bets[1], settled_only=True)
+    assert not db.revoke_settlement_db(bets[1], settled_only=True)       # 已是待定
+    summary = db.get_equity_summary()
+    assert summary["equity"] == pytest.approx(curve[-1] + 101.0)
+    assert (summary["n_settled"], summary["n_wins"]) == (5, 3)
+    assert db.get_config()[0] == pytest.approx(summary["equity"])
+    _assert_matches_rebuild()
+
+
+def test_resettle_moves_row_to_new_time(bets):
+    _settle_at(bets[0], 90.0, "贏", "2026-10-01T12:00:00+08:00")
+    _settle_at(bets[1], -101.0, "輸", "2026-10-02T12:00:00+08:00")
+    _settle_at(bets[2], 51.0, "贏半", "2026-10-03T12:00:00+08:00")
+    # 改判：同一筆重新結算，損益換成新值、位置移到新的結算時間
+    _settle_at(bets[0], -100.0, "輸", "2026-10-04T12:00:00+08:00")
+    ledger = _ledger()
+    assert [r[0] for r in ledger] == [bets[1], bets[2], bets[0]]
+    assert ledger[-1][3] == pytest.approx(10000 - 101 + 51 - 100)
+    assert db.get_config()[0] == pytest.approx(10000 - 101 + 51 - 100)
+    _assert_matches_rebuild()
+
+
+def test_revoke_everything_empties_ledger(bets):
+    for b in bets[:2]:
+        db.settle_bet_db(b, 10.0, "贏")
+    for b in bets[:2]:
+        assert db.revoke_settlement_db(b)
+    assert db.get_equity_summary() is None
+    assert _ledger() == [] and _rollups() == []
+    assert db.get_config()[0] == pytest.approx(10000.0)
+
+
+# ==========================================
+# 日 / 週 / 月損益彙總
+# ==========================================
+@pytest.fixture
+def staked_bets(add_bet):
+    return [add_bet(f"[西甲] 主{i} vs 客{i}", stake=100 + 10 * i) for i in range(6)]
+
+
+def _rollup(grain):
+    return db.get_pnl_rollup(grain)[["bucket", "n", "n_wins", "profit", "turnover", "eq_close", "eq_min",
+                                     "eq_max"]].values.tolist()
+
+
+def test_rollup_day_week_month(staked_bets):
+    # 2026-09-30 (三) / 10-01 (四) 同一週、不同月；10-05 (一) 新的一週
+    _settle_at(staked_bets[0], 90.0, "贏", "2026-09-30T10:00:00+08:00")
+    _settle_at(staked_bets[1], -110.0, "輸", "2026-09-30T23:30:00+08:00")
+    _settle_at(staked_bets[2], 60.0, "贏半", "2026-10-01T01:00:00+08:00")
+    _settle_at(staked_bets[3], -130.0, "輸", "2026-10-05T09:00:00+08:00")
+
+    assert _rollup("day") == [
+        ["2026-09-30", 2, 1, -20.0, 210.0, 9980.0, 9980.0, 10090.0],
+        ["2026-10-01", 1, 1, 60.0, 120.0, 10040.0, 10040.0, 10040.0],
+        ["2026-10-05", 1, 0, -130.0, 130.0, 9910.0, 9910.0, 9910.0],
+    ]
+    assert _rollup("week") == [
+        ["2026-09-28", 3, 2, 40.0, 330.0, 10040.0, 9980.0, 10090.0],
+        ["2026-10-05", 1, 0, -130.0, 130.0, 9910.0, 9910.0, 9910.0],
+    ]
+    assert _rollup("month") == [
+        ["2026-09", 2, 1, -20.0, 210.0, 9980.0, 9980.0, 10090.0],
+        ["2026-10", 2, 1, -70.0, 250.0, 9910.0, 9910.0, 10040.0],
+    ]
+    _assert_matches_rebuild()
+
+
+def test_rollup_after_backdated_settle_and_revoke(staked_bets):
+    _settle_at(staked_bets[0], 90.0, "贏", "2026-10-01T10:00:00+08:00")
+    _settle_at(staked_bets[1], 60.0, "贏半", "2026-10-03T10:00:00+08:00")
+    # 補登較早的結算：之後各桶的權益要整段重算 (不能走尾端累加)
+    _settle_at(staked_bets[2], -120.0, "輸", "2026-09-29T10:00:00+08:00")
+    assert [r[5] for r in _rollup("day")] == pytest.approx([9880.0, 9970.0, 10030.0])
+    _assert_matches_rebuild()
+
+    assert db.revoke_settlement_db(staked_bets[0], settled_only=True)
+    assert _rollup("day") == [
+        ["2026-09-29", 1, 0, -120.0, 120.0, 9880.0, 9880.0, 9880.0],
+        ["2026-10-03", 1, 1, 60.0, 110.0, 9940.0, 9940.0, 9940.0],
+    ]
+    assert _rollup("month") == [
+        ["2026-09", 1, 0, -120.0, 120.0, 9880.0, 9880.0, 9880.0],
+        ["2026-10", 1, 1, 60.0, 110.0, 9940.0, 9940.0, 9940.0],
+    ]
+    _assert_matches_rebuild()
+
+
+def test_rollup_range_and_grain_validation(staked_bets):
+    _settle_at(staked_bets[0], 90.0, "贏", "2026-10-01T10:00:00+08:00")
+    _settle_at(staked_bets[1], 60.0, "贏半", "2026-10-09T10:00:00+08:00")
+    assert db.get_pnl_rollup("day", start="2026-10-02")["bucket"].tolist() == ["2026-10-09"]
+    assert db.get_pnl_rollup("week", end="2026-10-04")["bucket"].tolist() == ["2026-09-28"]
+    with pytest.raises(ValueError):
+        db.get_pnl_rollup("year")
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from sniper import db, metrics
+
+
+@pytest.fixture
+def rerun():
+    run = metrics.start_rerun(session="test")
+    yield run
+    metrics._local.rerun = None
+
+
+def test_nested_sections_roll_up(rerun, tmp_path):
+    with metrics.section("tab1"):
+        metrics.trace_sql("SELECT 1")
+        for _ in range(2):
+            with metrics.section("db.q"):
+                metrics.trace_sql("SELECT 2")
+                metrics.trace_sql("SELECT 3")
+                metrics.add_rows(5)
+    metrics.trace_sql("SELECT 4")          # 不在任何區段 → 只記在 rerun 總數
+    path = str(tmp_path / "m.ndjson")
+    assert metrics.finish_rerun(path) is rerun
+
+    record = rerun.to_dict()
+    assert (record["sql"], record["rows"], record["aborted"], record["peak_kb"]) == (6, 10, False, None)
+    sections = {k: (v["calls"], v["sql"], v["rows"]) for k, v in record["sections"].items()}
+    assert sections == {"db.q": (2, 4, 10), "tab1": (1, 5, 10)}
+    assert record["total_ms"] >= record["sections"]["tab1"]["ms"] >= record["sections"]["db.q"]["ms"]
+    with open(path, encoding="utf-8") as f:
+        assert json.loads(f.read()) == record
+    assert rerun.table()["section"].tolist() == ["tab1", "db.q"]
+
+
+def test_prometheus_output(rerun, tmp_path):
+    with metrics.section('a"b'):
+        metrics.trace_sql("SELECT 1")
+        metrics.add_rows(7)
+    path = str(tmp_path / "m.prom")
+    metrics.finish_rerun(path)
+    text = open(path, encoding="utf-8").read()
+    assert 'sniper_rerun_section_sql_statements{section="a\\"b"} 1' in text
+    assert 'sniper_rerun_section_rows{section="a\\"b"} 7' in text
+    assert "sniper_rerun_section_peak_bytes{" not in text        # 未開記憶體量測
+    assert f"sniper_rerun_seconds {rerun.to_dict()['total_ms'] / 1000}" in text
+
+
+def test_interrupted_rerun_is_closed_and_marked(tmp_path, monkeypatch):
+    path = str(tmp_path / "m.ndjson")
+    monkeypatch.setattr(metrics, "METRICS_FILE", path)
+    first = metrics.start_rerun()
+    try:
+        metrics.section("tab2").__enter__()
+        metrics.trace_sql("SELECT 1")
+        metrics.start_rerun()              # st.rerun() 中斷：上一輪未收尾
+        assert first.aborted and first.sections["tab2"]["sql"] == 1
+        with open(path, encoding="utf-8") as f:
+            assert json.loads(f.readline())["aborted"] is True
+    finally:
+        metrics._local.rerun = None
+
+
+def test_db_calls_and_writes_are_attributed(add_bet, rerun):
+    add_bet("[英超] 主1 vs 客1")
+    add_bet("[英超] 主2 vs 客2")
+    db.clear_cache()
+    with metrics.section("tab2"):
+        assert len(db.get_pending_bets()) == 2
+        assert len(db.get_pending_bets()) == 2        # 快取命中：列數照記、不執行 SQL
+    pending = rerun.sections["db.get_pending_bets"]
+    assert (pending["calls"], pending["rows"]) == (2, 4) and pending["sql"] >= 1
+    before = rerun.sections["db.add_bet_db"]["sql"]
+    with metrics.section("tab1"):
+        add_bet("[英超] 主3 vs 客3")                 # SQL 在寫入執行緒執行，仍記回 tab1
+    assert rerun.sections["tab1"]["sql"] > 0
+    assert rerun.sections["db.add_bet_db"]["sql"] - before == rerun.sections["tab1"]["sql"]
@@ -0,0 +1,128 @@
+import os
+import sqlite3
+
+import pytest
+
+from sniper import db, migrations
+
+# 基準版 (user_version = 0) App.py init_db 建出的結構
+BASELINE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bets (
+    id TEXT PRIMARY KEY,
+    created_at TEXT,
+    match_info TEXT,
+    bet_type TEXT,
+    stake REAL,
+    odds REAL,
+    status TEXT,
+    profit REAL,
+    settled_at TEXT,
+    notes TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_bets_created ON bets(created_at);
+CREATE INDEX IF NOT EXISTS idx_bets_status ON bets(status);
+CREATE TABLE IF NOT EXISTS config (
+    key TEXT PRIMARY KEY,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS audit_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts TEXT,
+    action TEXT,
+    target_id TEXT,
+    payload TEXT
+);
+INSERT OR IGNORE INTO config (key, value) VALUES ('bankroll', 10000.0);
+INSERT OR IGNORE INTO config (key, value) VALUES ('initial', 10000.0);
+"""
+
+LEGACY_BETS = [
+    ("b1", "2026-01-03T10:00:00+08:00", "[英超] 阿仙奴 vs 車路士", "讓分 [主隊 讓 0/0.5]", 100.0, 1.9,
+     "贏", 90.0, "2026-01-04T23:00:00+08:00", "EV:5.0% | Sharpe:1.2 | P:55.3%"),
+    ("b2", "2026-01-05T10:00:00+08:00", "[西甲] 皇馬 vs 巴塞", "大小 [大 (Over) 2.5]", 200.0, 2.0,
+     "輸", -200.0, "2026-01-06T01:00:00+08:00", ""),
+    ("b3", "2026-02-01T10:00:00+08:00", "[意甲] 祖雲達斯 vs 國際米蘭", "獨贏 [主勝]", 50.0, 2.4,
+     "贏半", 35.0, "2026-02-02T03:00:00+08:00", "手動紀錄"),
+    # 舊版允許的重複待定注單
+    ("b4", "2026-03-01T10:00:00+08:00", "[英超] 曼城 vs 利物浦", "讓分 [客隊 受讓 0.5]", 80.0, 1.95,
+     "待定", 0.0, None, "EV:3.0%"),
+    ("b5", "2026-03-01T10:05:00+08:00", "[英超] 曼城 vs 利物浦", "讓分 [客隊 受讓 0.5]", 80.0, 1.95,
+     "待定", 0.0, None, ""),
+]
+
+
+def _baseline(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany("INSERT INTO bets VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", LEGACY_BETS)
+    conn.execute("UPDATE config SET value = value - 75 WHERE key='bankroll'")
+    conn.commit()
+    conn.close()
+
+
+def test_migrate_baseline_to_latest(db_path):
+    _baseline(db_path)
+    assert migrations.migrate() == (0, migrations.SCHEMA_VERSION)
+    assert os.path.exists(f"{db_path}.v0.bak")          # 升級前的完整備份
+
+    with db.read_conn() as conn:
+        assert migrations.user_version(conn) == migrations.SCHEMA_VERSION == 10
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(bets)")}
+        indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        fp = dict(conn.execute("SELECT id, fingerprint FROM bets WHERE id IN ('b4', 'b5')").fetchall())
+        audit = conn.execute("SELECT payload FROM audit_log WHERE action='SCHEMA_MIGRATE'").fetchall()
+
+    assert {"fingerprint", "league", "home", "away", "market", "side", "line",
+            "model_ev", "model_sharpe", "model_p", "closing_odds"} <= cols
+    assert {"equity_ledger", "audit_checkpoint", "audit_archive", "pnl_rollup", "bets_fts"} <= tables
+    assert {"idx_bets_created_id", "idx_bets_status_created", "idx_bets_pending_fp"} <= indexes
+    assert not {"idx_bets_created", "idx_bets_status"} & indexes        # v7 移除的前綴索引
+    assert fp["b4"] is not None and fp["b5"] is None                    # 重複待定只保留最早一筆
+    assert audit == [('{"from": 0, "to": 10}',)]
+
+    # v5 / v10 回填
+    bets = db.get_all_bets().set_index("id")
+    assert tuple(bets.loc["b1", ["league", "home", "away", "market", "side"]]) == ("英超", "阿仙奴", "車路士", "讓分", "home")
+    assert bets.loc["b1", "line"] == -0.25 and bets.loc["b2", "line"] == 2.5
+    assert (bets.loc["b1", "model_ev"], bets.loc["b1", "model_sharpe"], bets.loc["b1", "model_p"]) == \
+        pytest.approx((0.05, 1.2, 0.553))
+    assert bets.loc["b4", "model_ev"] == pytest.approx(0.03)
+
+    # v3 帳本 / v9 彙總由既有結算重建
+    summary = db.get_equity_summary()
+    assert summary["n_settled"] == 3 and summary["n_wins"] == 2
+    assert summary["equity"] == pytest.approx(10000 + 90 - 200 + 35)
+    monthly = db.get_pnl_rollup("month")
+    assert monthly[["bucket", "n", "profit"]].values.tolist() == [["2026-01", 2, -110.0], ["2026-02", 1, 35.0]]
+
+    # v8 全文索引涵蓋舊資料
+    df, _ = db.page_bets(search="祖雲達斯")
+    assert df["id"].tolist() == ["b3"]
+
+    # 新的重複待定注單會被唯一索引擋下
+    ok, _ = db.add_bet_db("[英超] 曼城 vs 利物浦", "讓分 [客隊 受讓 0.5]", 80.0, 1.95)
+    assert not ok
+
+
+def test_migrate_is_idempotent(db_path):
+    _baseline(db_path)
+    migrations.migrate()
+    migrations.forget(db_path)         # 模擬新行程：重新讀 user_version
+    assert migrations.migrate() == (migrations.SCHEMA_VERSION, migrations.SCHEMA_VERSION)
+    with db.read_conn() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM audit_log WHERE action='SCHEMA_MIGRATE'").fetchone()[0] == 1
+
+
+def test_migrate_fresh_db_skips_backup(db_path):
+    assert migrations.migrate() == (0, migrations.SCHEMA_VERSION)
+    assert not os.path.exists(f"{db_path}.v0.bak")
+    assert db.get_config() == (10000.0, 10000.0)
+
+
+def test_newer_schema_is_refused(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"PRAGMA user_version = {migrations.SCHEMA_VERSION + 1}")
+    conn.close()
+    with pytest.raises(RuntimeError):
+        migrations.migrate()
@@ -0,0 +1,94 @@
+import pytest
+
+from sniper import db
+
+
+@pytest.fixture
+def history(add_bet):
+    rows = [
+        ("[英超] 曼城 vs 利物浦", "讓分 [主隊 讓 0.5]", "EV:5.0% | 早盤"),
+        ("[英超] 曼聯 vs 阿仙奴", "大小 [大 (Over) 2.5]", "#A 追蹤"),
+        ("[西甲] 皇家馬德里 vs 巴塞隆拿", "獨贏 [主勝]", "EV:3.0% | 利物浦 比較"),
+        ("[意甲] 祖雲達斯 vs 國際米蘭", "讓分 [客隊 受讓 0/0.5]", "50%_off"),
+        ("[德甲] Bayern München vs Dortmund", "大小 [小 (Under) 3]", "late line"),
+    ]
+    ids = [add_bet(m, bt, 100 + i, 1.9, notes) for i, (m, bt, notes) in enumerate(rows)]
+    return dict(zip(["mci", "mun", "rma", "juv", "fcb"], ids))
+
+
+def _found(history, df):
+    names = {v: k for k, v in history.items()}
+    return sorted(names[i] for i in df["id"])
+
+
+# ==========================================
+# 全文索引 (>= 3 字) 與短詞 LIKE 後備
+# ==========================================
+@pytest.mark.parametrize("text, expected", [
+    ("利物浦", ["mci", "rma"]),             # 賽事與筆記都會比對
+    ("皇家馬", ["rma"]),                    # 子字串 (trigram)
+    ("Over", ["mun"]),                      # 玩法
+    ("bayern", ["fcb"]),                    # 不分大小寫
+    ("英超 利物浦", ["mci"]),               # 短詞 + 長詞 (AND)
+    ("曼", ["mci", "mun"]),                 # 1 字
+    ("英超", ["mci", "mun"]),               # 2 字聯賽名
+    ("#A", ["mun"]),                        # 筆記標籤
+    ("0/0", ["juv"]),
+    ("%_", ["juv"]),                        # LIKE 萬用字元當一般字元
+    ("曼 英超", ["mci", "mun"]),
+    ("曼 西甲", []),
+    ('"利物浦*', ["mci", "rma"]),           # FTS 語法字元被移除
+    ("   ", ["fcb", "juv", "mci", "mun", "rma"]),
+])
+def test_page_bets_search(history, text, expected):
+    df, _ = db.page_bets(search=text)
+    assert _found(history, df) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("利物浦", ["mci", "rma"]),
+    ("曼", ["mci", "mun"]),
+    ("英超 曼城", ["mci"]),
+    ("#A 曼聯", ["mun"]),
+    ("EV 利物浦", ["mci", "rma"]),
+])
+def test_search_bets(history, text, expected):
+    assert _found(history, db.search_bets(text)) == expected
+
+
+def test_search_bets_ranks_match_before_notes(history):
+    # bm25 權重：賽事 (5) > 筆記 (1)
+    assert db.search_bets("利物浦")["id"].tolist() == [history["mci"], history["rma"]]
+
+
+def test_search_combines_with_filters(history):
+    df, _ = db.page_bets(search="利物浦", league="西甲")
+    assert _found(history, df) == ["rma"]
+    assert _found(history, db.search_bets("曼", status="待定", league="英超")) == ["mci", "mun"]
+
+
+def test_search_follows_edits_and_deletes(history):
+    with db.write_txn() as conn:
+        conn.execute("UPDATE bets SET notes='改成 熱刺' WHERE id=?", (history["rma"],))
+        conn.execute("DELETE FROM bets WHERE id=?", (history["mci"],))
+    assert db.page_bets(search="利物浦")[0].empty
+    assert _found(history, db.page_bets(search="熱刺")[0]) == ["rma"]
+
+
+def test_vacuum_rebuilds_fts(history, bet_db):
+    with db.write_txn() as conn:
+        conn.execute("DELETE FROM bets WHERE id IN (?, ?)", (history["mci"], history["mun"]))
+    db.vacuum()
+    with db.write_txn() as conn:      # rowid 對不上時 integrity-check 會拋 SQLITE_CORRUPT_VTAB
+        conn.execute("INSERT INTO bets_fts (bets_fts, rank) VALUES ('integrity-check', 1)")
+    assert _found(history, db.search_bets("利物浦")) == ["rma"]
+    assert _found(history, db.page_bets(search="Dortmund")[0]) == ["fcb"]
+
+
+def test_like_fallback_without_fts(history):
+    with db.write_txn() as conn:
+        conn.execute("DROP TABLE bets_fts")
+        for t in ("ai", "ad", "au"):
+            conn.execute(f"DROP TRIGGER bets_fts_{t}")
+    assert _found(history, db.search_bets("利物浦")) == ["mci", "rma"]
+    assert _found(history, db.page_bets(search="皇家馬")[0]) == ["rma"]
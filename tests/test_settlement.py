@@ -0,0 +1,165 @@
+import random
+from decimal import Decimal
+
+import pytest
+
+from sniper import db
+from sniper.betting import RESULT_CODES, calculate_pnl, calculate_pnl_vec
+from sniper.settlement import (REJECT_ALREADY_SETTLED, REJECT_AMBIGUOUS, REJECT_DUPLICATE_ROW, REJECT_INVALID_DATE,
+                               REJECT_INVALID_RESULT, REJECT_MISSING_ID, REJECT_NO_PENDING, REJECT_OUTSIDE_WINDOW,
+                               REJECT_UNKNOWN_ID, read_scores, settle_batch, settle_scores)
+
+
+# ==========================================
+# 向量化損益 == 逐筆 Decimal
+# ==========================================
+def test_pnl_vec_matches_decimal_random():
+    rng = random.Random(20261017)
+    stakes = [round(rng.uniform(1, 5000), rng.choice([0, 1, 2])) for _ in range(5000)]
+    odds = [round(rng.uniform(1.01, 15), rng.choice([2, 3])) for _ in range(5000)]
+    results = [rng.choice(RESULT_CODES) for _ in range(5000)]
+    expected = [float(calculate_pnl(s, o, r)) for s, o, r in zip(stakes, odds, results)]
+    assert calculate_pnl_vec(stakes, odds, results).tolist() == expected
+
+
+@pytest.mark.parametrize("stake, odds, result", [
+    (0.01, 1.5, "贏半"),      # 0.0025 → 0.00
+    (0.03, 1.5, "贏半"),      # 0.0075 → 0.01 (ROUND_HALF_UP)
+    (0.05, 2.0, "輸半"),      # -0.025 → -0.03 (遠離 0)
+    (1.01, 1.5, "贏半"),      # 0.2525 → 0.25
+    (33.33, 1.15, "贏"),      # 4.9995 → 5.00
+    (123.45, 1.875, "贏半"),  # 54.0093... → 54.01
+    (100, 1.9, "走水"),
+    (100, 1.9, "輸"),
+])
+def test_pnl_vec_half_up_boundaries(stake, odds, result):
+    assert calculate_pnl_vec([stake], [odds], [result])[0] == float(calculate_pnl(stake, odds, result))
+
+
+def test_pnl_vec_falls_back_for_unscalable_odds():
+    # 賠率超過 4 位小數無法精確縮放 → 退回 Decimal
+    out = calculate_pnl_vec([100.0], [1.23456], ["贏"])
+    assert out[0] == float(calculate_pnl(100.0, 1.23456, "贏")) == float(Decimal("23.46"))
+
+
+def test_pnl_vec_unknown_result_is_zero():
+    assert calculate_pnl_vec([100.0], [2.0], ["???"]).tolist() == [0.0]
+
+
+# ==========================================
+# 批次結算：逐列拒絕原因
+# ==========================================
+def test_settle_batch_rejection_rows(add_bet):
+    a = add_bet(stake=100, odds=1.9)
+    b = add_bet(stake=200, odds=2.5)
+    c = add_bet(stake=50, odds=1.8)
+    d = add_bet(stake=300, odds=2.0)
+    db.settle_bet_db(c, 40.0, "贏")
+    csv = "\n".join([
+        "id,result",
+        f"{a},贏",           # 1 ok
+        f"{a},輸",           # 2 檔內重複
+        f"{b},贏了",         # 3 結果代碼錯誤
+        "no-such-id,輸",     # 4 未知
+        f"{c},輸",           # 5 已結算
+        ",贏",               # 6 缺 id
+        f"{d},輸半",         # 7 ok
+        f"{b},輸",           # 8 同一 id 出現過 (即使前一列被拒) 一律視為重複
+    ]).encode("utf-8")
+
+    report = settle_batch(csv, fmt="csv", chunk_size=3)      # 跨段落：重複檢查要延續到下一段
+    rejects = report["rejects"]
+    assert rejects[["row", "reason"]].values.tolist() == [
+        [2, REJECT_DUPLICATE_ROW],
+        [3, REJECT_INVALID_RESULT],
+        [4, REJECT_UNKNOWN_ID],
+        [5, REJECT_ALREADY_SETTLED],
+        [6, REJECT_MISSING_ID],
+        [8, REJECT_DUPLICATE_ROW],
+    ]
+    assert report["settled"] == 2
+    assert report["profit"] == pytest.approx(90.0 - 150.0)
+
+    bets = db.get_bets_by_ids([a, b, c, d], columns=("id", "status", "profit"))
+    assert (bets[a]["status"], bets[a]["profit"]) == ("贏", 90.0)
+    assert bets[b]["status"] == "待定"
+    assert (bets[d]["status"], bets[d]["profit"]) == ("輸半", -150.0)
+    assert (bets[c]["status"], bets[c]["profit"]) == ("贏", 40.0)      # 已結算的不被覆寫
+    bankroll, _ = db.get_config()
+    assert bankroll == pytest.approx(10000 + 40 + 90 - 150)
+    assert db.get_equity_summary()["n_settled"] == 3
+
+
+def test_settle_batch_ndjson_and_missing_columns(add_bet):
+    a = add_bet()
+    report = settle_batch(f'{{"id": "{a}", "result": "走水"}}\n'.encode("utf-8"), fmt="ndjson")
+    assert report["settled"] == 1 and report["rejects"].empty
+    with pytest.raises(ValueError):
+        settle_batch(b"bet,outcome\nx,y\n", fmt="csv")
+
+
+# ==========================================
+# 比分自動結算：日期區間與多場歧義
+# ==========================================
+def _placed_at(bet_id, ts):
+    with db.write_txn() as conn:
+        conn.execute("UPDATE bets SET created_at=? WHERE id=?", (ts, bet_id))
+
+
+def _feed(*rows):
+    return ("league,home,away,date,home_score,away_score\n" + "\n".join(rows) + "\n").encode("utf-8")
+
+
+def test_settle_scores_window_and_ambiguity(add_bet):
+    hit = add_bet("[英超] 阿仙奴 vs 車路士", "讓分 [主隊 讓 0/0.5]", 100, 1.9)
+    over = add_bet("[英超] 阿仙奴 vs 車路士", "大小 [大 (Over) 2.5/3]", 100, 2.0)
+    stale = add_bet("[英超] 阿仙奴 vs 車路士", "讓分 [主隊 讓 0.5]", 120, 1.9)
+    later = add_bet("[英超] 阿仙奴 vs 車路士", "讓分 [主隊 讓 1]", 100, 1.9)
+    both = add_bet("[西甲] 皇馬 vs 巴塞", "獨贏 [主勝]", 100, 2.2)
+    _placed_at(hit, "2026-10-16T20:00:00+08:00")
+    _placed_at(over, "2026-10-17T01:00:00+08:00")      # 比賽當天下注仍算
+    _placed_at(stale, "2026-09-01T20:00:00+08:00")     # 超過 MATCH_WINDOW_DAYS → 不用這場比分結算
+    _placed_at(later, "2026-10-18T09:00:00+08:00")     # 比賽後才下的注 (下一次交手) → 不動也不回報
+    _placed_at(both, "2026-10-15T12:00:00+08:00")      # 落在兩場 (10/17、10/20) 的區間 → 歧義
+
+    report = settle_scores(_feed(
+        "英超,阿仙奴,車路士,2026-10-17,2,1",
+        "西甲,皇馬,巴塞,2026-10-17,1,0",
+        "西甲,皇馬,巴塞,2026-10-20,0,0",
+        "意甲,祖雲達斯,國際米蘭,2026-10-17,0,0",
+        "意甲,AC米蘭,拿玻里,10/17?,0,0",
+        "英超,阿仙奴,車路士,2026-10-17,3,3",
+    ), fmt="csv")
+
+    assert report["fixtures"] == 4
+    details = report["details"].set_index("id")
+    assert details.loc[hit, "result"] == "贏" and details.loc[hit, "score"] == "2-1"
+    assert details.loc[over, "result"] == "贏半"
+    assert report["settled"] == 2
+    assert report["profit"] == pytest.approx(90.0 + 50.0)
+
+    reasons = {(r.row, r.id or r.match, r.reason) for r in report["rejects"].itertuples()}
+    assert reasons == {
+        (1, stale, REJECT_OUTSIDE_WINDOW),
+        (2, both, REJECT_AMBIGUOUS),
+        (4, "祖雲達斯 vs 國際米蘭", REJECT_NO_PENDING),
+        (5, "AC米蘭 vs 拿玻里", REJECT_INVALID_DATE),
+        (6, "阿仙奴 vs 車路士", REJECT_DUPLICATE_ROW),
+    }
+
+    bets = db.get_bets_by_ids([hit, over, stale, later, both], columns=("id", "status"))
+    assert [bets[b]["status"] for b in (hit, over, stale, later, both)] == ["贏", "贏半", "待定", "待定", "待定"]
+
+
+def test_settle_scores_dry_run_writes_nothing(add_bet):
+    bet = add_bet("[英超] 阿仙奴 vs 車路士", "讓分 [主隊 讓 0/0.5]", 100, 1.9)
+    day = db.local_day(db.get_bets_by_ids([bet], columns=("id", "created_at"))[bet]["created_at"])
+    report = settle_scores(_feed(f"英超,阿仙奴,車路士,{day},0,0"), fmt="csv", dry_run=True)
+    assert report["details"]["result"].tolist() == ["輸半"]
+    assert db.get_bets_by_ids([bet])[bet]["status"] == "待定"
+    assert db.get_config()[0] == 10000.0
+
+
+def test_read_scores_requires_date():
+    with pytest.raises(ValueError):
+        read_scores(b"home,away,home_score,away_score\nA,B,1,0\n", fmt="csv")
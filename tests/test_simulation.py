@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+
+from sniper import db, simulation
+
+
+def test_plan_prefers_model_p_over_notes():
+    df = pd.DataFrame({
+        'created_at': ["2026-10-03", "2026-10-01", "2026-10-02", "2026-10-04"],
+        'stake': [100.0, 50.0, 80.0, 60.0],
+        'odds': [1.9, 2.1, 1.8, 2.5],
+        'model_p': [0.6, None, None, 0.4],
+        'notes': ["P:10.0%", "EV:3.0% | P:52.5%", "沒有勝率", ""],
+    })
+    plan, skipped = simulation.plan_from_pending(df)
+    assert skipped == 1
+    assert plan.values.ravel().tolist() == pytest.approx([50.0, 2.1, 0.525, 100.0, 1.9, 0.6, 60.0, 2.5, 0.4])
+
+
+def test_plan_without_model_p_column_parses_notes():
+    df = pd.DataFrame({'created_at': ["a", "b"], 'stake': [10.0, 20.0], 'odds': [2.0, 3.0],
+                       'notes': ["P:50%", None]})
+    plan, skipped = simulation.plan_from_pending(df)
+    assert (plan['p'].tolist(), skipped) == ([0.5], 1)
+
+
+def test_plan_from_pending_db_reads_column(add_bet):
+    a = add_bet("[英超] 主1 vs 客1", notes="EV:5.0% | Sharpe:0.1 | P:55.0%")
+    b = add_bet("[英超] 主2 vs 客2", notes="P:40.0%")
+    with db.write_txn() as conn:
+        # 欄位為準 (例如模型重新校準後更新 model_p)；b 模擬舊資料 (欄位為空)
+        conn.execute("UPDATE bets SET model_p = 0.62 WHERE id = ?", (a,))
+        conn.execute("UPDATE bets SET model_p = NULL WHERE id = ?", (b,))
+    db.clear_cache()
+    plan, skipped = simulation.plan_from_pending(db.get_pending_bets())
+    assert skipped == 0
+    assert sorted(plan['p'].tolist()) == pytest.approx([0.4, 0.62])
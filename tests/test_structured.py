@@ -0,0 +1,55 @@
+import io
+import json
+
+import pytest
+
+from sniper import analytics, db, export
+
+
+@pytest.fixture
+def mixed(add_bet):
+    """兩個聯賽、三種玩法，部分已結算"""
+    spec = [("[英超] 阿仙奴 vs 車路士", "讓分 [主隊 讓 0.5]", 100.0, 90.0),
+            ("[英超] 曼城 vs 利物浦", "大小 [大 (Over) 2.5]", 120.0, -120.0),
+            ("[西甲] 皇馬 vs 巴塞", "獨贏 [主勝]", 80.0, 96.0),
+            ("[西甲] 馬體會 vs 西維爾", "讓分 [客隊 受讓 0.5]", 150.0, -75.0),
+            ("[英超] 熱刺 vs 愛華頓", "讓分 [主隊 讓 0.5]", 110.0, None)]
+    ids = []
+    for match, bet_type, stake, profit in spec:
+        ids.append(add_bet(match, bet_type, stake=stake))
+        if profit is not None:
+            db.settle_bet_db(ids[-1], profit, "贏" if profit > 0 else "輸")
+    return ids
+
+
+def _export_matches(**filters):
+    buf = io.BytesIO()
+    export.export_to(buf, "ndjson", **filters)
+    return [json.loads(line)["match_info"] for line in buf.getvalue().decode("utf-8").splitlines()]
+
+
+def test_export_league_filter_uses_column(mixed):
+    assert db.get_leagues() == sorted({"英超", "西甲"})
+    assert sorted(_export_matches(league="西甲")) == ["[西甲] 皇馬 vs 巴塞", "[西甲] 馬體會 vs 西維爾"]
+    assert len(_export_matches(league="英超")) == 3
+    assert _export_matches(league="英") == []                     # 不是前綴比對
+    where, params = export._where(league="英超")
+    with db.read_conn() as conn:
+        plan = " ".join(r[-1] for r in conn.execute(f"EXPLAIN QUERY PLAN SELECT id FROM bets{where}", params))
+    assert "idx_bets_league" in plan
+
+
+@pytest.mark.parametrize("dim", ["league", "market"])
+def test_group_bets_matches_breakdown(mixed, dim):
+    sql = db.group_bets(by=(dim,))
+    ref = analytics.breakdown(analytics.prepare(db.get_all_bets()), dim, 10000.0)
+    assert sql[dim].tolist() == ref[dim].tolist()
+    for col in ("n_settled", "n_wins", "profit", "turnover", "avg_odds"):
+        assert sql[col].tolist() == pytest.approx(ref[col].tolist()), col
+
+
+def test_group_bets_filters_and_validation(mixed):
+    df = db.group_bets(by=("league", "market"), league="英超")
+    assert df[["league", "market", "n_settled"]].values.tolist() == [["英超", "大小", 1], ["英超", "讓分", 1]]
+    with pytest.raises(ValueError):
+        db.group_bets(by=("notes",))
@@ -0,0 +1,100 @@
+import threading
+
+import pytest
+
+from sniper import db
+
+
+@pytest.fixture
+def pool(bet_db):
+    pool = db.get_pool()
+    with pool.write() as conn:
+        conn.execute("CREATE TABLE scratch (who TEXT, n INTEGER)")
+    return pool
+
+
+def _insert(conn, who, n, fail=False):
+    conn.execute("INSERT INTO scratch VALUES (?, ?)", (who, n))
+    if fail:
+        raise ValueError(f"{who}-{n}")
+    return who, n
+
+
+def _rows():
+    with db.read_conn() as conn:
+        return conn.execute("SELECT who, n FROM scratch ORDER BY who, n").fetchall()
+
+
+def _gate(pool):
+    """先排入一筆卡住寫入執行緒的操作，讓之後送出的操作在佇列裡累積成同一組"""
+    started, release = threading.Event(), threading.Event()
+
+    def _block(conn):
+        started.set()
+        release.wait(5)
+    fut = pool.submit(_block)
+    assert started.wait(5)
+    return fut, release
+
+
+def test_failing_op_rolls_back_only_its_savepoint(pool):
+    groups = pool.write_stats["groups"]
+    blocker, release = _gate(pool)
+    futs = [pool.submit(_insert, "a", i, fail=(i == 2)) for i in range(5)]
+    release.set()
+    blocker.result(5)
+
+    assert [f.result(5) for i, f in enumerate(futs) if i != 2] == [("a", 0), ("a", 1), ("a", 3), ("a", 4)]
+    with pytest.raises(ValueError, match="a-2"):
+        futs[2].result(5)
+    assert _rows() == [("a", 0), ("a", 1), ("a", 3), ("a", 4)]
+    # 阻擋用的操作一組，5 筆操作合併成一次 commit
+    assert pool.write_stats["groups"] == groups + 2 and pool.write_stats["max_group"] >= 5
+
+
+def test_results_visible_only_after_commit(pool):
+    blocker, release = _gate(pool)
+    fut = pool.submit(_insert, "b", 1)
+    assert not fut.done() and _rows() == []
+    release.set()
+    assert fut.result(5) == ("b", 1) and _rows() == [("b", 1)]
+
+
+def test_concurrent_submitters_get_their_own_results(pool):
+    n_threads, per_thread = 8, 40
+    results, errors = {}, []
+    barrier = threading.Barrier(n_threads)
+
+    def worker(t):
+        barrier.wait()
+        try:
+            results[t] = [_expect_fail(t, i) if i % 10 == 9 else db.submit_write(_insert, f"t{t}", i)
+                          for i in range(per_thread)]
+        except Exception as e:       # 失敗時於主執行緒回報
+            errors.append(e)
+
+    def _expect_fail(t, i):
+        with pytest.raises(ValueError):
+            db.submit_write(_insert, f"t{t}", i, fail=True)
+        return None
+
+    ops = pool.write_stats["ops"]
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(n_threads)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join(30)
+    assert not errors
+    for t in range(n_threads):
+        assert results[t] == [None if i % 10 == 9 else (f"t{t}", i) for i in range(per_thread)]
+    assert _rows() == sorted((f"t{t}", i) for t in range(n_threads) for i in range(per_thread) if i % 10 != 9)
+    assert pool.write_stats["ops"] == ops + n_threads * per_thread
+
+
+def test_submit_inside_write_runs_inline(pool):
+    with pool.write() as conn:
+        assert pool.submit(_insert, "c", 1).result(0) == ("c", 1)
+        with pytest.raises(ValueError):
+            pool.submit(_insert, "c", 2, fail=True).result(0)
+        conn.execute("DELETE FROM scratch WHERE n = 2")
+    assert _rows() == [("c", 1)]